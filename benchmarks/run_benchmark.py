@@ -0,0 +1,372 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+# 与流水线脚本共用读取峰值内存的实现
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from metrics import process_peak_memory  # noqa: E402
+from synthetic_corpus import add_corpus_arguments, generator_from_args  # noqa: E402
+
+DEFAULT_BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+# 耗时或峰值内存超过基准的比例，超过即视为性能退化
+DEFAULT_THRESHOLD = 0.15
+
+# 各阶段按此顺序运行：命令、读取的输入、是否支持 --jobs、依赖的前置阶段
+STAGES = {
+    "extract": {
+        "command": ["localization_tool.py", "extract", "raw"],
+        "inputs": ["raw", "out/3_Translated"],
+        "jobs": True,
+        "requires": [],
+    },
+    "map": {
+        "command": ["localization_tool.py", "map"],
+        "inputs": ["out/1_For_Translation", "out/master_characters.json"],
+        "jobs": False,
+        "requires": ["extract"],
+    },
+    "package": {
+        "command": ["localization_tool.py", "package", "raw"],
+        "inputs": ["raw", "out/3_Translated"],
+        "jobs": False,
+        "requires": [],
+    },
+    # 输入未变化时再次打包，衡量构建清单的跳过开销
+    "package_incremental": {
+        "command": ["localization_tool.py", "package", "raw"],
+        "inputs": ["out/3_Translated"],
+        "jobs": False,
+        "requires": ["package"],
+    },
+    "verify": {
+        "command": ["localization_tool.py", "verify", "raw", "--no-cache"],
+        "inputs": ["raw", "out/3_Translated"],
+        "jobs": True,
+        "requires": [],
+    },
+    "check": {
+        "command": ["check.py", "out/3_Translated", "--no-cache"],
+        "inputs": ["out/3_Translated"],
+        "jobs": True,
+        "requires": [],
+    },
+}
+
+
+def tree_stats(path: Path) -> tuple[int, int]:
+    """返回目录（或单个文件）下的文件数与总字节数。"""
+    if path.is_file():
+        return 1, path.stat().st_size
+    files = 0
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            files += 1
+            size += os.stat(os.path.join(dirpath, filename)).st_size
+    return files, size
+
+
+def snapshot(root: Path) -> dict[str, tuple[int, int]]:
+    """{相对路径: (大小, 修改时间)}，用于统计一个阶段写入或修改了哪些文件。"""
+    result = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            stat = os.stat(path)
+            result[os.path.relpath(path, root)] = (stat.st_size, stat.st_mtime_ns)
+    return result
+
+
+def wait_with_peak_memory(process: subprocess.Popen) -> tuple[int, int | None]:
+    """
+    等待子进程结束，返回 (退出码, 峰值内存字节数)。
+    POSIX 上通过 wait4 取得子进程及其已回收的子进程（如 --jobs 的进程池）中的最大常驻内存；
+    Windows 上读取进程的 PeakWorkingSetSize。无法获取时峰值内存为 None。
+    """
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # Linux 的 ru_maxrss 以 KB 为单位，macOS 以字节为单位
+        scale = 1 if sys.platform == "darwin" else 1024
+        return process.returncode, usage.ru_maxrss * scale
+
+    process.wait()
+    return process.returncode, process_peak_memory(int(process._handle))
+
+
+def run_stage(name: str, work_dir: Path, jobs: int) -> dict:
+    stage = STAGES[name]
+    command = [sys.executable, str(SCRIPTS_DIR / stage["command"][0])]
+    command += stage["command"][1:]
+    if stage["jobs"]:
+        command += ["--jobs", str(jobs)]
+
+    input_files = 0
+    input_bytes = 0
+    for relative_path in stage["inputs"]:
+        path = work_dir / relative_path
+        if path.exists():
+            files, size = tree_stats(path)
+            input_files += files
+            input_bytes += size
+
+    before = snapshot(work_dir)
+    log_path = work_dir / f"log_{name}.txt"
+    with open(log_path, "w", encoding="utf-8") as log:
+        start_time = time.perf_counter()
+        process = subprocess.Popen(
+            command,
+            cwd=work_dir,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env={**os.environ, "PYTHONIOENCODING": "utf-8"},
+        )
+        returncode, peak_memory = wait_with_peak_memory(process)
+        wall_time = time.perf_counter() - start_time
+    after = snapshot(work_dir)
+
+    written = [
+        path
+        for path, state in after.items()
+        if before.get(path) != state and path != log_path.name
+    ]
+    return {
+        "returncode": returncode,
+        "wall_time": wall_time,
+        "peak_memory": peak_memory,
+        "input_files": input_files,
+        "input_bytes": input_bytes,
+        "written_files": len(written),
+        "written_bytes": sum(after[path][0] for path in written),
+        "deleted_files": sum(path not in after for path in before),
+        "log": str(log_path),
+    }
+
+
+def resolve_stages(names: list[str]) -> list[str]:
+    """补上前置阶段，并按 STAGES 中的顺序排列。"""
+    selected = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(STAGES[name]["requires"])
+    return [name for name in STAGES if name in selected]
+
+
+def run_benchmark(args, corpus_dir: Path, work_root: Path, stages: list[str]) -> dict:
+    """每轮都从生成好的语料复制出全新的工作目录，依次运行各阶段。"""
+    rounds: dict[str, list[dict]] = {name: [] for name in stages}
+    for repeat in range(args.repeat):
+        work_dir = work_root / f"run{repeat}"
+        if work_dir.exists():
+            shutil.rmtree(work_dir)
+        shutil.copytree(corpus_dir, work_dir)
+        for name in stages:
+            result = run_stage(name, work_dir, args.jobs)
+            if result["returncode"] != 0:
+                print(
+                    f"[错误] 阶段 {name} 以状态码 {result['returncode']} 退出，"
+                    f"日志: {result['log']}"
+                )
+                sys.exit(2)
+            rounds[name].append(result)
+            print(
+                f"  第 {repeat + 1} 轮 {name:<20} {result['wall_time']:8.3f} s  "
+                f"{format_size(result['peak_memory']):>10}"
+            )
+
+    # 耗时取中位数、峰值内存取最大值；文件数与字节数每轮相同，取第一轮
+    summary = {}
+    for name, results in rounds.items():
+        first = results[0]
+        memories = [
+            result["peak_memory"] for result in results if result["peak_memory"]
+        ]
+        summary[name] = {
+            "wall_time": statistics.median(result["wall_time"] for result in results),
+            "wall_time_min": min(result["wall_time"] for result in results),
+            "peak_memory": max(memories) if memories else None,
+            "input_files": first["input_files"],
+            "input_bytes": first["input_bytes"],
+            "written_files": first["written_files"],
+            "written_bytes": first["written_bytes"],
+            "deleted_files": first["deleted_files"],
+        }
+    return summary
+
+
+def format_size(size: int | None) -> str:
+    if size is None:
+        return "-"
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """逐阶段比较耗时与峰值内存，返回超过阈值的退化项。"""
+    if baseline.get("corpus") != results["corpus"]:
+        print("[警告] 基准结果使用的语料参数与本次不同，比较结果仅供参考。")
+
+    regressions = []
+    print("-" * 72)
+    print(f"{'阶段':<20}{'耗时(基准)':>14}{'耗时(本次)':>14}{'变化':>9}{'内存变化':>11}")
+    for name, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if previous is None:
+            print(f"{name:<22}{'-':>14}{current['wall_time']:>14.3f}")
+            continue
+        time_ratio = current["wall_time"] / previous["wall_time"] - 1
+        memory_ratio = None
+        if current["peak_memory"] and previous.get("peak_memory"):
+            memory_ratio = current["peak_memory"] / previous["peak_memory"] - 1
+        print(
+            f"{name:<22}{previous['wall_time']:>14.3f}{current['wall_time']:>14.3f}"
+            f"{time_ratio:>+10.1%}"
+            + (f"{memory_ratio:>+12.1%}" if memory_ratio is not None else f"{'-':>12}")
+        )
+        if time_ratio > threshold:
+            regressions.append(f"{name} 耗时增加 {time_ratio:.1%}")
+        if memory_ratio is not None and memory_ratio > threshold:
+            regressions.append(f"{name} 峰值内存增加 {memory_ratio:.1%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="在合成语料上端到端运行各阶段，记录耗时、峰值内存与读写量，并与基准结果比较"
+    )
+    add_corpus_arguments(parser)
+    parser.add_argument(
+        "--stages",
+        type=str,
+        default=",".join(STAGES),
+        help=f"要运行的阶段，逗号分隔，前置阶段会自动加入。可选: {', '.join(STAGES)}。",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="重复轮数，耗时取中位数，默认 3。")
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="传给支持 --jobs 的阶段的进程数，默认 1。"
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=str,
+        help="工作目录；不指定时使用临时目录，运行结束后删除。",
+    )
+    parser.add_argument("--output", type=str, help="将本次结果以 JSON 格式写入指定文件。")
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=str(DEFAULT_BASELINE_FILE),
+        help="基准结果文件，存在时与本次结果比较。",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="将本次结果保存为基准（写入 --baseline 指定的文件）。",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"耗时或峰值内存超过基准的比例达到该值即视为退化，默认 {DEFAULT_THRESHOLD}。",
+    )
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.stages.split(",") if name.strip()]
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        parser.error(f"未知的阶段: {', '.join(unknown)}")
+    stages = resolve_stages(names)
+    generator = generator_from_args(args)
+
+    temp_dir = None
+    if args.work_dir:
+        work_root = Path(args.work_dir)
+        work_root.mkdir(parents=True, exist_ok=True)
+    else:
+        temp_dir = tempfile.TemporaryDirectory(prefix="localization_bench_")
+        work_root = Path(temp_dir.name)
+
+    try:
+        corpus_dir = work_root / "corpus"
+        if corpus_dir.exists():
+            shutil.rmtree(corpus_dir)
+        print(f"正在生成合成语料: {corpus_dir}")
+        corpus_stats = generator.generate(corpus_dir)
+        print(
+            f"  - {corpus_stats['books']} 个 book、{corpus_stats['grids']} 个表格、"
+            f"{corpus_stats['rows']} 行，{corpus_stats['translated_grids']} 个表格带有译文，"
+            f"共 {format_size(corpus_stats['bytes'])}"
+        )
+        print(f"正在运行: {', '.join(stages)}（{args.repeat} 轮）")
+        stage_results = run_benchmark(args, corpus_dir, work_root, stages)
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    results = {
+        "corpus": generator.params(),
+        "corpus_stats": corpus_stats,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "jobs": args.jobs,
+            "repeat": args.repeat,
+        },
+        "stages": stage_results,
+    }
+
+    print("-" * 72)
+    print(f"{'阶段':<20}{'耗时':>10}{'峰值内存':>12}{'读取':>16}{'写入':>16}")
+    for name, result in stage_results.items():
+        read = f"{result['input_files']}/{format_size(result['input_bytes'])}"
+        written = f"{result['written_files']}/{format_size(result['written_bytes'])}"
+        print(
+            f"{name:<22}{result['wall_time']:>10.3f}"
+            f"{format_size(result['peak_memory']):>14}"
+            f"{read:>18}{written:>18}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入: {args.output}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"已保存为基准: {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"提示: 未找到基准结果 '{baseline_path}'，可加上 --save-baseline 保存本次结果。")
+        return
+
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.threshold)
+    if regressions:
+        print("发现性能退化:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("未发现超过阈值的性能退化。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import argparse
+import json
+import random
+from pathlib import Path
+
+# 与真实导出数据相同的目录结构：raw/Adventure/<分类>/<分类><编号>.book.json
+CATEGORIES = ("MainScenario", "StoryEventScenario", "ImportChara/CharaScenario")
+DIALOGUE_HEADER = ["Command", "Arg1", "Arg2", "Text", "Voice"]
+CHARACTER_HEADER = ["Type", "Id", "Name"]
+
+HIRAGANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをんがぎぐげござじずぜぞだでどばびぶべぼぱぴぷぺぽっゃゅょ"
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワンガギグゲゴザジズゼゾダデドバビブベボパピプペポッャュョー"
+KANJI = "日月火水木金土山川田人口目耳手足力気天空雨風雪花草森林石光音声心思言話語読書見聞行来帰出入上下中外前後左右今昔時分年学校先生友達家族夢星騎士剣盾魔法"
+PUNCTUATION = "、。！？…"
+# 伪译文：每个假名或汉字固定映射为一个汉字，译文长度与原文接近，标点与引号保持不变
+HANZI = "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多然于心学么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长儿回位分爱老因很给名法间斯知世什两次使身者被高已亲其进此话常与活正感"
+
+DEFAULT_BOOKS = 200
+DEFAULT_GRIDS = 12
+DEFAULT_ROWS = 40
+DEFAULT_REPEAT_RATE = 0.3
+DEFAULT_TRANSLATED = 0.8
+DEFAULT_CHARACTERS = 300
+# 重复台词池的大小：按 --repeat-rate 抽中的台词从这里选取，模拟「はい」「……」之类的常见台词
+COMMON_LINE_POOL = 500
+
+
+class CorpusGenerator:
+    """
+    按给定规模生成可复现的合成语料：Master.chapter.json、*.book.json，
+    以及与之对齐的 out/3_Translated 译文，用于在没有真实 raw 数据时做性能测试。
+    同一组参数和种子总是生成逐字节相同的文件。
+    """
+
+    def __init__(
+        self,
+        books: int = DEFAULT_BOOKS,
+        grids: int = DEFAULT_GRIDS,
+        rows: int = DEFAULT_ROWS,
+        repeat_rate: float = DEFAULT_REPEAT_RATE,
+        translated: float = DEFAULT_TRANSLATED,
+        characters: int = DEFAULT_CHARACTERS,
+        seed: int = 1,
+    ):
+        self.books = books
+        self.grids = grids
+        self.rows = rows
+        self.repeat_rate = repeat_rate
+        self.translated = translated
+        self.characters = characters
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.translation_table = str.maketrans(
+            {
+                char: HANZI[index % len(HANZI)]
+                for index, char in enumerate(HIRAGANA + KATAKANA + KANJI)
+            }
+        )
+        self.character_names = {
+            f"c{index:04d}": self._word(KATAKANA, 2, 6) for index in range(characters)
+        }
+        self.speaker_ids = list(self.character_names)
+        # 没有登记在 Master 中、直接写名字的说话人，会进入 names.json
+        self.direct_speakers = [self._word(KATAKANA, 2, 5) for _ in range(20)]
+        self.common_lines = [self._sentence() for _ in range(COMMON_LINE_POOL)]
+
+    def params(self) -> dict:
+        return {
+            "books": self.books,
+            "grids": self.grids,
+            "rows": self.rows,
+            "repeat_rate": self.repeat_rate,
+            "translated": self.translated,
+            "characters": self.characters,
+            "seed": self.seed,
+        }
+
+    def _word(self, alphabet: str, min_length: int, max_length: int) -> str:
+        length = self.random.randint(min_length, max_length)
+        return "".join(self.random.choice(alphabet) for _ in range(length))
+
+    def _sentence(self) -> str:
+        parts = []
+        for _ in range(self.random.randint(1, 4)):
+            parts.append(self._word(KANJI, 1, 3))
+            parts.append(self._word(HIRAGANA, 2, 8))
+            if self.random.random() < 0.15:
+                parts.append(self.random.choice(list(self.character_names.values())))
+            parts.append(self.random.choice(PUNCTUATION))
+        return "".join(parts)
+
+    def _line(self, speaker_id: str) -> str:
+        if self.random.random() < self.repeat_rate:
+            text = self.random.choice(self.common_lines)
+        else:
+            text = self._sentence()
+        if speaker_id:
+            return f"「{text}」"
+        return text
+
+    def translate(self, text: str) -> str:
+        return text.translate(self.translation_table)
+
+    def _grid(self, book_index: int, grid_index: int) -> dict:
+        grid_id = f"G{book_index:05d}{grid_index:02d}"
+        rows = [{"strings": list(DIALOGUE_HEADER)}]
+        title = self._word(KANJI, 2, 6)
+        rows.append(
+            {
+                "strings": [
+                    "Msg",
+                    "Title",
+                    "",
+                    f"第{grid_index + 1}话,{title},{self.random.choice('BP')}",
+                    "",
+                ]
+            }
+        )
+        row_count = self.random.randint(
+            max(1, self.rows // 2), max(1, self.rows * 3 // 2)
+        )
+        for row_index in range(row_count):
+            roll = self.random.random()
+            if roll < 0.2:
+                # 不带台词的指令行（背景、音效等），打包时原样保留
+                rows.append({"strings": ["Bg", "", f"bg_{row_index:03d}", "", ""]})
+                continue
+            if roll < 0.35:
+                speaker_id = ""
+            elif roll < 0.4:
+                speaker_id = self.random.choice(self.direct_speakers)
+            else:
+                speaker_id = self.random.choice(self.speaker_ids)
+            voice = (
+                f"v_{book_index:05d}_{grid_index:02d}_{row_index:03d}"
+                if speaker_id
+                else ""
+            )
+            rows.append(
+                {"strings": ["Msg", speaker_id, "", self._line(speaker_id), voice]}
+            )
+        return {"name": f"Book{book_index:05d}:{grid_id}", "rows": rows}
+
+    def _translated_dialogues(self, grid: dict) -> list[dict]:
+        dialogues = []
+        for row in grid["rows"][1:]:
+            speaker_id, text = row["strings"][1], row["strings"][3]
+            if not text:
+                continue
+            item = {}
+            if speaker_id:
+                # 与 map 阶段一致：说话人为映射后的角色名，不随台词一起翻译
+                item["name"] = self.character_names.get(speaker_id, speaker_id)
+            item["message"] = self.translate(text)
+            dialogues.append(item)
+        return dialogues
+
+    def generate(self, root: Path) -> dict:
+        """在 root 下写出 raw、out/3_Translated、slang.json 与 exclude_names.json，返回统计信息。"""
+        raw_dir = root / "raw" / "Adventure"
+        translated_dir = root / "out" / "3_Translated" / "Adventure"
+        stats = {"books": 0, "grids": 0, "rows": 0, "translated_grids": 0, "bytes": 0}
+
+        master = {
+            "m_Name": "Master",
+            "settingList": [
+                {
+                    "name": "Master:Config",
+                    "rows": [
+                        {"strings": ["Key", "Value"]},
+                        {"strings": ["Version", "1"]},
+                    ],
+                },
+                {
+                    "name": "Master:Character",
+                    "rows": [{"strings": list(CHARACTER_HEADER)}]
+                    + [
+                        {"strings": ["Chara", char_id, name]}
+                        for char_id, name in self.character_names.items()
+                    ],
+                },
+            ],
+        }
+        stats["bytes"] += write_json(raw_dir / "Master.chapter.json", master, indent=2)
+
+        for book_index in range(self.books):
+            category = CATEGORIES[book_index % len(CATEGORIES)]
+            book_name = f"{category.split('/')[-1]}{book_index // len(CATEGORIES):04d}"
+            grids = [self._grid(book_index, index) for index in range(self.grids)]
+            book = {"m_Name": book_name, "importGridList": grids}
+            stats["bytes"] += write_json(
+                raw_dir / category / f"{book_name}.book.json", book, indent=2
+            )
+            stats["books"] += 1
+            stats["grids"] += len(grids)
+            stats["rows"] += sum(len(grid["rows"]) - 1 for grid in grids)
+
+            if self.random.random() >= self.translated:
+                continue
+            for grid in grids:
+                dialogues = self._translated_dialogues(grid)
+                if not dialogues:
+                    continue
+                grid_id = grid["name"].split(":")[-1]
+                stats["bytes"] += write_json(
+                    translated_dir / category / f"{book_name}.book" / f"{grid_id}.json",
+                    dialogues,
+                    indent=4,
+                )
+                stats["translated_grids"] += 1
+
+        glossary = [
+            {"src": name, "dst": self.translate(name), "info": ""}
+            for name in list(self.character_names.values())[:100]
+        ]
+        stats["bytes"] += write_json(root / "slang.json", glossary, indent=4)
+        stats["bytes"] += write_json(
+            root / "exclude_names.json", self.direct_speakers[:2], indent=4
+        )
+        return stats
+
+
+def write_json(path: Path, data, indent: int) -> int:
+    """写出 JSON 并返回写入的字节数。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    content = json.dumps(data, ensure_ascii=False, indent=indent).encode("utf-8")
+    path.write_bytes(content)
+    return len(content)
+
+
+def add_corpus_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--books",
+        type=int,
+        default=DEFAULT_BOOKS,
+        help=f"book 文件数，默认 {DEFAULT_BOOKS}。",
+    )
+    parser.add_argument(
+        "--grids",
+        type=int,
+        default=DEFAULT_GRIDS,
+        help=f"每个 book 的表格数，默认 {DEFAULT_GRIDS}。",
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=DEFAULT_ROWS,
+        help=f"每个表格的平均行数（实际在 0.5~1.5 倍之间浮动），默认 {DEFAULT_ROWS}。",
+    )
+    parser.add_argument(
+        "--repeat-rate",
+        type=float,
+        default=DEFAULT_REPEAT_RATE,
+        help=f"从常见台词池中抽取台词的比例，默认 {DEFAULT_REPEAT_RATE}。",
+    )
+    parser.add_argument(
+        "--translated",
+        type=float,
+        default=DEFAULT_TRANSLATED,
+        help=f"已有译文的 book 比例，默认 {DEFAULT_TRANSLATED}。",
+    )
+    parser.add_argument(
+        "--characters",
+        type=int,
+        default=DEFAULT_CHARACTERS,
+        help=f"Master 中登记的角色数，默认 {DEFAULT_CHARACTERS}。",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="随机种子，默认 1。")
+
+
+def generator_from_args(args) -> CorpusGenerator:
+    return CorpusGenerator(
+        books=args.books,
+        grids=args.grids,
+        rows=args.rows,
+        repeat_rate=args.repeat_rate,
+        translated=args.translated,
+        characters=args.characters,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成用于性能测试的合成语料")
+    parser.add_argument("output_dir", type=str, help="输出目录，会在其中创建 raw 与 out。")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    stats = generator_from_args(args).generate(Path(args.output_dir))
+    print(
+        f"已生成 {stats['books']} 个 book、{stats['grids']} 个表格、{stats['rows']} 行，"
+        f"其中 {stats['translated_grids']} 个表格带有译文，"
+        f"共 {stats['bytes'] / 1024 / 1024:.1f} MB。"
+    )
+
+
+if __name__ == "__main__":
+    main()
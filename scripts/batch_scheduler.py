@@ -0,0 +1,87 @@
+import heapq
+import math
+
+# 每行在提示词中的固定开销（换行、术语表等），按估算的 token 数计
+LINE_OVERHEAD = 2
+# 超大文件拆分后每块的目标工作量 = 每个槽位平均工作量 / SPLIT_FACTOR
+SPLIT_FACTOR = 4
+
+
+def estimate_cost(message: str) -> int:
+    """
+    估算一行台词的翻译工作量（token 数）。
+    日文在 Sakura 使用的分词器下大致一个字符对应一个 token，译文长度与原文相近。
+    """
+    return len(message) + LINE_OVERHEAD
+
+
+def split_units(relative_path: str, dialogues: list[dict], max_cost: int) -> list[dict]:
+    """
+    将一个文件切分为若干个工作单元 {"file", "start", "end", "cost"}。
+    工作量不超过 max_cost 的文件整体作为一个单元，否则在行边界处切开。
+    """
+    units = []
+    start = 0
+    cost = 0
+    for index, item in enumerate(dialogues):
+        line_cost = estimate_cost(item["message"])
+        if cost and cost + line_cost > max_cost:
+            units.append({"file": relative_path, "start": start, "end": index, "cost": cost})
+            start = index
+            cost = 0
+        cost += line_cost
+    if cost:
+        units.append(
+            {"file": relative_path, "start": start, "end": len(dialogues), "cost": cost}
+        )
+    return units
+
+
+def balance(units: list[dict], slots: int) -> list[dict]:
+    """
+    最长处理时间优先（LPT）：按工作量从大到小，依次把单元分给当前负载最小的队列。
+    返回 [{"cost", "units"}]，每个队列对应一个并行槽位。
+    """
+    queues = [{"cost": 0, "units": []} for _ in range(slots)]
+    heap = [(0, slot) for slot in range(slots)]
+    for unit in sorted(units, key=lambda unit: (-unit["cost"], unit["file"], unit["start"])):
+        load, slot = heapq.heappop(heap)
+        queues[slot]["units"].append(unit)
+        queues[slot]["cost"] = load + unit["cost"]
+        heapq.heappush(heap, (queues[slot]["cost"], slot))
+    return queues
+
+
+def in_order_makespan(costs: list[int], slots: int) -> int:
+    """按文件顺序、空闲槽位依次领取时的总耗时（以工作量计），用于和均衡后的结果对比。"""
+    heap = [0] * slots
+    for cost in costs:
+        heapq.heapreplace(heap, heap[0] + cost)
+    return max(heap, default=0)
+
+
+def build_schedule(files: dict[str, list[dict]], slots: int) -> dict:
+    """
+    为 {相对路径: 台词列表} 生成均衡的批次清单。
+    工作量超过每块目标值的文件会被拆开，使最终耗时接近 总工作量 / 槽位数。
+    """
+    slots = max(1, slots)
+    file_costs = {
+        path: sum(estimate_cost(item["message"]) for item in dialogues)
+        for path, dialogues in files.items()
+    }
+    total_cost = sum(file_costs.values())
+    max_cost = max(1, math.ceil(total_cost / (slots * SPLIT_FACTOR)))
+
+    units = []
+    for path, dialogues in files.items():
+        units.extend(split_units(path, dialogues, max_cost))
+
+    return {
+        "slots": slots,
+        "total_cost": total_cost,
+        "max_unit_cost": max_cost,
+        "line_counts": {path: len(dialogues) for path, dialogues in files.items()},
+        "queues": balance(units, slots),
+        "in_order_makespan": in_order_makespan(list(file_costs.values()), slots),
+    }
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from metrics import metrics
+
+# 清单格式版本，结构变化时递增，旧清单会被整体丢弃
+MANIFEST_VERSION = 1
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """以流式方式计算文件的 sha256，避免一次性读入大文件。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+            metrics.count("bytes_hashed", len(chunk))
+    return digest.hexdigest()
+
+
+def hash_config(config: Any) -> str:
+    """将阶段配置（列名、依赖文件哈希等）归一化后计算哈希。"""
+    return hash_bytes(
+        json.dumps(config, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    )
+
+
+def hash_optional_file(path: Path) -> str | None:
+    """文件存在时返回其哈希，否则返回 None，用于把可选配置文件纳入阶段配置。"""
+    return hash_file(path) if path.exists() else None
+
+
+def dir_fingerprint(path: Path) -> list[list]:
+    """
+    以目录下各文件的 (文件名, 大小, 修改时间) 作为廉价指纹，
+    用于判断某个 book 对应的翻译目录是否有改动。
+    """
+    return sorted(
+        [entry.name, stat.st_size, stat.st_mtime_ns]
+        for entry in os.scandir(path)
+        if entry.is_file() and (stat := entry.stat())
+    )
+
+
+class StageManifest:
+    """
+    单个阶段的清单视图。
+    以相对路径为键，记录输入文件的大小、修改时间、内容哈希，以及调用方附带的产物信息。
+    """
+
+    def __init__(self, entries: dict[str, dict]):
+        self.entries = entries
+        self._fingerprints: dict[str, dict] = {}
+        self._seen: set[str] = set()
+
+    def _fingerprint(self, path: Path, entry: dict | None) -> dict:
+        with metrics.phase("fingerprint"):
+            stat = path.stat()
+            fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            if (
+                entry is not None
+                and entry.get("size") == stat.st_size
+                and entry.get("mtime_ns") == stat.st_mtime_ns
+            ):
+                # 大小与修改时间均未变化，直接沿用上次的哈希
+                fingerprint["sha256"] = entry["sha256"]
+            else:
+                fingerprint["sha256"] = hash_file(path)
+            return fingerprint
+
+    def get(self, key: str, path: Path) -> dict | None:
+        """
+        输入文件与上次记录一致时返回上次的记录，否则返回 None。
+        大小和修改时间一致时不读取文件；仅修改时间变化而内容相同也视为未变化。
+        """
+        self._seen.add(key)
+        entry = self.entries.get(key)
+        fingerprint = self._fingerprint(path, entry)
+        self._fingerprints[key] = fingerprint
+        if entry is None or entry["sha256"] != fingerprint["sha256"]:
+            return None
+        # 内容未变，刷新记录中的 stat 信息，下次可免去哈希计算
+        entry.update(fingerprint)
+        return entry
+
+    def put(self, key: str, path: Path, refresh: bool = False, **payload):
+        """
+        记录输入文件的指纹以及本次处理的产物等附加信息。
+        处理过程中改写了输入文件本身时传入 refresh=True，重新计算指纹。
+        """
+        self._seen.add(key)
+        fingerprint = self._fingerprints.pop(key, None)
+        if fingerprint is None or refresh:
+            fingerprint = self._fingerprint(path, self.entries.get(key))
+        self.entries[key] = {**fingerprint, **payload}
+
+    def discard(self, key: str):
+        """删除某个条目，下次运行时该输入将被视为已变化。"""
+        self._fingerprints.pop(key, None)
+        self.entries.pop(key, None)
+
+    def prune(self) -> dict[str, dict]:
+        """移除本次运行中未出现的条目（输入已被删除），并返回被移除的条目。"""
+        removed = {
+            key: entry for key, entry in self.entries.items() if key not in self._seen
+        }
+        for key in removed:
+            del self.entries[key]
+        return removed
+
+
+class BuildManifest:
+    """
+    持久化的构建清单，按阶段（extract / map / package）分别保存。
+    阶段配置的哈希变化时，该阶段的全部记录失效。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.stages: dict[str, dict] = {}
+        if path.exists():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.stages = data.get("stages", {})
+            except (json.JSONDecodeError, AttributeError):
+                print(f"警告: 构建清单 '{path}' 已损坏，将重新生成。")
+
+    def has_stage(self, name: str) -> bool:
+        return bool(self.stages.get(name, {}).get("entries"))
+
+    def stage(self, name: str, config: Any) -> StageManifest:
+        config_hash = hash_config(config)
+        data = self.stages.get(name)
+        if data is None or data.get("config") != config_hash:
+            data = {"config": config_hash, "entries": {}}
+            self.stages[name] = data
+        return StageManifest(data["entries"])
+
+    def save(self):
+        """先写入临时文件再替换，避免中断时留下半截清单。"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": MANIFEST_VERSION, "stages": self.stages},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, self.path)
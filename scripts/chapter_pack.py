@@ -0,0 +1,226 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import zlib
+from pathlib import Path
+
+# 打包文件格式：
+#   文件头 | 各章节数据块 | 路径字符串表 | 按路径排序的定长索引
+# 索引记录定长，读取时在 mmap 上二分查找，只解压被请求的章节，无需读入整个文件。
+PACK_MAGIC = b"CHPK"
+PACK_VERSION = 1
+# 文件头：魔数、版本、条目数、索引起始位置
+_HEADER = struct.Struct("<4sHxxIQ")
+# 索引记录：路径位置、路径长度、数据位置、存储长度、原始长度、crc32、编码
+_RECORD = struct.Struct("<QIQQQIB3x")
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+
+
+class PackError(Exception):
+    """打包文件损坏或格式不受支持。"""
+
+
+class PackWriter:
+    """
+    顺序写入章节数据，close 时写出索引并原子替换目标文件。
+    数据先写入同目录下的临时文件，写入过程中旧的打包文件仍然可读。
+    """
+
+    def __init__(self, path: Path, compress_level: int = 6):
+        self.path = path
+        self.compress_level = compress_level
+        self._tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(b"\0" * _HEADER.size)
+        self._entries: dict[str, tuple] = {}
+
+    def _write_blob(self, name: str, stored: bytes, raw_size: int, crc: int, codec: int):
+        offset = self._file.tell()
+        self._file.write(stored)
+        self._entries[name] = (offset, len(stored), raw_size, crc, codec)
+
+    def add(self, name: str, data: bytes):
+        """写入一个章节。压缩后更小时以 zlib 存储，否则原样存储。"""
+        compressed = zlib.compress(data, self.compress_level)
+        crc = zlib.crc32(data)
+        if len(compressed) < len(data):
+            self._write_blob(name, compressed, len(data), crc, CODEC_ZLIB)
+        else:
+            self._write_blob(name, data, len(data), crc, CODEC_RAW)
+
+    def copy_from(self, reader: "PackReader", name: str):
+        """从旧的打包文件中原样复制一个章节的数据块，不解压也不重新压缩。"""
+        stored, raw_size, crc, codec = reader.read_stored(name)
+        self._write_blob(name, stored, raw_size, crc, codec)
+
+    def close(self):
+        names = sorted(self._entries, key=lambda name: name.encode("utf-8"))
+        path_offsets = {}
+        for name in names:
+            path_offsets[name] = self._file.tell()
+            self._file.write(name.encode("utf-8"))
+
+        index_offset = self._file.tell()
+        for name in names:
+            offset, stored_size, raw_size, crc, codec = self._entries[name]
+            self._file.write(
+                _RECORD.pack(
+                    path_offsets[name],
+                    len(name.encode("utf-8")),
+                    offset,
+                    stored_size,
+                    raw_size,
+                    crc,
+                    codec,
+                )
+            )
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(names), index_offset))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+class PackReader:
+    """
+    通过 mmap 读取打包文件：按路径二分查找索引，只读取并解压目标章节。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise PackError(f"打包文件为空: {path}")
+        try:
+            self._read_header()
+        except PackError:
+            self.close()
+            raise
+
+    def _read_header(self):
+        size = len(self._buffer)
+        # 写入中断的文件可能只有一部分文件头或索引
+        if size < _HEADER.size:
+            raise PackError(f"打包文件不完整: {self.path}")
+        magic, version, self._count, self._index_offset = _HEADER.unpack_from(
+            self._buffer, 0
+        )
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise PackError(f"不支持的打包文件格式: {self.path}")
+        if self._index_offset + self._count * _RECORD.size > size:
+            raise PackError(f"打包文件不完整: {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, position: int) -> tuple:
+        return _RECORD.unpack_from(
+            self._buffer, self._index_offset + position * _RECORD.size
+        )
+
+    def _name_bytes(self, record: tuple) -> bytes:
+        return self._buffer[record[0] : record[0] + record[1]]
+
+    def _find(self, name: str) -> tuple | None:
+        key = name.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            record = self._record(middle)
+            current = self._name_bytes(record)
+            if current == key:
+                return record
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name) is not None
+
+    def names(self):
+        """按索引顺序产出所有章节路径。"""
+        for position in range(self._count):
+            yield self._name_bytes(self._record(position)).decode("utf-8")
+
+    def read_stored(self, name: str) -> tuple[bytes, int, int, int]:
+        """返回 (存储的数据块, 原始长度, crc32, 编码)。"""
+        record = self._find(name)
+        if record is None:
+            raise KeyError(name)
+        _, _, offset, stored_size, raw_size, crc, codec = record
+        return self._buffer[offset : offset + stored_size], raw_size, crc, codec
+
+    def read(self, name: str) -> bytes:
+        """返回章节的原始字节，与目录格式中的 .chapter.json 完全一致。"""
+        stored, raw_size, crc, codec = self.read_stored(name)
+        if codec == CODEC_ZLIB:
+            data = zlib.decompress(stored)
+        elif codec == CODEC_RAW:
+            data = stored
+        else:
+            raise PackError(f"未知的编码 {codec}: {name}")
+        if len(data) != raw_size or zlib.crc32(data) != crc:
+            raise PackError(f"数据校验失败: {name}")
+        return data
+
+    def read_json(self, name: str):
+        return json.loads(self.read(name))
+
+    def close(self):
+        self._buffer.close()
+        self._file.close()
+
+
+def unpack(pack_path: Path, output_dir: Path) -> int:
+    """将打包文件还原为目录格式，返回还原的章节数。"""
+    count = 0
+    with PackReader(pack_path) as reader:
+        for name in reader.names():
+            output_path = output_dir / name
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            output_path.write_bytes(reader.read(name))
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看或还原插件数据的打包文件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parser_list = subparsers.add_parser("list", help="列出打包文件中的所有章节。")
+    parser_list.add_argument("pack", type=str, help="打包文件路径。")
+    parser_unpack = subparsers.add_parser("unpack", help="将打包文件还原为目录格式。")
+    parser_unpack.add_argument("pack", type=str, help="打包文件路径。")
+    parser_unpack.add_argument("output_dir", type=str, help="输出目录。")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        with PackReader(Path(args.pack)) as reader:
+            for name in reader.names():
+                print(name)
+            print(f"共 {len(reader)} 个章节。")
+    else:
+        count = unpack(Path(args.pack), Path(args.output_dir))
+        print(f"已还原 {count} 个章节到 '{args.output_dir}'。")
+
+
+if __name__ == "__main__":
+    main()
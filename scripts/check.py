@@ -1,104 +1,628 @@
+import argparse
 import json
-import re
+import os
+import subprocess
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
 
+from build_manifest import BuildManifest
+from check_rules import (
+    ERROR,
+    RULE_CLASSES,
+    SEVERITY_LABELS,
+    WARNING,
+    GlossaryRule,
+    Rule,
+    RuleSet,
+    SpeakerRule,
+)
+from corpus_cache import CorpusCache, load_book
+from corpus_layout import (
+    CORPUS_CACHE_DIR,
+    DIALOGUE_TEXT_COL_NAME,
+    GLOSSARY_FILE,
+    NAMES_MAP_FILE,
+    iter_aligned_rows,
+    read_json,
+)
+from glossary import load_glossary
+from metrics import (
+    add_instrumentation_arguments,
+    call_with_metrics,
+    metrics,
+    run_instrumented,
+)
+from output_writer import output_writer
 
-def get_replacement_table():
+DEFAULT_TARGET_DIR = "out/3_Translated"
+# 校验结果缓存：记录已通过检查的文件指纹，未变化的文件不再重复校验
+CHECK_CACHE_FILE = "out/.check_cache.json"
+
+# 检查上下文，每个进程初始化一次：启用的规则集，以及查找原文所需的信息
+_rule_set: RuleSet | None = None
+_source_context = None
+# 为 True 时检查 git 暂存区中的内容，只报告问题，不修改任何文件
+_staged = False
+
+
+def init_checker(rule_set: RuleSet, source_context: dict | None, staged=False):
     """
-    定义字符替换表。
-    规则：日语半角符号/ASCII符号 -> 中文全角符号
-    注意：特意【不包含】英文逗号 ','，因为它在 Title 中用作分隔符。
+    source_context 为 None 时不查找原文。否则包含：
+    root（翻译目录）、raw_dir（原始数据目录）、blobs（原始文件 -> 解析缓存路径）。
     """
-    return str.maketrans(
-        {
-            "　": " ",
+    global _rule_set, _source_context, _staged
+    rule_set.prepare()
+    _rule_set = rule_set
+    _source_context = source_context
+    _staged = staged
+
+
+def read_staged_json(file_path: Path):
+    """读取文件在 git 暂存区中的版本（即将被提交的内容），而不是工作区中的文件。"""
+    content = subprocess.run(
+        ["git", "-C", str(file_path.parent), "show", f":./{file_path.name}"],
+        capture_output=True,
+        check=True,
+    ).stdout
+    metrics.record_read(len(content))
+    return json.loads(content)
+
+
+@lru_cache(maxsize=4)
+def load_raw_grids(book_path: Path) -> dict:
+    """读取原始 book，返回 {表格ID: (行列表, Text 列号)}。同一 book 的多个表格连续检查时只读取一次。"""
+    book_data = load_book(book_path, _source_context["blobs"].get(book_path))
+    grids = {}
+    for grid in book_data.get("importGridList", []):
+        rows = grid.get("rows", [])
+        if not rows:
+            continue
+        try:
+            text_col_idx = rows[0].get("strings", []).index(DIALOGUE_TEXT_COL_NAME)
+        except ValueError:
+            continue
+        grids[grid["name"].split(":")[-1]] = (rows, text_col_idx)
+    return grids
+
+
+def raw_book_path(file_path: Path, root: Path, raw_dir: Path) -> Path | None:
+    """翻译文件 <book>/<表格ID>.json 对应的原始文件为 raw_dir/<book>.json。"""
+    try:
+        relative_path = file_path.resolve().relative_to(root.resolve())
+    except ValueError:
+        return None
+    if not relative_path.parent.name:
+        return None
+    return raw_dir / relative_path.parent.with_name(f"{relative_path.parent.name}.json")
+
+
+def load_source_lines(file_path: Path, count: int) -> list[str | None] | None:
+    """按打包时的对齐规则，返回每条翻译条目对应的原文；找不到原文时返回 None。"""
+    book_path = raw_book_path(
+        file_path, _source_context["root"], _source_context["raw_dir"]
+    )
+    if book_path is None or not book_path.exists():
+        return None
+    grid = load_raw_grids(book_path).get(file_path.stem)
+    if grid is None:
+        return None
+
+    rows, text_col_idx = grid
+    sources = [
+        strings[text_col_idx]
+        for strings, item in iter_aligned_rows(rows, text_col_idx, range(count))
+        if item is not None
+    ]
+    return sources + [None] * (count - len(sources))
+
+
+def check_file(file_path: Path) -> dict:
+    """
+    用启用的规则检查单个文件：全部规则在一次遍历中完成，修复统一应用，文件最多写回一次。
+    检查暂存区时只报告可以自动修复的内容，不写回。
+    不向控制台输出任何内容，而是返回结构化的结果，因此可以在子进程中运行。
+    """
+    result = {
+        "path": str(file_path),
+        "modified": False,
+        "fixes": [],
+        "issues": [],
+        "error": None,
+    }
+
+    try:
+        with metrics.phase("parse"):
+            if _staged:
+                data = read_staged_json(file_path)
+            else:
+                with file_path.open("r", encoding="utf-8") as f:
+                    metrics.record_read(os.fstat(f.fileno()).st_size)
+                    data = json.load(f)
+
+        if isinstance(data, list):
+            sources = None
+            if _source_context is not None:
+                sources = load_source_lines(file_path, len(data))
+
+            metrics.count("rows_checked", len(data))
+            result["fixes"], result["issues"] = _rule_set.run(data, sources)
+
+            # 如果该文件有任何修改，保存回磁盘（indent=4 与翻译文件的缩进一致）。
+            # 主进程随后会按新的指纹写入校验缓存，因此在返回结果之前等待写入完成
+            if result["fixes"] and not _staged:
+                with metrics.phase("write"):
+                    output_writer.write_json(file_path, data, indent=4)
+                output_writer.flush()
+                result["modified"] = True
+
+    except json.JSONDecodeError:
+        result["error"] = "JSON 损坏"
+    except subprocess.CalledProcessError as e:
+        result["error"] = f"无法读取暂存区内容: {e.stderr.decode('utf-8', 'replace').strip()}"
+    except Exception as e:
+        result["error"] = str(e)
+
+    # 各规则的调用次数与耗时随结果返回主进程汇总，耗时同时计入 --metrics 的阶段耗时
+    result["rule_timings"] = _rule_set.take_timings()
+    for name, timing in result["rule_timings"].items():
+        if "seconds" in timing:
+            metrics.record_phase(f"rule:{name}", timing["seconds"], timing["calls"])
+    return result
+
+
+def run_checks(
+    file_paths: list[Path],
+    jobs: int,
+    rule_set: RuleSet,
+    source_context: dict | None = None,
+    staged=False,
+) -> list[dict]:
+    """按输入顺序返回每个文件的检查结果，jobs > 1 时使用进程池并行检查。"""
+    if jobs <= 1 or len(file_paths) <= 1:
+        init_checker(rule_set, source_context, staged)
+        with metrics.phase("check"):
+            return [check_file(file_path) for file_path in file_paths]
+
+    # 按路径顺序分块，同一 book 的表格大多落在同一进程中，原始文件只需读取一次
+    chunksize = max(1, len(file_paths) // (jobs * 4))
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_checker,
+        initargs=(rule_set, source_context, staged),
+    ) as executor:
+        results = executor.map(
+            call_with_metrics, repeat(check_file), file_paths, chunksize=chunksize
+        )
+        return list(metrics.timed(metrics.collect(results), "check"))
+
+
+def print_report(results: list[dict], rules: dict[str, Rule]):
+    """在全部文件检查完成后，一次性输出按文件归类的问题报告。"""
+    for result in results:
+        if result["error"]:
+            print(f"[Error] {result['path']}: {result['error']}")
+            print("=" * 40)
+            continue
+
+        for fix in result["fixes"]:
+            print(f"[{rules[fix['rule']].label}] 文件: {result['path']}")
+            print(f"   位置: 第 {fix['index']} 项 (Name: {fix['name']})")
+            print(f"   原: {fix['old']}")
+            print(f"   新: {fix['new']}")
+            print("-" * 20)
+
+        for issue in result["issues"]:
+            rule = rules[issue["rule"]]
+            # 错误醒目标出，与警告区分
+            if issue["severity"] == ERROR:
+                prefix, indent, separator = "!!! ", "    ", "=" * 40
+            else:
+                prefix, indent, separator = "", "   ", "-" * 20
+            print(f"{prefix}[{rule.label}] 文件: {result['path']}")
+            location = f"第 {issue['index']} 项"
+            if issue["name"]:
+                location += f" (Name: {issue['name']})"
+            print(f"{indent}位置: {location}")
+            for line in rule.describe(issue):
+                print(f"{indent}{line}")
+            print(separator)
+
+
+def print_rule_summary(stats: dict):
+    """输出各规则发现的问题数（修复规则为修复数）、调用次数，以及计时开启时的累计耗时。"""
+    print("各规则的问题数：")
+    for name, rule_stats in stats["rules"].items():
+        label = SEVERITY_LABELS[rule_stats["severity"]]
+        line = f"  {name:<10} {label} {rule_stats['count']:>6}"
+        if rule_stats["seconds"] is not None:
+            line += f"  {rule_stats['seconds'] * 1000:>9.1f} ms"
+        print(f"{line}  （{rule_stats['calls']} 次调用）")
+
+
+def list_rules():
+    """输出所有规则的名称、严重程度、检查字段与说明（--list-rules）。"""
+    for rule_class in RULE_CLASSES:
+        state = "默认启用" if rule_class.default else "需手动启用"
+        fields = ", ".join(rule_class.fields)
+        print(
+            f"{rule_class.name:<10} [{SEVERITY_LABELS[rule_class.severity]}]"
+            f" {state}，检查字段: {fields}"
+        )
+        print(f"    {rule_class.description}")
+
+
+def build_rules(rule_names: list[str] | None, terms: dict | None) -> list[Rule]:
+    """
+    按名称构建启用的规则，顺序与 RULE_CLASSES 一致。
+    rule_names 为 None 时启用默认规则；terms 不为 None 时总是启用术语检查。
+    """
+    if rule_names is None:
+        selected = {
+            rule_class.name for rule_class in RULE_CLASSES if rule_class.default
         }
+    else:
+        selected = set(rule_names)
+    if terms is not None:
+        selected.add(GlossaryRule.name)
+
+    rules = []
+    for rule_class in RULE_CLASSES:
+        if rule_class.name not in selected:
+            continue
+        if rule_class is GlossaryRule:
+            rules.append(GlossaryRule(terms))
+        elif rule_class is SpeakerRule:
+            names_map_path = Path(NAMES_MAP_FILE)
+            try:
+                names = read_json(names_map_path) if names_map_path.exists() else {}
+            except json.JSONDecodeError:
+                names = None
+            if not isinstance(names, dict):
+                print(f"警告: '{NAMES_MAP_FILE}' 文件格式错误，跳过 speaker 规则。")
+                continue
+            rules.append(SpeakerRule(names))
+        else:
+            rules.append(rule_class())
+    return rules
+
+
+def git_changed_files(directory, since=None, staged=False) -> list[Path]:
+    """
+    询问本地 git，返回目录下发生变化的 JSON 文件（相对当前工作目录的路径）。
+    staged=True 时只看暂存区（文件在工作区中被删除也会保留）；
+    否则对比 since 指定的提交与工作区，并包含未跟踪的新文件。
+    """
+    top_level = Path(
+        subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
     )
 
+    diff_cmd = ["git", "diff", "--name-only", "--diff-filter=ACMR", "-z"]
+    diff_cmd += ["--cached"] if staged else [since]
+    commands = [diff_cmd + ["--", str(directory)]]
+    if not staged:
+        commands.append(
+            ["git", "ls-files", "--others", "--exclude-standard", "-z", "--full-name"]
+            + ["--", str(directory)]
+        )
+
+    changed = set()
+    for command in commands:
+        output = subprocess.run(
+            command, capture_output=True, text=True, encoding="utf-8", check=True
+        ).stdout
+        for name in output.split("\0"):
+            if name.endswith(".json"):
+                changed.add(top_level / name)
 
-def process_json_files(directory):
-    # 正则表达式：匹配 第x话,任意内容,B或P
-    title_pattern = re.compile(r"^第\d+话,.+,[BP]$")
+    cwd = Path.cwd()
+    file_paths = []
+    for file_path in sorted(changed):
+        if not staged and not file_path.exists():
+            continue
+        try:
+            file_paths.append(file_path.relative_to(cwd))
+        except ValueError:
+            file_paths.append(file_path)
+    return file_paths
 
-    # 获取替换表
-    trans_table = get_replacement_table()
 
+def process_json_files(
+    directory,
+    jobs=1,
+    use_cache=True,
+    report_path=None,
+    file_paths=None,
+    glossary_raw_dir=None,
+    glossary_file=GLOSSARY_FILE,
+    rule_names=None,
+    staged=False,
+    timed=False,
+):
+    """
+    检查目录下的 JSON 文件并返回统计信息。
+    file_paths 不为 None 时只检查给定的文件（例如 git 变更的文件），检查内容与全量扫描相同。
+    staged 为 True 时检查这些文件在 git 暂存区中的内容：不使用校验缓存，也不写回修复。
+    timed 为 True 时统计每条规则的耗时（逐条目计时有额外开销，只在需要报告时开启）。
+    glossary_raw_dir 不为 None 时，额外对照该目录下的原始文件检查术语译法。
+    rule_names 为启用的规则名列表，None 表示默认规则。
+    """
     root_path = Path(directory)
     if not root_path.exists():
         print(f"错误: 目录不存在 -> {directory}")
-        return
+        return None
+
+    terms = None
+    if glossary_raw_dir is not None:
+        if not Path(glossary_raw_dir).is_dir():
+            print(f"错误: 原始数据目录不存在 -> {glossary_raw_dir}")
+            return None
+        try:
+            terms = load_glossary(Path(glossary_file), Path(NAMES_MAP_FILE))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"错误: 无法读取术语表 '{glossary_file}': {e}")
+            return None
+
+    rules = build_rules(rule_names, terms)
+    rule_set = RuleSet(rules, timed=timed)
 
     print(f"开始处理目录: {root_path.resolve()}\n")
-    print("逻辑: 1. 全局格式化符号  2. 检查 Title 格式\n" + "-" * 40)
+    logic = "规则: " + "  ".join(
+        f"{number}. {rule.label}" for number, rule in enumerate(rules, 1)
+    )
+    if terms is not None:
+        logic += f"（{len(terms)} 条术语）"
+    print(logic + "\n" + "-" * 40)
 
-    stats = {"files_scanned": 0, "files_modified": 0, "format_errors": 0}
+    cache = BuildManifest(Path(CHECK_CACHE_FILE))
+    # 启用的规则或其配置变化时缓存整体失效；开启术语检查时使用独立的缓存，互不影响
+    config = {"rules": rule_set.config()}
+    if terms is not None:
+        config["raw_dir"] = Path(glossary_raw_dir).resolve().as_posix()
+    stage = cache.stage("check" if terms is None else "check_glossary", config)
+    if not use_cache:
+        stage.entries.clear()
 
-    # 使用 rglob 递归查找所有 json
-    for file_path in root_path.rglob("*.json"):
-        stats["files_scanned"] += 1
-        file_changed = False
+    # 使用 rglob 递归查找所有 json，跳过上次已通过且未变化的文件
+    full_scan = file_paths is None
+    if full_scan:
+        with metrics.phase("glob"):
+            file_paths = sorted(root_path.rglob("*.json"))
+    elif staged:
+        print(f"检查 git 暂存区中有变化的 {len(file_paths)} 个文件（只报告，不修改文件）。")
+    else:
+        print(f"仅检查 git 中有变化的 {len(file_paths)} 个文件。")
+    if staged:
+        # 缓存记录的是工作区文件的指纹，不能用来判断暂存区中的内容
+        pending_paths = list(file_paths)
+    else:
+        pending_paths = [
+            file_path
+            for file_path in file_paths
+            if stage.get(file_path.as_posix(), file_path) is None
+        ]
 
-        try:
-            with file_path.open("r", encoding="utf-8") as f:
-                data = json.load(f)
+    source_context = None
+    if terms is not None:
+        # 在主进程中定位原始文件的解析缓存，子进程直接读取缓存文件
+        corpus_cache = CorpusCache(Path(CORPUS_CACHE_DIR))
+        raw_dir = Path(glossary_raw_dir)
+        blobs = {}
+        for file_path in pending_paths:
+            book_path = raw_book_path(file_path, root_path, raw_dir)
+            if book_path is not None and book_path not in blobs and book_path.exists():
+                blobs[book_path] = corpus_cache.blob_path(book_path)
+        source_context = {"root": root_path, "raw_dir": raw_dir, "blobs": blobs}
 
-            if not isinstance(data, list):
-                continue
+    results = run_checks(pending_paths, jobs, rule_set, source_context, staged)
+    if source_context is not None:
+        corpus_cache.save()
+    if not staged:
+        for file_path, result in zip(pending_paths, results):
+            # 警告不影响退出码，但仍需在下次检查时继续报告，因此同样不写入缓存
+            if result["error"] or result["issues"]:
+                stage.discard(file_path.as_posix())
+            else:
+                stage.put(file_path.as_posix(), file_path, refresh=result["modified"])
+        if full_scan:
+            # 只有全量扫描时才能确定哪些文件已被删除
+            stage.prune()
+        cache.save()
 
-            # 遍历 JSON 列表中的每一项
-            for index, item in enumerate(data):
-                original_message = item.get("message")
-
-                # 如果 message 字段存在且是字符串，则进行处理
-                if original_message and isinstance(original_message, str):
-                    # --- 步骤 1: 对【所有】消息进行格式化 ---
-                    new_message = original_message.translate(trans_table)
-
-                    # 如果内容发生了改变
-                    if new_message != original_message:
-                        print(f"[自动修复符号] 文件: {file_path.name}")
-                        print(
-                            f"   位置: 第 {index + 1} 项 (Name: {item.get('name', 'Unknown')})"
-                        )
-                        print(f"   原: {original_message}")
-                        print(f"   新: {new_message}")
-                        print("-" * 20)
-
-                        # 更新数据
-                        item["message"] = new_message
-                        file_changed = True
-
-                    # --- 步骤 2: 仅对 Name 为 Title 的消息进行格式检查 ---
-                    if item.get("name") == "Title":
-                        # 检查的是可能已经被修复过的内容
-                        if not title_pattern.match(new_message):
-                            print(f"!!! [Title格式错误] 文件: {file_path}")
-                            print(f"    位置: 第 {index + 1} 项")
-                            print(f"    内容: {new_message}")
-                            print("    期待: 第x话,标题,B (或P)")
-                            print("=" * 40)
-                            stats["format_errors"] += 1
-
-            # 如果该文件有任何修改，保存回磁盘
-            if file_changed:
-                with file_path.open("w", encoding="utf-8") as f:
-                    # ensure_ascii=False 保证中文可读，indent=4 保持缩进
-                    json.dump(data, f, ensure_ascii=False, indent=4)
-                stats["files_modified"] += 1
-
-        except json.JSONDecodeError:
-            print(f"[Error] JSON 损坏: {file_path}")
-        except Exception as e:
-            print(f"[Error] {file_path}: {e}")
+    rules_by_name = {rule.name: rule for rule in rules}
+    print_report(results, rules_by_name)
+
+    counts = Counter()
+    rule_stats = {
+        rule.name: {
+            "severity": rule.severity,
+            "count": 0,
+            "seconds": 0.0 if timed else None,
+            "calls": 0,
+        }
+        for rule in rules
+    }
+    for result in results:
+        for fix in result["fixes"]:
+            rule_stats[fix["rule"]]["count"] += 1
+        for issue in result["issues"]:
+            rule_stats[issue["rule"]]["count"] += 1
+            counts[issue["severity"]] += 1
+        for name, timing in result.pop("rule_timings").items():
+            if timed:
+                rule_stats[name]["seconds"] += timing["seconds"]
+            rule_stats[name]["calls"] += timing["calls"]
+
+    stats = {
+        "files_scanned": len(file_paths),
+        "files_cached": len(file_paths) - len(pending_paths),
+        "files_modified": sum(result["modified"] for result in results),
+        "errors": counts[ERROR],
+        "warnings": counts[WARNING],
+        "file_errors": sum(result["error"] is not None for result in results),
+        "rules": rule_stats,
+    }
+
+    if report_path:
+        issues = [
+            result
+            for result in results
+            if result["error"] or result["fixes"] or result["issues"]
+        ]
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"stats": stats, "issues": issues}, f, ensure_ascii=False, indent=2
+            )
 
     print("\n" + "=" * 40)
     print("处理完成。")
     print(f"扫描文件数: {stats['files_scanned']}")
+    print(f"未变化跳过: {stats['files_cached']}")
     print(f"修改文件数: {stats['files_modified']}")
-    print(f"Title错误数: {stats['format_errors']}")
+    print(f"错误数: {stats['errors']}")
+    print(f"警告数: {stats['warnings']}")
+    if stats["file_errors"]:
+        print(f"读取失败数: {stats['file_errors']}")
+    print_rule_summary(stats)
+    if staged and any(result["fixes"] for result in results):
+        print(
+            "暂存区中有可自动修复的内容：请不加 --staged 运行一次 check.py，"
+            "确认修改后重新 git add。"
+        )
+    if report_path:
+        print(f"结构化报告已写入: {report_path}")
+    return stats
 
 
-if __name__ == "__main__":
-    target_directory = "out/3_Translated"
+def main():
+    parser = argparse.ArgumentParser(description="检查并修复翻译文件的格式")
+    parser.add_argument(
+        "directory",
+        nargs="?",
+        default=DEFAULT_TARGET_DIR,
+        help=f"要检查的目录，默认为 '{DEFAULT_TARGET_DIR}'。",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="并行检查的进程数，默认 1（串行），0 表示使用全部 CPU 核心。",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="忽略校验缓存，重新检查所有文件。",
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        metavar="GIT_REF",
+        help="只检查相对于指定 git 提交有变化（含未跟踪）的文件，适合作为 pre-commit 钩子。",
+    )
+    parser.add_argument(
+        "--staged",
+        action="store_true",
+        help=(
+            "检查 git 暂存区中有变化的文件，读取的是暂存区中的内容（即将提交的版本），"
+            "只报告问题，不修改文件，适合作为 pre-commit 钩子。"
+        ),
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        help="将问题报告以 JSON 格式写入指定文件。",
+    )
+    parser.add_argument(
+        "--glossary",
+        type=str,
+        metavar="RAW_DIR",
+        help=(
+            "对照 RAW_DIR 中的原始文件检查术语译法：原文含术语而译文未使用规定译法时给出警告（不影响退出码）。"
+            "其他规则也会参考对应的原文。"
+        ),
+    )
+    parser.add_argument(
+        "--glossary-file",
+        type=str,
+        default=GLOSSARY_FILE,
+        help=f"术语表文件，默认为 '{GLOSSARY_FILE}'；'{NAMES_MAP_FILE}' 中已翻译的角色名也会一并检查。",
+    )
+    parser.add_argument(
+        "--rules",
+        type=str,
+        metavar="NAMES",
+        help="只启用指定的规则，多个规则用逗号分隔，例如 'title,kana'。默认启用全部默认规则。",
+    )
+    parser.add_argument(
+        "--list-rules",
+        action="store_true",
+        help="列出所有规则及其说明后退出。",
+    )
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
 
-    process_json_files(target_directory)
+    if args.list_rules:
+        list_rules()
+        return
+    if args.since and args.staged:
+        parser.error("--since 与 --staged 不能同时使用。")
+    if args.rules is not None:
+        args.rules = [name.strip() for name in args.rules.split(",") if name.strip()]
+        known_names = {rule_class.name for rule_class in RULE_CLASSES}
+        unknown_names = [name for name in args.rules if name not in known_names]
+        if unknown_names:
+            parser.error(
+                f"未知的规则: {', '.join(unknown_names)}，可用 --list-rules 查看。"
+            )
+        if GlossaryRule.name in args.rules and not args.glossary:
+            parser.error("glossary 规则需要通过 --glossary RAW_DIR 提供原始数据目录。")
+    try:
+        run_instrumented("check", run_check, args)
+    finally:
+        output_writer.close()
+
+
+def run_check(args):
+    """按命令行参数执行检查；存在 error 级别的问题或损坏的文件时以非零状态码退出。"""
+    file_paths = None
+    if args.since or args.staged:
+        try:
+            file_paths = git_changed_files(
+                args.directory, since=args.since, staged=args.staged
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, "stderr", None)
+            print(f"错误: 无法从 git 获取变更文件: {(stderr or str(e)).strip()}")
+            sys.exit(2)
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    stats = process_json_files(
+        args.directory,
+        jobs=jobs,
+        use_cache=not args.no_cache,
+        report_path=args.report,
+        file_paths=file_paths,
+        glossary_raw_dir=args.glossary,
+        glossary_file=args.glossary_file,
+        rule_names=args.rules,
+        staged=args.staged,
+        # 只有需要输出耗时的报告时才为每条规则计时
+        timed=bool(args.report or args.metrics or args.profile),
+    )
+
+    # 存在 error 级别的问题（例如 Title 格式错误）或损坏的文件时返回非零退出码，
+    # 便于 git 钩子拦截提交；警告不影响退出码
+    if stats is None or stats["errors"] or stats["file_errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+import re
+import time
+
+from build_manifest import hash_config
+from corpus_layout import KANA_PATTERN
+from glossary import GlossaryChecker
+
+# 问题的严重程度：error 会使检查以非零状态码退出，warning 只报告；fix 表示只做自动修复的规则
+ERROR = "error"
+WARNING = "warning"
+FIX = "fix"
+SEVERITY_LABELS = {ERROR: "错误", WARNING: "警告", FIX: "修复"}
+
+# 正则表达式：匹配 第x话,任意内容,B或P
+TITLE_PATTERN = re.compile(r"^第\d+话,.+,[BP]$")
+# 富文本标签，例如 <ruby=かな>汉字</ruby>、<emoji=heart04>
+MARKUP_PATTERN = re.compile(r"<[^>]*>")
+
+
+def get_replacement_table():
+    """
+    定义字符替换表。
+    规则：日语半角符号/ASCII符号 -> 中文全角符号
+    注意：特意【不包含】英文逗号 ','，因为它在 Title 中用作分隔符。
+    """
+    return str.maketrans(
+        {
+            "　": " ",
+        }
+    )
+
+
+def bracket_balance(text: str) -> str | None:
+    """检查「」是否成对：返回 None 表示成对，否则返回问题描述。"""
+    opening = text.find("「")
+    closing = text.find("」")
+    if opening < 0 and closing < 0:
+        return None
+    # 绝大多数台词是一对完整的「」，无需逐字扫描
+    if (
+        0 <= opening < closing
+        and text.find("「", opening + 1) < 0
+        and text.find("」", closing + 1) < 0
+    ):
+        return None
+    depth = 0
+    for char in text:
+        if char == "「":
+            depth += 1
+        elif char == "」":
+            depth -= 1
+            if depth < 0:
+                return "多余的」"
+    return "「未闭合" if depth else None
+
+
+class Rule:
+    """
+    检查规则的基类。子类通过类属性声明：
+    - name：规则名，用于 --rules；label：报告中的标题；description：--list-rules 中的说明；
+    - severity：见 ERROR / WARNING / FIX；default：未指定 --rules 时是否启用
+      （默认只启用修复符号与 Title 格式检查，其余规则通过 --rules 按需启用）；
+    - fields：读取的条目字段，这些字段都是字符串时才会调用该规则；
+    - fix_field：可自动修复的字段，由 fix 返回修复后的值；
+    - needs_source：是否需要对应的原文（由 --glossary 提供），其他规则在有原文时也可以参考。
+    check 返回问题列表，每个问题是附加到报告中的字典；没有问题时返回空值。
+    规则对象会被传给检查子进程，不便序列化的对象（例如自动机）应在 prepare 中构建。
+    """
+
+    name = ""
+    label = ""
+    description = ""
+    severity = WARNING
+    default = True
+    fields: tuple[str, ...] = ("message",)
+    fix_field: str | None = None
+    needs_source = False
+
+    def prepare(self):
+        """在每个进程中调用一次。"""
+
+    def config(self):
+        """影响检查结果的配置，会写入校验缓存的指纹，变化时缓存失效。"""
+        return None
+
+    def fix(self, value: str) -> str:
+        return value
+
+    def check(self, item: dict, source: str | None) -> list[dict] | None:
+        return None
+
+    def describe(self, issue: dict) -> list[str]:
+        """报告中每个问题的详细内容（文件与位置之外的部分）。"""
+        return [f"内容: {issue['message']}"]
+
+
+class SymbolRule(Rule):
+    name = "symbols"
+    label = "自动修复符号"
+    description = "将全角空格等符号替换为规定的写法（自动修复）。"
+    severity = FIX
+    fix_field = "message"
+
+    def __init__(self):
+        self.table = get_replacement_table()
+        # str.translate 需要逐字复制整段文本；绝大多数条目不含待替换的字符，先用正则查找
+        self._pattern = re.compile(
+            "[" + re.escape("".join(map(chr, self.table))) + "]"
+        )
+
+    def config(self):
+        return sorted(self.table.items())
+
+    def fix(self, value: str) -> str:
+        if self._pattern.search(value) is None:
+            return value
+        return value.translate(self.table)
+
+
+class TitleRule(Rule):
+    name = "title"
+    label = "Title格式错误"
+    description = "Name 为 Title 的条目必须符合 第x话,标题,B (或P)，否则游戏无法加载脚本。"
+    severity = ERROR
+    fields = ("name", "message")
+
+    def config(self):
+        return TITLE_PATTERN.pattern
+
+    def check(self, item: dict, source: str | None) -> list[dict] | None:
+        if item["name"] == "Title" and not TITLE_PATTERN.match(item["message"]):
+            return [{}]
+        return None
+
+    def describe(self, issue: dict) -> list[str]:
+        return [f"内容: {issue['message']}", "期待: 第x话,标题,B (或P)"]
+
+
+class EmptyRule(Rule):
+    name = "empty"
+    label = "空白译文"
+    description = "译文为空或只有空白字符（有原文时，原文同样为空白的条目不报告）。"
+    default = False
+
+    def check(self, item: dict, source: str | None) -> list[dict] | None:
+        if not item["message"].strip() and (source is None or source.strip()):
+            return [{}]
+        return None
+
+    def describe(self, issue: dict) -> list[str]:
+        return [f"内容: {issue['message']!r}"]
+
+
+class KanaRule(Rule):
+    name = "kana"
+    label = "残留假名"
+    description = "译文中残留日文假名，可能是漏翻（<ruby=...> 等标签中的注音不计）。"
+    default = False
+
+    def config(self):
+        return [KANA_PATTERN.pattern, MARKUP_PATTERN.pattern]
+
+    def check(self, item: dict, source: str | None) -> list[dict] | None:
+        message = item["message"]
+        # 先直接查找假名，只有出现假名时才去掉标签后再次确认
+        if KANA_PATTERN.search(message) and KANA_PATTERN.search(
+            MARKUP_PATTERN.sub("", message)
+        ):
+            return [{}]
+        return None
+
+
+class BracketRule(Rule):
+    name = "brackets"
+    label = "引号不成对"
+    description = "译文中的「」不成对（有原文时，与原文不成对的情况相同则不报告）。"
+    default = False
+
+    def check(self, item: dict, source: str | None) -> list[dict] | None:
+        problem = bracket_balance(item["message"])
+        # 一句台词跨多行时，原文本身的「」也不成对
+        if problem is None or (
+            source is not None and bracket_balance(source) == problem
+        ):
+            return None
+        return [{"problem": problem}]
+
+    def describe(self, issue: dict) -> list[str]:
+        return [f"问题: {issue['problem']}", f"内容: {issue['message']}"]
+
+
+class SpeakerRule(Rule):
+    name = "speaker"
+    label = "说话人被翻译"
+    description = "Name 应保留原文中的角色名（names.json 的键），不能替换为 names.json 中的译名。"
+    default = False
+    fields = ("name",)
+
+    def __init__(self, names: dict[str, str]):
+        self.names = names
+        self._originals = {}
+
+    def config(self):
+        return hash_config(self.names)
+
+    def prepare(self):
+        # 译名 -> 原名；译名恰好也是某个原名时无法区分，不报告
+        self._originals = {
+            translated: name
+            for name, translated in self.names.items()
+            if translated != name and translated not in self.names
+        }
+
+    def check(self, item: dict, source: str | None) -> list[dict] | None:
+        original = self._originals.get(item["name"])
+        if original is not None:
+            return [{"expected": original}]
+        return None
+
+    def describe(self, issue: dict) -> list[str]:
+        return [f"说话人: {issue['name']} -> 应为 {issue['expected']}"]
+
+
+class GlossaryRule(Rule):
+    name = "glossary"
+    label = "术语不一致"
+    description = "原文含术语而译文未使用规定译法（需要 --glossary RAW_DIR）。"
+    default = False
+    needs_source = True
+
+    def __init__(self, terms: dict[str, str]):
+        self.terms = terms
+        self._checker = None
+
+    def config(self):
+        return hash_config(self.terms)
+
+    def prepare(self):
+        # 术语自动机只在每个进程中构建一次
+        self._checker = GlossaryChecker(self.terms)
+
+    def check(self, item: dict, source: str | None) -> list[dict] | None:
+        if not source:
+            return None
+        return [
+            {"term": src, "expected": dst, "source": source}
+            for src, dst in self._checker.missing_terms(source, item["message"])
+        ]
+
+    def describe(self, issue: dict) -> list[str]:
+        return [
+            f"术语: {issue['term']} -> {issue['expected']}",
+            f"原文: {issue['source']}",
+            f"译文: {issue['message']}",
+        ]
+
+
+# 全部规则，按检查顺序排列；需要额外数据的规则由 check.py 传入参数构建
+RULE_CLASSES = [
+    SymbolRule,
+    TitleRule,
+    EmptyRule,
+    KanaRule,
+    BracketRule,
+    SpeakerRule,
+    GlossaryRule,
+]
+
+
+class RuleSet:
+    """
+    将多条规则编译为每个文件只遍历一遍的检查：
+    逐个条目先按顺序应用全部修复，再对修复后的内容运行全部检查。
+    每条规则只在其声明的字段都是字符串时调用。条目中哪些字段是字符串用一个位掩码表示，
+    每种掩码对应的规则列表预先编译好，遍历时不再逐条规则判断字段。
+    调用次数总是统计；timed=True 时还按规则分别累计耗时，计时本身有开销，只在需要时开启。
+    """
+
+    def __init__(self, rules: list[Rule], timed: bool = False):
+        self.rules = rules
+        self.timed = timed
+        self.fields = tuple(
+            dict.fromkeys(field for rule in rules for field in rule.fields)
+        )
+        self.needs_source = any(rule.needs_source for rule in rules)
+        self._plans = None
+        self._reset_timings()
+
+    def _reset_timings(self):
+        self._seconds = [0.0] * len(self.rules)
+        # 各掩码出现的次数，用于推算每条规则的调用次数
+        self._mask_counts = [0] * (1 << len(self.fields))
+
+    def _rule_mask(self, rule: Rule) -> int:
+        mask = 0
+        for field in rule.fields:
+            mask |= 1 << self.fields.index(field)
+        return mask
+
+    def prepare(self):
+        """在每个进程中调用一次：准备各条规则，并为每种字段掩码编译修复与检查列表。"""
+        for rule in self.rules:
+            rule.prepare()
+        self._plans = []
+        for mask in range(1 << len(self.fields)):
+            applicable = [
+                (position, rule)
+                for position, rule in enumerate(self.rules)
+                if self._rule_mask(rule) & mask == self._rule_mask(rule)
+            ]
+            fixers = [
+                (position, rule, rule.fix_field)
+                for position, rule in applicable
+                if rule.fix_field is not None
+            ]
+            checkers = [
+                (position, rule, rule.check)
+                for position, rule in applicable
+                if type(rule).check is not Rule.check
+            ]
+            self._plans.append((fixers, checkers))
+
+    def config(self) -> dict:
+        return {rule.name: rule.config() for rule in self.rules}
+
+    def run(self, data: list, sources: list[str | None] | None = None):
+        """
+        检查并就地修复 data 中的条目，返回 (修复列表, 问题列表)。
+        sources 为每个条目对应的原文，没有原文时为 None。
+        """
+        fixes = []
+        issues = []
+        plans = self._plans
+        seconds = self._seconds
+        mask_counts = self._mask_counts
+        field_bits = [(1 << bit, field) for bit, field in enumerate(self.fields)]
+        timed = self.timed
+        perf_counter = time.perf_counter
+        start = 0.0
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                continue
+            mask = 0
+            for bit, field in field_bits:
+                if isinstance(item.get(field), str):
+                    mask |= bit
+            mask_counts[mask] += 1
+            fixers, checkers = plans[mask]
+
+            # 计时首尾相接：每次调用之后只取一次时间，作为下一次调用的起点
+            if timed:
+                start = perf_counter()
+            for position, rule, field in fixers:
+                old_value = item[field]
+                new_value = rule.fix(old_value)
+                if timed:
+                    now = perf_counter()
+                    seconds[position] += now - start
+                    start = now
+                if new_value != old_value:
+                    fixes.append(
+                        {
+                            "rule": rule.name,
+                            "index": index + 1,
+                            "name": item.get("name", "Unknown"),
+                            "old": old_value,
+                            "new": new_value,
+                        }
+                    )
+                    item[field] = new_value
+                    if timed:
+                        start = perf_counter()
+
+            source = sources[index] if sources else None
+            for position, rule, check in checkers:
+                found = check(item, source)
+                if timed:
+                    now = perf_counter()
+                    seconds[position] += now - start
+                    start = now
+                if found:
+                    for detail in found:
+                        issues.append(
+                            {
+                                "rule": rule.name,
+                                "severity": rule.severity,
+                                "index": index + 1,
+                                "name": item.get("name"),
+                                "message": item.get("message"),
+                                **detail,
+                            }
+                        )
+                    if timed:
+                        start = perf_counter()
+        return fixes, issues
+
+    def take_timings(self) -> dict[str, dict]:
+        """取出并清空各规则的调用次数，以及（timed=True 时）累计的耗时。"""
+        timings = {}
+        for position, rule in enumerate(self.rules):
+            rule_mask = self._rule_mask(rule)
+            calls = sum(
+                count
+                for mask, count in enumerate(self._mask_counts)
+                if mask & rule_mask == rule_mask
+            )
+            if calls:
+                timings[rule.name] = {"calls": calls}
+                if self.timed:
+                    timings[rule.name]["seconds"] = self._seconds[position]
+        self._reset_timings()
+        return timings
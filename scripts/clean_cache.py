@@ -1,32 +1,23 @@
+import argparse
+import json
 import os
 import shutil
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# ================= 配置区域 =================
+from metrics import add_instrumentation_arguments, metrics, run_instrumented
 
+# 默认的 Unity 缓存目录，可在命令行中指定其他路径
 CACHE_PATH = "C:/Users/jhq223/AppData/LocalLow/Unity/FANZAGAMES_twinkle_starknightsX"
-
-# 【安全开关】
-# True = 模拟运行（只列出会被删除的文件，不执行删除）
-# False = 实际运行（真的会删除文件，请谨慎！）
-DRY_RUN = False
-
-# ===========================================
-
-
-def get_dir_size(path):
-    """计算文件夹大小"""
-    total = 0
-    try:
-        for entry in os.scandir(path):
-            if entry.is_file():
-                total += entry.stat().st_size
-            elif entry.is_dir():
-                total += get_dir_size(entry.path)
-    except Exception:
-        pass
-    return total
+# 扫描与删除的线程数。耗时主要在文件系统调用上，线程数可以多于 CPU 核心数
+DEFAULT_JOBS = 16
+# 扫描索引：记录每个资源包目录的修改时间与各版本的大小，目录没有变化时下次不再完整遍历。
+# 索引保存在缓存目录旁边（同一父目录下），与当前工作目录无关，每个缓存目录各有一份
+INDEX_FILE_SUFFIX = ".clean_cache_index.json"
+INDEX_VERSION = 1
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
 
 
 def format_size(size):
@@ -38,92 +29,492 @@ def format_size(size):
     return f"{size:.2f} TB"
 
 
-def clean_unity_cache():
-    root = Path(CACHE_PATH)
+def parse_size(text: str) -> int:
+    """解析 '20G'、'500MB'、'1.5TiB' 这样的大小（以 1024 为进制），供 --max-size 使用。"""
+    value = text.strip().upper().removesuffix("IB").removesuffix("B")
+    unit = value[-1:] if value[-1:] in SIZE_UNITS else ""
+    try:
+        size = float(value[: len(value) - len(unit)]) * SIZE_UNITS[unit]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法解析的大小: '{text}'")
+    if size < 0:
+        raise argparse.ArgumentTypeError(f"大小不能为负数: '{text}'")
+    return int(size)
 
-    if not root.exists():
-        print(f"[错误] 路径不存在: {CACHE_PATH}")
-        return
 
-    print(f"正在扫描目录: {CACHE_PATH}")
-    print(
-        f"当前模式: {'【模拟运行 - 不会删除文件】' if DRY_RUN else '【执行模式 - 将删除旧文件】'}"
-    )
-    print("-" * 60)
+def scan_version(path: str) -> tuple[int, os.stat_result | None]:
+    """
+    遍历一个版本目录，返回 (总大小, __data 的 stat 结果)。没有 __data 时后者为 None。
+    读取失败的条目会被忽略。
+    """
+    size = 0
+    data_stat = None
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    size += stat.st_size
+                    if directory == path and entry.name == "__data":
+                        data_stat = stat
+        except OSError:
+            continue
+    return size, data_stat
 
-    cleaned_count = 0
-    freed_space = 0
-    bundles_checked = 0
 
-    # 1. 遍历第一层目录 (AssetBundle ID)
-    for bundle_dir in root.iterdir():
-        if not bundle_dir.is_dir():
-            continue
+def version_info(path: str, size: int, data_stat: os.stat_result) -> dict:
+    return {
+        "name": os.path.basename(path),
+        "path": path,
+        "mtime": data_stat.st_mtime,
+        "data_mtime_ns": data_stat.st_mtime_ns,
+        # 最近一次使用的时间：游戏读取 __data 时更新访问时间，下载时更新修改时间
+        "last_used": max(data_stat.st_atime, data_stat.st_mtime),
+        "size": size,
+    }
 
-        bundles_checked += 1
 
-        # 2. 寻找该ID下的所有版本目录
-        # 过滤条件：必须是文件夹，且里面包含 __data 文件
-        version_dirs = []
-        for v_dir in bundle_dir.iterdir():
-            if v_dir.is_dir() and (v_dir / "__data").exists():
-                version_dirs.append(v_dir)
+def refresh_versions(path: str, cached_versions: list[dict]) -> list[dict] | None:
+    """
+    按索引中的记录重新读取各版本 __data 的时间；__data 的修改时间未变的版本沿用记录的大小。
+    有版本的 __data 已不存在时返回 None，由调用方完整重新扫描。
+    """
+    versions = []
+    for cached in cached_versions:
+        version_path = os.path.join(path, cached["name"])
+        try:
+            data_stat = os.stat(os.path.join(version_path, "__data"))
+        except OSError:
+            return None
+        if data_stat.st_mtime_ns == cached["data_mtime_ns"]:
+            size = cached["size"]
+        else:
+            size, data_stat = scan_version(version_path)
+            if data_stat is None:
+                return None
+        versions.append(version_info(version_path, size, data_stat))
+    return versions
 
-        # 如果只有一个版本或没有版本，跳过
-        if len(version_dirs) <= 1:
-            continue
 
-        # 3. 对比时间，找出最新的
-        # 创建列表: [(时间戳, 文件夹路径), ...]
-        versions_with_time = []
-        for v_dir in version_dirs:
-            data_file = v_dir / "__data"
-            mtime = data_file.stat().st_mtime
-            versions_with_time.append((mtime, v_dir))
+def scan_bundle(path: str, cached: dict | None = None) -> dict:
+    """
+    扫描一个资源包目录（AssetBundle ID），只遍历一次即得到各版本的大小与 __data 的时间。
+    只有包含 __data 文件的子目录才视为版本，结果按修改时间从新到旧排列。
+    cached 为上次索引中的记录：目录的修改时间未变（没有增删版本）时不再遍历各版本目录。
+    """
+    name = os.path.basename(path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        versions = None
+        if cached is not None and cached["mtime_ns"] == mtime_ns:
+            versions = refresh_versions(path, cached["versions"])
+        rescanned = versions is None
+        if rescanned:
+            with os.scandir(path) as entries:
+                version_paths = [
+                    entry.path
+                    for entry in entries
+                    if entry.is_dir(follow_symlinks=False)
+                ]
+    except OSError as e:
+        return {
+            "name": name,
+            "path": path,
+            "mtime_ns": None,
+            "versions": [],
+            "error": str(e),
+            "rescanned": True,
+        }
 
-        # 按时间降序排序 (最新的在第一个)
-        versions_with_time.sort(key=lambda x: x[0], reverse=True)
+    if rescanned:
+        versions = []
+        for version_path in version_paths:
+            size, data_stat = scan_version(version_path)
+            if data_stat is not None:
+                versions.append(version_info(version_path, size, data_stat))
+    versions.sort(key=lambda version: version["mtime"], reverse=True)
+    return {
+        "name": name,
+        "path": path,
+        "mtime_ns": mtime_ns,
+        "versions": versions,
+        "error": None,
+        "rescanned": rescanned,
+    }
 
-        latest_version = versions_with_time[0][1]
-        old_versions = versions_with_time[1:]
 
-        print(f"[发现重复] 资源包: {bundle_dir.name}")
-        print(
-            f"   - 保留最新: {latest_version.name} ({time.ctime(versions_with_time[0][0])})"
-        )
+def index_path_for(root: Path) -> Path:
+    """缓存目录 root 对应的扫描索引：<父目录>/.<目录名>.clean_cache_index.json。"""
+    resolved = root.resolve()
+    return resolved.parent / f".{resolved.name}{INDEX_FILE_SUFFIX}"
+
+
+def load_index(index_path: Path, cache_path: str) -> dict[str, dict]:
+    """读取上次保存的扫描索引；索引属于其他缓存目录、版本不符或已损坏时返回空索引。"""
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != INDEX_VERSION or data.get("cache_path") != cache_path:
+        return {}
+    return data.get("bundles", {})
+
+
+def save_index(index_path: Path, cache_path: str, bundles: list[dict]):
+    index = {
+        "version": INDEX_VERSION,
+        "cache_path": cache_path,
+        "bundles": {
+            bundle["name"]: {
+                "mtime_ns": bundle["mtime_ns"],
+                "versions": [
+                    {
+                        "name": version["name"],
+                        "data_mtime_ns": version["data_mtime_ns"],
+                        "size": version["size"],
+                    }
+                    for version in bundle["versions"]
+                ],
+            }
+            for bundle in bundles
+        },
+    }
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_name(f"{index_path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, index_path)
+
+
+def delete_tree(path: str) -> str | None:
+    """删除一个目录，成功时返回 None，失败时返回错误信息。"""
+    try:
+        shutil.rmtree(path)
+    except OSError as e:
+        return str(e)
+    return None
+
+
+def plan_eviction(bundles: list[dict], max_size: int) -> tuple[list[dict], int]:
+    """
+    去重后每个资源包只剩最新版本。总大小超过 max_size 时，
+    按最新版本的最近使用时间从旧到新淘汰整个资源包，直到不超过 max_size。
+    返回 (要淘汰的资源包, 淘汰后的总大小)。
+    """
+    kept_bytes = sum(
+        bundle["versions"][0]["size"] for bundle in bundles if bundle["versions"]
+    )
+    evicted = []
+    candidates = sorted(
+        (bundle for bundle in bundles if bundle["versions"]),
+        key=lambda bundle: bundle["versions"][0]["last_used"],
+    )
+    for bundle in candidates:
+        if kept_bytes <= max_size:
+            break
+        evicted.append(bundle)
+        kept_bytes -= bundle["versions"][0]["size"]
+    return evicted, kept_bytes
+
+
+def clean_unity_cache(args):
+    """
+    清理 Unity 缓存：每个资源包只保留 __data 最新的版本，删除其余旧版本；
+    指定 --max-size 时再按最近使用时间淘汰资源包，直到缓存不超过该大小。
+    扫描与删除都在线程池中并行进行；存在删除失败的目录时以非零状态码退出。
+    """
+    root = Path(args.cache_path)
+    dry_run = args.dry_run
+    jobs = args.jobs if args.jobs > 0 else None
+
+    if not root.is_dir():
+        print(f"[错误] 路径不存在: {root}")
+        sys.exit(1)
+
+    print(f"正在扫描目录: {root}")
+    print(
+        f"当前模式: {'【模拟运行 - 不会删除文件】' if dry_run else '【执行模式 - 将删除旧文件】'}"
+    )
+    if args.max_size is not None:
+        print(f"缓存上限: {format_size(args.max_size)}")
+    print("-" * 60)
 
-        # 4. 处理旧版本
-        for _, old_dir in old_versions:
-            size = get_dir_size(old_dir)
-            freed_space += size
-            cleaned_count += 1
+    index_path = index_path_for(root)
+    cache_key = str(root.resolve())
+    index = {} if args.full_scan else load_index(index_path, cache_key)
 
-            if DRY_RUN:
-                print(
-                    f"   - [模拟删除] 过期版本: {old_dir.name} (大小: {format_size(size)})"
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # 1. 并行扫描第一层目录 (AssetBundle ID)；索引中记录的目录没有变化时不再完整遍历
+        with metrics.phase("scan"):
+            with os.scandir(root) as entries:
+                bundle_paths = sorted(
+                    entry.path
+                    for entry in entries
+                    if entry.is_dir(follow_symlinks=False)
                 )
-            else:
-                try:
-                    shutil.rmtree(old_dir)
+        cached_entries = [index.get(os.path.basename(path)) for path in bundle_paths]
+        bundles = list(
+            metrics.timed(
+                executor.map(scan_bundle, bundle_paths, cached_entries), "scan"
+            )
+        )
+        metrics.count("bundles_checked", len(bundles))
+        metrics.count(
+            "bundles_rescanned", sum(bundle["rescanned"] for bundle in bundles)
+        )
+
+        # 2. 确定要淘汰的资源包；其余资源包中有多个版本的，除最新版本外全部删除
+        evicted, kept_bytes = [], None
+        if args.max_size is not None:
+            evicted, kept_bytes = plan_eviction(bundles, args.max_size)
+        evicted_names = {bundle["name"] for bundle in evicted}
+        duplicates = [
+            bundle
+            for bundle in bundles
+            if len(bundle["versions"]) > 1 and bundle["name"] not in evicted_names
+        ]
+        deletions = {}
+        if not dry_run:
+            for bundle in duplicates:
+                for version in bundle["versions"][1:]:
+                    deletions[version["path"]] = executor.submit(
+                        delete_tree, version["path"]
+                    )
+            for bundle in evicted:
+                deletions[bundle["path"]] = executor.submit(delete_tree, bundle["path"])
+
+        # 3. 按资源包顺序输出结果，同时等待对应的删除完成
+        stats = {
+            "cache_path": str(root),
+            "dry_run": dry_run,
+            "bundles_checked": len(bundles),
+            "bundles_rescanned": sum(bundle["rescanned"] for bundle in bundles),
+            "versions_scanned": sum(len(bundle["versions"]) for bundle in bundles),
+            "cache_bytes": sum(
+                version["size"] for bundle in bundles for version in bundle["versions"]
+            ),
+            "duplicate_bundles": len(duplicates),
+            "old_versions": 0,
+            "old_version_bytes": 0,
+            "deleted_versions": 0,
+            "max_size": args.max_size,
+            "evicted_bundles": 0,
+            "evicted_bytes": 0,
+            "cache_bytes_after": kept_bytes,
+            "freed_bytes": 0,
+            "delete_failures": 0,
+            "scan_errors": sum(bundle["error"] is not None for bundle in bundles),
+        }
+        # 删除失败的资源包不写入索引，下次重新扫描
+        failed_bundles = set()
+        report = []
+        for bundle in duplicates:
+            latest, *old_versions = bundle["versions"]
+            print(f"[发现重复] 资源包: {bundle['name']}")
+            print(f"   - 保留最新: {latest['name']} ({time.ctime(latest['mtime'])})")
+
+            removed = []
+            for version in old_versions:
+                size = version["size"]
+                stats["old_versions"] += 1
+                stats["old_version_bytes"] += size
+                metrics.count("old_versions")
+                metrics.count("old_version_bytes", size)
+
+                error = None
+                if dry_run:
                     print(
-                        f"   - [已删除] 过期版本: {old_dir.name} (大小: {format_size(size)})"
+                        f"   - [模拟删除] 过期版本: {version['name']} (大小: {format_size(size)})"
                     )
-                except Exception as e:
-                    print(f"   - [删除失败] {old_dir.name}: {e}")
-        print("-" * 40)
+                else:
+                    with metrics.phase("delete"):
+                        error = deletions[version["path"]].result()
+                    if error is None:
+                        stats["deleted_versions"] += 1
+                        stats["freed_bytes"] += size
+                        print(
+                            f"   - [已删除] 过期版本: {version['name']} (大小: {format_size(size)})"
+                        )
+                    else:
+                        stats["delete_failures"] += 1
+                        failed_bundles.add(bundle["name"])
+                        print(f"   - [删除失败] {version['name']}: {error}")
+                removed.append(
+                    {
+                        "version": version["name"],
+                        "mtime": version["mtime"],
+                        "size": size,
+                        "error": error,
+                    }
+                )
+            print("-" * 40)
+            report.append(
+                {
+                    "bundle": bundle["name"],
+                    "kept": {
+                        "version": latest["name"],
+                        "mtime": latest["mtime"],
+                        "size": latest["size"],
+                    },
+                    "removed": removed,
+                }
+            )
+
+        evicted_report = []
+        for bundle in evicted:
+            last_used = bundle["versions"][0]["last_used"]
+            size = sum(version["size"] for version in bundle["versions"])
+            stats["evicted_bundles"] += 1
+            stats["evicted_bytes"] += size
+            metrics.count("evicted_bundles")
+            metrics.count("evicted_bytes", size)
+
+            description = (
+                f"资源包: {bundle['name']} "
+                f"(最近使用: {time.ctime(last_used)}, 大小: {format_size(size)})"
+            )
+            error = None
+            if dry_run:
+                print(f"[模拟淘汰] {description}")
+            else:
+                with metrics.phase("delete"):
+                    error = deletions[bundle["path"]].result()
+                if error is None:
+                    stats["freed_bytes"] += size
+                    print(f"[已淘汰] {description}")
+                else:
+                    stats["delete_failures"] += 1
+                    failed_bundles.add(bundle["name"])
+                    print(f"[淘汰失败] 资源包: {bundle['name']}: {error}")
+            evicted_report.append(
+                {
+                    "bundle": bundle["name"],
+                    "last_used": last_used,
+                    "size": size,
+                    "versions": [version["name"] for version in bundle["versions"]],
+                    "error": error,
+                }
+            )
+
+    for bundle in bundles:
+        if bundle["error"] is not None:
+            print(f"[读取失败] 资源包: {bundle['name']}: {bundle['error']}")
+
+    # 4. 保存索引。实际删除后，有改动的资源包只保留最新版本，并记录删除后目录的修改时间
+    indexed = []
+    for bundle in bundles:
+        if bundle["error"] is not None or bundle["name"] in failed_bundles:
+            continue
+        if not dry_run and bundle["name"] in evicted_names:
+            continue
+        if not dry_run and len(bundle["versions"]) > 1:
+            try:
+                mtime_ns = os.stat(bundle["path"]).st_mtime_ns
+            except OSError:
+                continue
+            bundle = {**bundle, "mtime_ns": mtime_ns, "versions": bundle["versions"][:1]}
+        indexed.append(bundle)
+    with metrics.phase("write"):
+        try:
+            save_index(index_path, cache_key, indexed)
+        except OSError as e:
+            # 索引只用于加速下次扫描，无法写入时不影响本次清理的结果
+            print(f"[警告] 无法保存扫描索引 '{index_path}': {e}")
+
+    if args.report:
+        report_path = Path(args.report)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"stats": stats, "bundles": report, "evicted": evicted_report},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
 
     # 总结
     print("=" * 60)
     print("扫描完成。")
-    print(f"检查了 {bundles_checked} 个资源包。")
-    if DRY_RUN:
-        print(f"如果关闭 DRY_RUN，将删除 {cleaned_count} 个旧文件夹。")
-        print(f"预计释放空间: {format_size(freed_space)}")
-        print("\n请将代码中的 DRY_RUN = True 改为 False 以执行清理。")
+    print(
+        f"检查了 {stats['bundles_checked']} 个资源包、{stats['versions_scanned']} 个版本，"
+        f"共 {format_size(stats['cache_bytes'])}。"
+    )
+    print(f"其中 {stats['bundles_rescanned']} 个资源包自上次扫描后有变化，已重新扫描。")
+    if dry_run:
+        print(f"去掉 --dry-run 后将删除 {stats['old_versions']} 个旧文件夹。")
+        if args.max_size is not None:
+            print(f"并按最近使用时间淘汰 {stats['evicted_bundles']} 个资源包。")
+        print(
+            f"预计释放空间: {format_size(stats['old_version_bytes'] + stats['evicted_bytes'])}"
+        )
     else:
-        print(f"成功删除了 {cleaned_count} 个旧文件夹。")
-        print(f"共释放空间: {format_size(freed_space)}")
+        print(f"成功删除了 {stats['deleted_versions']} 个旧文件夹。")
+        if args.max_size is not None:
+            print(f"按最近使用时间淘汰了 {stats['evicted_bundles']} 个资源包。")
+        print(f"共释放空间: {format_size(stats['freed_bytes'])}")
+        if stats["delete_failures"]:
+            print(f"删除失败: {stats['delete_failures']} 个文件夹。")
+    if kept_bytes is not None:
+        print(f"清理后缓存大小: {format_size(kept_bytes)}")
+    if args.report:
+        print(f"结构化报告已写入: {args.report}")
+
+    if stats["delete_failures"]:
+        sys.exit(1)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="清理 Unity 缓存中过期的资源包版本")
+    parser.add_argument(
+        "cache_path",
+        nargs="?",
+        default=CACHE_PATH,
+        help=f"Unity 缓存目录，默认为 '{CACHE_PATH}'。",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="模拟运行：只列出会被删除的文件夹，不执行删除。",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=parse_size,
+        metavar="SIZE",
+        help="缓存大小上限（例如 20G、500M）。去重后仍超过上限时，按最近使用时间淘汰最久未用的资源包。",
+    )
+    parser.add_argument(
+        "--full-scan",
+        action="store_true",
+        help=(
+            f"忽略扫描索引（缓存目录旁的 '.<目录名>{INDEX_FILE_SUFFIX}'），"
+            "完整遍历所有资源包目录。"
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"扫描与删除使用的线程数，默认 {DEFAULT_JOBS}，0 表示使用线程池的默认值。",
+    )
+    parser.add_argument(
+        "--report",
+        type=str,
+        help="将扫描与删除结果以 JSON 格式写入指定文件。",
+    )
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
+    run_instrumented("clean_cache", clean_unity_cache, args)
 
 
 if __name__ == "__main__":
-    clean_unity_cache()
+    main()
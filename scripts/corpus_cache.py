@@ -0,0 +1,151 @@
+import json
+import marshal
+import os
+import sys
+from pathlib import Path
+
+from build_manifest import BuildManifest
+from json_stream import read_setting_grid
+from metrics import metrics
+
+# 缓存格式版本，裁剪规则变化时递增
+CORPUS_CACHE_VERSION = 2
+
+
+def prune_book(book_data: dict) -> dict:
+    """
+    只保留工具实际用到的部分：importGridList 中每个表格的名称与各行的 strings。
+    提取需要表头中 Arg1/Text 的列号及对应单元格，打包需要完整的行，因此保留整行字符串。
+    """
+    return {
+        "importGridList": [
+            {
+                "name": grid["name"],
+                "rows": [
+                    {"strings": row["strings"]} if "strings" in row else {}
+                    for row in grid.get("rows", [])
+                ],
+            }
+            for grid in book_data.get("importGridList", [])
+        ]
+    }
+
+
+def parse_book(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        metrics.record_read(os.fstat(f.fileno()).st_size)
+        return prune_book(json.load(f))
+
+
+def parse_master(path: Path, table_suffix: str) -> dict:
+    """
+    Master 文件只保留第一个以 table_suffix 结尾的表格（即角色表）。
+    使用流式扫描，找到该表格后立即停止，不解析文档的其余部分。
+    """
+    grid = read_setting_grid(path, table_suffix)
+    metrics.record_read(path.stat().st_size)
+    return {"settingList": [grid] if grid is not None else []}
+
+
+def _load_blob(blob_path: Path):
+    try:
+        with open(blob_path, "rb") as f:
+            metrics.record_read(os.fstat(f.fileno()).st_size)
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _write_blob(blob_path: Path, data):
+    """先写临时文件再替换，多个进程同时生成同一份缓存也不会互相破坏。"""
+    blob_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = blob_path.with_name(f"{blob_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        marshal.dump(data, f)
+        metrics.record_write(f.tell())
+    os.replace(tmp_path, blob_path)
+
+
+def load_cached(path: Path, blob_path: Path | None, parse) -> dict:
+    """
+    读取 path 对应的裁剪后数据。
+    blob_path 存在时直接加载二进制缓存，否则用 parse 解析并裁剪，再写入 blob_path。
+    只依赖传入的路径，不访问缓存索引，因此可以在子进程中调用。
+    """
+    with metrics.phase("parse"):
+        if blob_path is not None and blob_path.exists():
+            data = _load_blob(blob_path)
+            if data is not None:
+                return data
+
+        data = parse(path)
+    if blob_path is not None:
+        with metrics.phase("write"):
+            _write_blob(blob_path, data)
+    return data
+
+
+def load_book(path: Path, blob_path: Path | None = None) -> dict:
+    return load_cached(path, blob_path, parse_book)
+
+
+class CorpusCache:
+    """
+    原始 JSON 的解析缓存。
+    每个源文件按内容 sha256 存为一个 marshal 二进制文件，索引记录源文件的大小与修改时间，
+    文件未变化时只需 stat 即可定位缓存，内容相同的文件共用同一份缓存。
+    """
+
+    def __init__(self, cache_dir: Path, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self._index = None
+        self._stage = None
+
+    def _ensure_index(self):
+        if self._index is None:
+            # 索引在首次使用时才加载；marshal 格式随 Python 版本变化，版本不同时整体失效
+            self._index = BuildManifest(self.cache_dir / "index.json")
+            self._stage = self._index.stage(
+                "corpus",
+                {
+                    "version": CORPUS_CACHE_VERSION,
+                    "marshal": marshal.version,
+                    "python": list(sys.version_info[:2]),
+                },
+            )
+
+    def blob_path(self, path: Path, kind: str = "book") -> Path | None:
+        """返回 path 当前内容对应的缓存文件路径；缓存关闭时返回 None。"""
+        if not self.enabled:
+            return None
+        self._ensure_index()
+        key = f"{kind}:{path.resolve().as_posix()}"
+        entry = self._stage.get(key, path)
+        if entry is None:
+            self._stage.put(key, path)
+            entry = self._stage.entries[key]
+        return self.cache_dir / f"{kind}-{entry['sha256']}.bin"
+
+    def load_book(self, path: Path) -> dict:
+        return load_book(path, self.blob_path(path))
+
+    def load_master(self, path: Path, table_suffix: str) -> dict:
+        return load_cached(
+            path,
+            self.blob_path(path, kind="master"),
+            lambda master_path: parse_master(master_path, table_suffix),
+        )
+
+    def save(self):
+        """保存索引，并删除已不被任何源文件引用的缓存文件。"""
+        if self._index is None:
+            return
+        referenced = {
+            f"{key.split(':', 1)[0]}-{entry['sha256']}.bin"
+            for key, entry in self._stage.entries.items()
+        }
+        for blob in self.cache_dir.glob("*.bin"):
+            if blob.name not in referenced:
+                blob.unlink(missing_ok=True)
+        self._index.save()
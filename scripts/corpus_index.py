@@ -0,0 +1,370 @@
+import json
+import sqlite3
+import zlib
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+from corpus_layout import KANA_PATTERN
+
+QUERY_FIELDS = ("all", "source", "translation")
+# 索引表结构版本，结构变化时递增，旧索引会被丢弃并重新建立
+INDEX_VERSION = 1
+# book 按路径的哈希分到固定数量的分段中，倒排表按分段保存。
+# 分段越多，单个 book 变化时需要重建的范围越小，但倒排表的行数越多
+SEGMENT_COUNT = 16
+# 确认候选行时每次查询的行数（SQLite 单条语句的参数个数有上限）
+_VERIFY_CHUNK_SIZE = 500
+
+
+def bigrams(text: str) -> set[str]:
+    """返回文本中所有相邻两个字符组成的二元组。"""
+    return {text[i : i + 2] for i in range(len(text) - 1)}
+
+
+def has_kana(text: str | None) -> bool:
+    return bool(text) and KANA_PATTERN.search(text) is not None
+
+
+def book_segment(book: str) -> int:
+    return zlib.crc32(book.encode("utf-8")) % SEGMENT_COUNT
+
+
+def segment_postings(
+    conn: sqlite3.Connection, segment: int
+) -> list[tuple[str, bytes]]:
+    """由已保存的行文本计算一个分段的倒排表：按二元组排序的 (二元组, 升序行号数组)。"""
+    postings: dict[str, array] = {}
+    ranges = conn.execute(
+        """
+        SELECT first_line, line_count FROM books
+        WHERE segment = ? ORDER BY first_line
+        """,
+        (segment,),
+    ).fetchall()
+    for first_line, line_count in ranges:
+        for line_id, source, translation in conn.execute(
+            "SELECT id, source, translation FROM lines WHERE id BETWEEN ? AND ?",
+            (first_line, first_line + line_count - 1),
+        ):
+            grams = bigrams(source)
+            if translation:
+                grams |= bigrams(translation)
+            for gram in grams:
+                line_ids = postings.get(gram)
+                if line_ids is None:
+                    postings[gram] = line_ids = array("I")
+                line_ids.append(line_id)
+    return [(gram, line_ids.tobytes()) for gram, line_ids in sorted(postings.items())]
+
+
+def _segment_postings_worker(path: str, segment: int) -> list[tuple[str, bytes]]:
+    conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        return segment_postings(conn, segment)
+    finally:
+        conn.close()
+
+
+class CorpusIndex:
+    """
+    语料全文索引：保存原始文本与译文的每一行对话，以及 字符二元组 -> 行号 的倒排表，
+    存放在本地 SQLite 数据库中。
+    - 倒排表按 (分段, 二元组) 保存升序的行号数组，子串查询先对各二元组的行号求交集得到候选行，
+      再逐行确认确实包含该子串；
+    - 每个 book 记录一份指纹，重新索引时只替换指纹变化的 book 的行，
+      提交时由已保存的行文本重建受影响分段的倒排表，不需要重新解析 JSON。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        # WAL 模式下并行重建倒排表的子进程读取时，不会与主进程的写入互相阻塞
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            # 表结构已变化（或是新建的数据库），丢弃旧表后重新建立
+            with self.conn:
+                for table in ("meta", "books", "lines", "grams"):
+                    self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self.conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY,
+                book TEXT NOT NULL UNIQUE,
+                fingerprint TEXT NOT NULL,
+                segment INTEGER NOT NULL,
+                first_line INTEGER NOT NULL,
+                line_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS lines (
+                id INTEGER PRIMARY KEY,
+                book INTEGER NOT NULL,
+                grid TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                speaker_id TEXT NOT NULL,
+                speaker TEXT NOT NULL,
+                source TEXT NOT NULL,
+                translation TEXT,
+                has_kana INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS lines_speaker ON lines (speaker);
+            CREATE TABLE IF NOT EXISTS grams (
+                segment INTEGER NOT NULL,
+                gram TEXT NOT NULL,
+                lines BLOB NOT NULL,
+                PRIMARY KEY (segment, gram)
+            ) WITHOUT ROWID;
+            """
+        )
+        # 有 book 增删的分段，commit 时重建其倒排表
+        self._dirty_segments: set[int] = set(
+            json.loads(self.get_meta("dirty_segments") or "[]")
+        )
+
+    def get_meta(self, key: str) -> str | None:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    def ensure_config(self, config_hash: str, force: bool = False) -> bool:
+        """索引配置（列名、角色表等）变化或 force 时清空索引，返回是否清空。"""
+        if not force and self.get_meta("config") == config_hash:
+            return False
+        with self.conn:
+            self.conn.execute("DELETE FROM grams")
+            self.conn.execute("DELETE FROM lines")
+            self.conn.execute("DELETE FROM books")
+            self.set_meta("config", config_hash)
+            self.set_meta("dirty_segments", "[]")
+        self._dirty_segments.clear()
+        return True
+
+    def fingerprints(self) -> dict[str, str]:
+        return dict(self.conn.execute("SELECT book, fingerprint FROM books"))
+
+    def remove_book(self, book: str):
+        row = self.conn.execute(
+            "SELECT id, segment, first_line, line_count FROM books WHERE book = ?",
+            (book,),
+        ).fetchone()
+        if row is None:
+            return
+        book_id, segment, first_line, line_count = row
+        self.conn.execute(
+            "DELETE FROM lines WHERE id BETWEEN ? AND ?",
+            (first_line, first_line + line_count - 1),
+        )
+        self.conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+        self._dirty_segments.add(segment)
+
+    def replace_book(self, book: str, fingerprint: str, lines: list[tuple]):
+        """
+        用新的行替换 book 的索引，同一 book 的行号连续。
+        lines 的每一项为 (表格名, 行号, 说话人ID, 说话人, 原文, 译文或 None)。
+        """
+        self.remove_book(book)
+        segment = book_segment(book)
+        first_line = (
+            self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM lines").fetchone()[0]
+            + 1
+        )
+        book_id = self.conn.execute(
+            """
+            INSERT INTO books (book, fingerprint, segment, first_line, line_count)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (book, fingerprint, segment, first_line, len(lines)),
+        ).lastrowid
+        self.conn.executemany(
+            """
+            INSERT INTO lines
+                (id, book, grid, row, speaker_id, speaker, source, translation, has_kana)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                (line_id, book_id, *line, has_kana(line[5]))
+                for line_id, line in enumerate(lines, start=first_line)
+            ),
+        )
+        self._dirty_segments.add(segment)
+
+    def commit(self, jobs: int = 1):
+        """
+        提交行的改动，再重建有变化的分段的倒排表；jobs > 1 时使用进程池并行计算各分段。
+        待重建的分段先记录在 meta 中，中途退出时下次运行会继续重建。
+        """
+        segments = sorted(self._dirty_segments)
+        self.set_meta("dirty_segments", json.dumps(segments))
+        self.conn.commit()
+        if not segments:
+            return
+
+        if jobs > 1 and len(segments) > 1:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(segments))) as executor:
+                self._write_postings(
+                    segments,
+                    executor.map(
+                        _segment_postings_worker, repeat(str(self.path)), segments
+                    ),
+                )
+        else:
+            self._write_postings(
+                segments, (segment_postings(self.conn, segment) for segment in segments)
+            )
+        self._dirty_segments.clear()
+        self.set_meta("dirty_segments", "[]")
+        self.conn.commit()
+
+    def _write_postings(self, segments: list[int], results):
+        for segment, postings in zip(segments, results):
+            self.conn.execute("DELETE FROM grams WHERE segment = ?", (segment,))
+            self.conn.executemany(
+                "INSERT INTO grams (segment, gram, lines) VALUES (?, ?, ?)",
+                ((segment, gram, blob) for gram, blob in postings),
+            )
+
+    def counts(self) -> dict[str, int]:
+        return {
+            table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("books", "lines")
+        }
+
+    def _candidate_lines(self, text: str) -> set[int] | None:
+        """
+        对查询文本的各个二元组求倒排表的交集，返回可能包含该文本的行号。
+        文本不足两个字符（没有二元组）时返回 None，表示无法缩小范围。
+        """
+        grams = bigrams(text)
+        if not grams:
+            return None
+
+        segments = ",".join(str(segment) for segment in range(SEGMENT_COUNT))
+        gram_lines = []
+        for gram in grams:
+            line_ids = array("I")
+            for (blob,) in self.conn.execute(
+                f"SELECT lines FROM grams WHERE segment IN ({segments}) AND gram = ?",
+                (gram,),
+            ):
+                line_ids.frombytes(blob)
+            if not line_ids:
+                return set()
+            gram_lines.append(line_ids)
+
+        # 从最短的行号数组开始求交集，候选集合始终不大于最短的数组
+        gram_lines.sort(key=len)
+        candidates = set(gram_lines[0])
+        for line_ids in gram_lines[1:]:
+            candidates.intersection_update(line_ids)
+            if not candidates:
+                break
+        return candidates
+
+    def search(
+        self,
+        text: str | None = None,
+        speakers: set[str] | None = None,
+        kana: bool = False,
+        field: str = "all",
+        limit: int = 50,
+    ) -> list[dict]:
+        """
+        按条件查询，各条件同时满足：
+        - text：原文或译文（由 field 指定）包含该子串；
+        - speakers：说话人或说话人 ID 属于该集合；
+        - kana：译文中仍含有假名。
+        结果按 book、表格、行号排列，最多返回 limit 条。
+        """
+        conditions = []
+        params = []
+        line_ids = None
+        if text:
+            line_ids = self._candidate_lines(text)
+            if line_ids is not None and not line_ids:
+                return []
+            # 倒排表只能排除不可能匹配的行，最终仍需确认子串确实出现在指定字段中
+            if field == "source":
+                conditions.append("instr(source, ?) > 0")
+                params.append(text)
+            elif field == "translation":
+                conditions.append("instr(translation, ?) > 0")
+                params.append(text)
+            else:
+                conditions.append("(instr(source, ?) > 0 OR instr(translation, ?) > 0)")
+                params.extend([text, text])
+        if speakers:
+            placeholders = ",".join("?" * len(speakers))
+            conditions.append(
+                f"(speaker IN ({placeholders}) OR speaker_id IN ({placeholders}))"
+            )
+            params.extend(speakers)
+            params.extend(speakers)
+        if kana:
+            conditions.append("has_kana = 1")
+
+        where = " AND ".join(conditions) if conditions else "1"
+        query = f"""
+            SELECT books.book, grid, row, speaker_id, speaker, source, translation
+            FROM lines JOIN books ON books.id = lines.book
+            WHERE {{}} {where}
+            ORDER BY books.book, lines.id
+            """
+        if line_ids is None:
+            rows = self.conn.execute(query.format("") + " LIMIT ?", [*params, limit])
+        else:
+            rows = self._verify_candidates(query, params, line_ids, limit)
+        return [
+            {
+                "book": book,
+                "grid": grid,
+                "row": row,
+                "speaker_id": speaker_id,
+                "speaker": speaker,
+                "source": source,
+                "translation": translation,
+            }
+            for book, grid, row, speaker_id, speaker, source, translation in rows
+        ]
+
+    def _verify_candidates(self, query: str, params: list, line_ids: set[int], limit):
+        """
+        将候选行按 (book 路径, 行号) 排序后分块确认，凑够 limit 条即停止，
+        常见的二元组即使对应大量候选行也不必全部检查。
+        """
+        sorted_ids = sorted(line_ids)
+        ordered_ids = []
+        for first_line, line_count in self.conn.execute(
+            "SELECT first_line, line_count FROM books ORDER BY book"
+        ):
+            start = bisect_left(sorted_ids, first_line)
+            end = bisect_left(sorted_ids, first_line + line_count, start)
+            ordered_ids.extend(sorted_ids[start:end])
+
+        rows = []
+        for start in range(0, len(ordered_ids), _VERIFY_CHUNK_SIZE):
+            chunk = ordered_ids[start : start + _VERIFY_CHUNK_SIZE]
+            condition = f"lines.id IN ({','.join('?' * len(chunk))}) AND"
+            rows.extend(
+                self.conn.execute(
+                    query.format(condition) + " LIMIT ?",
+                    [*chunk, *params, limit - len(rows)],
+                )
+            )
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,65 @@
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any
+
+from metrics import metrics
+
+# 各脚本共用的目录布局、表格列名、假名的匹配规则与行的对齐规则。
+# check.py 等脚本只需要这些定义，从这里导入可以避免加载 localization_tool 的全部依赖。
+
+# --- 配置常量 ---
+MASTER_CHAPTER_FILE = "Adventure/Master.chapter.json"
+CHARACTER_TABLE_SUFFIX = ":Character"
+CHARACTER_ID_COL_INDEX = 1
+CHARACTER_NAME_COL_INDEX = 2
+DIALOGUE_SPEAKER_ID_COL_NAME = "Arg1"
+DIALOGUE_TEXT_COL_NAME = "Text"
+OUT_DIR = "out"
+FOR_TRANSLATION_DIR = os.path.join(OUT_DIR, "1_For_Translation")
+READY_FOR_TRANSLATION_DIR = os.path.join(OUT_DIR, "2_Ready_For_Translation")
+TRANSLATED_DIR = os.path.join(OUT_DIR, "3_Translated")
+PLUGIN_DATA_DIR = os.path.join(OUT_DIR, "4_Plugin_Data")
+PLUGIN_PACK_FILE = os.path.join(OUT_DIR, "4_Plugin_Data.pack")
+MASTER_CHARACTERS_FILE = os.path.join(OUT_DIR, "master_characters.json")
+NAMES_MAP_FILE = os.path.join(OUT_DIR, "names.json")
+EXCLUDE_NAMES_FILE = "exclude_names.json"
+GLOSSARY_FILE = "slang.json"
+BUILD_MANIFEST_FILE = os.path.join(OUT_DIR, ".build_manifest.json")
+CORPUS_CACHE_DIR = os.path.join(OUT_DIR, ".corpus_cache")
+TRANSLATION_MEMORY_FILE = os.path.join(OUT_DIR, "translation_memory.sqlite")
+CORPUS_INDEX_FILE = os.path.join(OUT_DIR, "corpus_index.sqlite")
+TM_PREFILL_DIR = os.path.join(OUT_DIR, "tm_prefill")
+DEDUP_DIR = os.path.join(OUT_DIR, "dedup")
+DEDUP_UNIQUE_FILE = os.path.join(DEDUP_DIR, "unique_lines.json")
+DEDUP_BACK_REFS_FILE = os.path.join(DEDUP_DIR, "back_refs.json")
+TRANSLATE_CHECKPOINT_DIR = os.path.join(OUT_DIR, ".translate_checkpoint")
+TRANSLATE_SCHEDULE_FILE = os.path.join(OUT_DIR, "translate_schedule.json")
+ROW_SNAPSHOT_DIR = os.path.join(OUT_DIR, "row_snapshots")
+DELTA_PLAN_FILE = os.path.join(OUT_DIR, "delta_plan.json")
+
+# 平假名与片假名，不含中文译文中也会使用的 '・' 与 'ー'。译文中仍有假名时，该行通常没有翻译完全
+KANA_PATTERN = re.compile("[ぁ-ゖァ-ヺ]")
+
+
+def read_json(path: Path) -> Any:
+    with metrics.phase("parse"), open(path, "r", encoding="utf-8") as f:
+        metrics.record_read(os.fstat(f.fileno()).st_size)
+        return json.load(f)
+
+
+def iter_aligned_rows(rows: list, text_col_idx: int, translated_dialogues: list):
+    """
+    打包时的对齐规则：表头之后 Text 非空的行依次对应一条翻译条目。
+    产出 (该行的 strings, 翻译条目)；翻译条目不足时产出 (strings, None) 后结束。
+    """
+    dialogue_iterator = iter(translated_dialogues)
+    for row in rows[1:]:
+        strings = row.get("strings", [])
+        original_text = strings[text_col_idx] if len(strings) > text_col_idx else ""
+        if original_text:
+            translated_item = next(dialogue_iterator, None)
+            yield strings, translated_item
+            if translated_item is None:
+                return
@@ -0,0 +1,117 @@
+import json
+from collections import deque
+from pathlib import Path
+
+
+class AhoCorasick:
+    """
+    多模式串匹配自动机。构建一次后，对每段文本只需线性扫描一遍即可找出所有术语，
+    耗时与术语数量无关。
+    """
+
+    def __init__(self, patterns: list[str]):
+        self.patterns = patterns
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # 每个状态可以输出的模式编号（已合并失败链上的输出）
+        self._output: list[tuple[int, ...]] = [()]
+
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (pattern_id,)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                fallback = self._goto[fail_state].get(char, 0)
+                self._fail[next_state] = fallback if fallback != next_state else 0
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> list[tuple[int, int, int]]:
+        """返回文本中所有匹配 (起点, 终点, 模式编号)，包括互相重叠的匹配。"""
+        goto, fail, output, patterns = (
+            self._goto,
+            self._fail,
+            self._output,
+            self.patterns,
+        )
+        matches = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id in output[state]:
+                matches.append((end - len(patterns[pattern_id]), end, pattern_id))
+        return matches
+
+    def find_longest(self, text: str) -> list[tuple[int, int, int]]:
+        """
+        按“最左最长”规则返回互不重叠的匹配，
+        例如术语表同时有「さつき」和「さつきちゃん」时，只取较长的一个。
+        """
+        matches = sorted(self.find(text), key=lambda match: (match[0], -match[1]))
+        selected = []
+        covered_until = 0
+        for start, end, pattern_id in matches:
+            if start >= covered_until:
+                selected.append((start, end, pattern_id))
+                covered_until = end
+        return selected
+
+
+def load_glossary(slang_path: Path, names_path: Path | None = None) -> dict[str, str]:
+    """
+    读取术语表：slang.json 的 src -> dst，以及 names.json 中已翻译的角色名。
+    names.json 中译名与原名相同的条目视为尚未翻译，不参与检查；两者冲突时以 slang.json 为准。
+    """
+    terms = {}
+    if names_path is not None and names_path.exists():
+        with open(names_path, "r", encoding="utf-8") as f:
+            for src, dst in json.load(f).items():
+                if src and dst and src != dst:
+                    terms[src] = dst
+    with open(slang_path, "r", encoding="utf-8") as f:
+        for entry in json.load(f):
+            src, dst = entry.get("src"), entry.get("dst")
+            if src and dst:
+                terms[src] = dst
+    return terms
+
+
+class GlossaryChecker:
+    """检查译文是否使用了术语表规定的译法。"""
+
+    def __init__(self, terms: dict[str, str]):
+        self.sources = list(terms)
+        self.targets = [terms[src] for src in self.sources]
+        self.automaton = AhoCorasick(self.sources)
+
+    def find_terms(self, source: str) -> list[tuple[str, str]]:
+        """返回原文中出现的 (术语原文, 规定译文)，按出现顺序去重。"""
+        found = {}
+        for _, _, term_id in self.automaton.find_longest(source):
+            found.setdefault(self.sources[term_id], self.targets[term_id])
+        return list(found.items())
+
+    def missing_terms(self, source: str, translation: str) -> list[tuple[str, str]]:
+        """返回原文中出现、但译文中没有使用规定译法的术语。"""
+        return [
+            (src, dst)
+            for src, dst in self.find_terms(source)
+            if dst not in translation
+        ]
@@ -0,0 +1,157 @@
+import json
+import mmap
+import re
+from pathlib import Path
+
+_WHITESPACE = re.compile(rb"[ \t\r\n]*")
+# 采用“展开循环”写法，避免逐字符的分支匹配
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_SCALAR = re.compile(rb"[^,:\]}\s]+")
+# 一次跳过到下一个括号为止的全部内容（字符串内部的括号不计），减少 Python 层面的循环次数
+_TO_NEXT_BRACKET = re.compile(
+    rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*', re.DOTALL
+)
+
+
+class JsonScanner:
+    """
+    基于事件的 JSON 扫描器，直接在字节缓冲区（如 mmap）上按需前进。
+    只有调用方明确需要的值才会被解码，其余的值仅被跳过，不构造任何 Python 对象。
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.pos = 0
+
+    def _skip_whitespace(self):
+        self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+
+    def _peek(self) -> bytes:
+        self._skip_whitespace()
+        return self.buffer[self.pos : self.pos + 1]
+
+    def _expect(self, char: bytes):
+        if self._peek() != char:
+            raise ValueError(f"JSON 格式错误：位置 {self.pos} 处应为 {char!r}")
+        self.pos += 1
+
+    def _read_string(self) -> str:
+        self._skip_whitespace()
+        match = _STRING.match(self.buffer, self.pos)
+        if match is None:
+            raise ValueError(f"JSON 格式错误：位置 {self.pos} 处应为字符串")
+        self.pos = match.end()
+        return json.loads(match.group())
+
+    def skip_value(self) -> tuple[int, int]:
+        """跳过当前位置的一个值，返回它在缓冲区中的起止位置。"""
+        char = self._peek()
+        start = self.pos
+        if char == b'"':
+            self._read_string()
+        elif char in (b"{", b"["):
+            depth = 0
+            buffer = self.buffer
+            pos = self.pos
+            while True:
+                token = buffer[pos : pos + 1]
+                if token in (b"{", b"["):
+                    depth += 1
+                elif token in (b"}", b"]"):
+                    depth -= 1
+                    if depth == 0:
+                        pos += 1
+                        break
+                else:
+                    raise ValueError("JSON 格式错误：括号未闭合")
+                pos = _TO_NEXT_BRACKET.match(buffer, pos + 1).end()
+            self.pos = pos
+        else:
+            match = _SCALAR.match(self.buffer, self.pos)
+            if match is None:
+                raise ValueError(f"JSON 格式错误：位置 {self.pos} 处缺少值")
+            self.pos = match.end()
+        return start, self.pos
+
+    def read_value(self):
+        """完整解码当前位置的一个值。"""
+        start, end = self.skip_value()
+        return json.loads(self.buffer[start:end])
+
+    def iter_object(self):
+        """
+        逐个产出对象的键。每次产出后，调用方必须用 skip_value 或 read_value 消费对应的值。
+        """
+        self._expect(b"{")
+        if self._peek() == b"}":
+            self.pos += 1
+            return
+        while True:
+            key = self._read_string()
+            self._expect(b":")
+            yield key
+            if self._peek() == b"}":
+                self.pos += 1
+                return
+            self._expect(b",")
+
+    def iter_array(self):
+        """逐个产出数组元素的下标，调用方同样需要消费每个元素。"""
+        self._expect(b"[")
+        if self._peek() == b"]":
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self._peek() == b"]":
+                self.pos += 1
+                return
+            self._expect(b",")
+
+    def peek_type(self) -> bytes:
+        return self._peek()
+
+
+def read_setting_grid(path: Path, name_suffix: str) -> dict | None:
+    """
+    在 Master.chapter.json 的 settingList 中查找第一个名称以 name_suffix 结尾的表格，
+    只解码该表格的 name 与 rows 并立即停止扫描；文档的其余部分不会被读入内存。
+    未找到时返回 None。
+    """
+    with open(path, "rb") as f:
+        if path.stat().st_size == 0:
+            raise ValueError(f"文件为空: {path}")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            scanner = JsonScanner(buffer)
+            for key in scanner.iter_object():
+                if key != "settingList" or scanner.peek_type() != b"[":
+                    scanner.skip_value()
+                    continue
+
+                for _ in scanner.iter_array():
+                    if scanner.peek_type() != b"{":
+                        scanner.skip_value()
+                        continue
+
+                    name = ""
+                    rows_span = None
+                    for grid_key in scanner.iter_object():
+                        if grid_key == "name":
+                            name = scanner.read_value()
+                        elif grid_key == "rows":
+                            # 先记下 rows 的位置，确认表名匹配后再解码
+                            rows_span = scanner.skip_value()
+                        else:
+                            scanner.skip_value()
+
+                    if isinstance(name, str) and name.endswith(name_suffix):
+                        rows = (
+                            json.loads(buffer[rows_span[0] : rows_span[1]])
+                            if rows_span
+                            else []
+                        )
+                        return {"name": name, "rows": rows}
+                return None
+    return None
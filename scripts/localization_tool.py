@@ -1,67 +1,158 @@
 import argparse
+import asyncio
 import json
 import os
 import shutil
-import copy
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from typing import Any
 
-# --- 配置常量 ---
-MASTER_CHAPTER_FILE = "Adventure/Master.chapter.json"
-CHARACTER_TABLE_SUFFIX = ":Character"
-CHARACTER_ID_COL_INDEX = 1
-CHARACTER_NAME_COL_INDEX = 2
-DIALOGUE_SPEAKER_ID_COL_NAME = "Arg1"
-DIALOGUE_TEXT_COL_NAME = "Text"
-OUT_DIR = "out"
-FOR_TRANSLATION_DIR = os.path.join(OUT_DIR, "1_For_Translation")
-READY_FOR_TRANSLATION_DIR = os.path.join(OUT_DIR, "2_Ready_For_Translation")
-TRANSLATED_DIR = os.path.join(OUT_DIR, "3_Translated")
-PLUGIN_DATA_DIR = os.path.join(OUT_DIR, "4_Plugin_Data")
-MASTER_CHARACTERS_FILE = os.path.join(OUT_DIR, "master_characters.json")
-NAMES_MAP_FILE = os.path.join(OUT_DIR, "names.json")
-EXCLUDE_NAMES_FILE = "exclude_names.json"
+from batch_scheduler import balance, build_schedule, split_units
+from build_manifest import (
+    BuildManifest,
+    dir_fingerprint,
+    hash_config,
+    hash_optional_file,
+)
+from chapter_pack import PackError, PackReader, PackWriter
+from corpus_cache import CorpusCache, load_book
+from corpus_layout import (
+    BUILD_MANIFEST_FILE,
+    CHARACTER_ID_COL_INDEX,
+    CHARACTER_NAME_COL_INDEX,
+    CHARACTER_TABLE_SUFFIX,
+    CORPUS_CACHE_DIR,
+    CORPUS_INDEX_FILE,
+    DEDUP_BACK_REFS_FILE,
+    DEDUP_DIR,
+    DEDUP_UNIQUE_FILE,
+    DELTA_PLAN_FILE,
+    DIALOGUE_SPEAKER_ID_COL_NAME,
+    DIALOGUE_TEXT_COL_NAME,
+    EXCLUDE_NAMES_FILE,
+    FOR_TRANSLATION_DIR,
+    GLOSSARY_FILE,
+    MASTER_CHAPTER_FILE,
+    MASTER_CHARACTERS_FILE,
+    NAMES_MAP_FILE,
+    OUT_DIR,
+    PLUGIN_DATA_DIR,
+    PLUGIN_PACK_FILE,
+    READY_FOR_TRANSLATION_DIR,
+    ROW_SNAPSHOT_DIR,
+    TM_PREFILL_DIR,
+    TRANSLATED_DIR,
+    TRANSLATE_CHECKPOINT_DIR,
+    TRANSLATE_SCHEDULE_FILE,
+    TRANSLATION_MEMORY_FILE,
+    iter_aligned_rows,
+    read_json,
+)
+from corpus_index import QUERY_FIELDS, SEGMENT_COUNT, CorpusIndex
+from glossary import GlossaryChecker, load_glossary
+from metrics import (
+    add_instrumentation_arguments,
+    call_with_metrics,
+    metrics,
+    run_instrumented,
+)
+from output_writer import output_writer
+from row_delta import DeltaPlanner, RowSnapshots, delta_path, dialogue_hashes
+from translation_memory import TranslationMemory
+from translator import ChatClient, FileJob, TranslationRunner
 
 
 # --- 辅助函数 ---
-def read_json(path: Path) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def write_json(path: Path, data: Any, indent: int = 2):
+    """序列化后交给 output_writer 在后台写出；内容未变化的文件不会被重写。"""
+    with metrics.phase("write"):
+        output_writer.write_json(path, data, indent)
 
 
-def write_json(path: Path, data: Any):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def iter_translated_grids(book_data: dict, translated_book_dir: Path):
+    """
+    产出 book 中带有 Text 列、且在翻译目录中存在对应文件的表格：
+    (表格, 行列表, Text 列号, 翻译文件路径)。
+    """
+    for grid in book_data.get("importGridList", []):
+        grid_name = grid["name"]
+        rows = grid.get("rows", [])
+        if not rows:
+            continue
 
+        grid_id = grid_name.split(":")[-1]
+        translated_file = translated_book_dir / f"{grid_id}.json"
+        if not translated_file.exists():
+            continue
 
-def handle_extraction(args):
+        try:
+            header = rows[0].get("strings", [])
+            text_col_idx = header.index(DIALOGUE_TEXT_COL_NAME)
+        except ValueError:
+            continue
+
+        yield grid, rows, text_col_idx, translated_file
+
+
+def iter_plugin_book(grids: list[dict], compact: bool = False):
     """
-    执行提取操作。
-    1. 提取 Master 文件中的角色 ID -> 角色名映射，用于阶段二。
-    2. 遍历所有 book.json，提取对话文本。
-    3. 会跳过在 '3_Translated' 目录中已存在的文件。
-    4. 对 names.json 进行增量更新，保留已存在的条目。
-    5. 会读取 'out/exclude_names.json' 文件，排除其中列出的角色名。
+    逐个表格产出插件用 .chapter.json 的文本片段，不再额外构造整本书的字典副本。
+    默认格式与 json.dump(..., indent=2) 的输出逐字节一致；compact=True 时去掉缩进与空白。
     """
-    print("--- 阶段一：开始提取 ---")
-    input_dir = Path(args.input_dir)
-    output_dir = Path(FOR_TRANSLATION_DIR)
-    translated_dir = Path(TRANSLATED_DIR)
+    # 同名表格以最后一次出现的内容为准、位置沿用首次出现的位置，与原先的字典推导一致
+    book_grids = {}
+    for grid in grids:
+        book_grids[grid["name"]] = grid["rows"]
 
-    if args.force and output_dir.exists():
-        print(f"警告：使用 --force 标志，将清空并重新创建目录 '{output_dir}'。")
-        shutil.rmtree(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
-    translated_dir.mkdir(parents=True, exist_ok=True)
+    if not book_grids:
+        yield "{}"
+        return
 
-    # 步骤 1: 提取 Master 文件中的角色映射
-    master_file_path = input_dir / MASTER_CHAPTER_FILE
-    if not master_file_path.exists():
-        print(f"错误: 未找到 Master 文件: {master_file_path}")
+    if compact:
+        separator = "{"
+        for grid_name, rows in book_grids.items():
+            yield separator
+            yield json.dumps(grid_name, ensure_ascii=False)
+            yield ":"
+            yield json.dumps(
+                [row["strings"] for row in rows],
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+            separator = ","
+        yield "}"
         return
 
-    master_data = read_json(master_file_path)
+    separator = "{\n  "
+    for grid_name, rows in book_grids.items():
+        yield separator
+        yield json.dumps(grid_name, ensure_ascii=False)
+        yield ": "
+        # JSON 字符串中的换行均已转义，因此可以直接给每一行补上一级缩进
+        yield json.dumps(
+            [row["strings"] for row in rows], ensure_ascii=False, indent=2
+        ).replace("\n", "\n  ")
+        separator = ",\n  "
+    yield "\n}"
+
+
+def write_plugin_book(path: Path, grids: list[dict], compact: bool = False):
+    """
+    写出插件用的 .chapter.json。
+    output_writer 先写入临时文件再替换，游戏在打包过程中读取时不会读到写了一半的文件。
+    """
+    with metrics.phase("write"):
+        output_writer.write_text(path, "".join(iter_plugin_book(grids, compact)))
+
+
+def extract_character_map(
+    master_file_path: Path, corpus_cache: CorpusCache
+) -> dict[str, str]:
+    """从 Master 文件中第一个 ':Character' 表提取角色 ID -> 角色名映射。"""
+    master_data = corpus_cache.load_master(master_file_path, CHARACTER_TABLE_SUFFIX)
     character_map = {}
     for grid in master_data.get("settingList", []):
         if grid.get("name", "").endswith(CHARACTER_TABLE_SUFFIX):
@@ -75,70 +166,380 @@ def handle_extraction(args):
                     if char_id and char_name:
                         character_map[char_id] = char_name
             break
-    write_json(Path(MASTER_CHARACTERS_FILE), character_map)
+    return character_map
+
+
+def resolve_jobs(jobs: int) -> int:
+    """将 --jobs 参数转换为实际进程数，0 表示使用全部 CPU 核心。"""
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def scan_book(book_file: Path, input_dir: Path, blob_path: Path | None = None):
+    """
+    解析单个 book.json，返回 (对话文件列表, 角色ID集合)。
+    对话文件列表的每一项为 (相对输出路径, 对话列表)，是否跳过由调用方决定。
+    blob_path 为解析缓存的位置，缓存存在时不再解析 JSON。
+    该函数不写任何输出文件，可在子进程中运行。
+    """
+    relative_path = book_file.relative_to(input_dir)
+    book_data = load_book(book_file, blob_path)
+    dialogue_files = []
+    speaker_ids = set()
+
+    for grid in book_data.get("importGridList", []):
+        grid_name = grid["name"]
+        rows = grid.get("rows", [])
+        if not rows:
+            continue
+
+        header = rows[0].get("strings", [])
+        try:
+            speaker_col_idx = header.index(DIALOGUE_SPEAKER_ID_COL_NAME)
+            text_col_idx = header.index(DIALOGUE_TEXT_COL_NAME)
+        except ValueError:
+            continue
+
+        dialogues = []
+        for row in rows[1:]:
+            strings = row.get("strings", [])
+            if len(strings) > max(speaker_col_idx, text_col_idx):
+                speaker_id, dialogue_text = (
+                    strings[speaker_col_idx],
+                    strings[text_col_idx],
+                )
+
+                if speaker_id:
+                    is_ascii_only = True
+                    try:
+                        speaker_id.encode("ascii")
+                    except UnicodeEncodeError:
+                        is_ascii_only = False
+
+                    if not is_ascii_only:
+                        speaker_ids.add(speaker_id)
+
+                if dialogue_text:
+                    dialogues.append({"name": speaker_id, "message": dialogue_text})
+
+        if dialogues:
+            grid_id = grid_name.split(":")[-1]
+            relative_file_path = relative_path.with_suffix("") / f"{grid_id}.json"
+            dialogue_files.append((relative_file_path, dialogues))
+
+    return dialogue_files, speaker_ids
+
+
+def iter_scanned_books(
+    book_files: list[Path], input_dir: Path, jobs: int, blob_paths: list
+):
+    """
+    按 book_files 的顺序产出 scan_book 的结果。
+    jobs > 1 时将文件分片交给进程池解析，结果顺序与串行模式一致。
+    """
+    if jobs <= 1 or len(book_files) <= 1:
+        for book_file, blob_path in zip(book_files, blob_paths):
+            yield scan_book(book_file, input_dir, blob_path)
+        return
+
+    chunksize = max(1, len(book_files) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from metrics.collect(
+            executor.map(
+                call_with_metrics,
+                repeat(scan_book),
+                book_files,
+                repeat(input_dir),
+                blob_paths,
+                chunksize=chunksize,
+            )
+        )
+
+
+def load_character_map(
+    args, input_dir: Path, manifest: BuildManifest, corpus_cache: CorpusCache
+):
+    """
+    步骤 1: 提取 Master 文件中的角色映射。
+    Master 文件未变化且 master_characters.json 仍在时直接沿用上次的结果。
+    未找到 Master 文件时返回 None。
+    """
+    master_file_path = input_dir / MASTER_CHAPTER_FILE
+    if not master_file_path.exists():
+        print(f"错误: 未找到 Master 文件: {master_file_path}")
+        return None
+
+    stage = manifest.stage(
+        "master",
+        [CHARACTER_TABLE_SUFFIX, CHARACTER_ID_COL_INDEX, CHARACTER_NAME_COL_INDEX],
+    )
+    char_map_path = Path(MASTER_CHARACTERS_FILE)
+    master_entry = stage.get(MASTER_CHAPTER_FILE, master_file_path)
+    if not args.force and master_entry is not None and char_map_path.exists():
+        character_map = read_json(char_map_path)
+        print(
+            f"Master 文件未变化，已从 '{MASTER_CHARACTERS_FILE}' 加载 {len(character_map)} 个角色。"
+        )
+        return character_map
+
+    character_map = extract_character_map(master_file_path, corpus_cache)
+    write_json(char_map_path, character_map)
+    stage.put(MASTER_CHAPTER_FILE, master_file_path)
     print(
         f"成功提取 {len(character_map)} 个角色（用于预处理），已保存至 '{MASTER_CHARACTERS_FILE}'"
     )
+    return character_map
 
-    # 步骤 2 & 3: 提取对话并收集所有角色ID
-    print("正在扫描并提取所有 book.json 文件...")
-    book_files = list(input_dir.glob("**/*.book.json"))
+
+def map_dialogues(dialogues: list[dict], character_map: dict[str, str]) -> list[dict]:
+    """将对话中的角色 ID 替换为角色名，找不到映射时保留原值。"""
+    with metrics.phase("transform"):
+        mapped_dialogues = []
+        for item in dialogues:
+            speaker_id = item["name"]
+            speaker_name = character_map.get(speaker_id, speaker_id)
+            mapped_dialogues.append({"name": speaker_name, "message": item["message"]})
+        return mapped_dialogues
+
+
+def open_translation_memory(args) -> TranslationMemory | None:
+    """按 --tm 参数打开翻译记忆库；未启用或记忆库不存在时返回 None。"""
+    if not getattr(args, "tm", False):
+        return None
+    tm_path = Path(TRANSLATION_MEMORY_FILE)
+    if not tm_path.exists():
+        print(f"警告: 未找到翻译记忆库 '{tm_path}'，请先执行 'tm build'。本次不使用翻译记忆。")
+        return None
+    tm = TranslationMemory(tm_path)
+    print(f"已加载翻译记忆库，共 {tm.source_count()} 条原文。")
+    return tm
+
+
+def write_ready_dialogues(
+    output_dir: Path,
+    relative_path: Path,
+    dialogues: list[dict],
+    tm: TranslationMemory | None,
+):
+    """
+    写出阶段二（待翻译）文件。启用翻译记忆时先查找每行原文：
+    - 全部命中：直接写入 '3_Translated'，不再交给模型；
+    - 部分命中：待翻译文件只保留未命中的行，完整的预填结果保存在 'tm_prefill' 中，
+      翻译完成后由 'tm merge' 合并回 '3_Translated'。
+    """
+    prefill_path = Path(TM_PREFILL_DIR) / relative_path
+    # 已有人工翻译的文件（例如使用 --force 重新生成时）不做预填，避免覆盖现有译文
+    if tm is None or (Path(TRANSLATED_DIR) / relative_path).exists():
+        write_json(output_dir / relative_path, dialogues)
+        output_writer.unlink(prefill_path)
+        return
+
+    translations = tm.lookup([item["message"] for item in dialogues])
+    hits = sum(translation is not None for translation in translations)
+    tm.stats["lines_total"] += len(dialogues)
+    tm.stats["lines_hit"] += hits
+
+    if hits == len(dialogues):
+        write_json(
+            Path(TRANSLATED_DIR) / relative_path,
+            [
+                {"name": item["name"], "message": translation}
+                for item, translation in zip(dialogues, translations)
+            ],
+            indent=4,
+        )
+        output_writer.unlink(output_dir / relative_path)
+        output_writer.unlink(prefill_path)
+        tm.stats["files_full"] += 1
+        return
+
+    if hits:
+        write_json(
+            prefill_path,
+            [
+                {**item, "translation": translation}
+                for item, translation in zip(dialogues, translations)
+            ],
+        )
+        dialogues = [
+            item
+            for item, translation in zip(dialogues, translations)
+            if translation is None
+        ]
+        tm.stats["files_partial"] += 1
+    else:
+        output_writer.unlink(prefill_path)
+    write_json(output_dir / relative_path, dialogues)
+
+
+def print_tm_report(tm: TranslationMemory | None):
+    if tm is None:
+        return
+    stats = tm.stats
+    print(
+        f"  - 翻译记忆命中 {stats['lines_hit']}/{stats['lines_total']} 行，"
+        f"免去 {stats['lines_hit']} 次模型翻译。"
+    )
+    if stats["files_full"]:
+        print(f"  - 其中 {stats['files_full']} 个文件已完全由翻译记忆填充并写入 '{TRANSLATED_DIR}'。")
+    if stats["files_partial"]:
+        print(
+            f"  - {stats['files_partial']} 个文件部分预填，翻译完成后请执行 'tm merge' 合并。"
+        )
+    tm.close()
+
+
+def extract_dialogue_files(
+    args,
+    input_dir: Path,
+    stage,
+    targets,
+    corpus_cache: CorpusCache,
+    tm=None,
+    delta: DeltaPlanner | None = None,
+    snapshots: RowSnapshots | None = None,
+):
+    """
+    步骤 2 & 3: 提取对话并收集所有角色ID。
+    targets 为 (输出目录, 角色映射) 列表：角色映射为 None 时写出原始对话（阶段一格式），
+    否则写出映射后的对话（阶段二格式，可用翻译记忆 tm 预填）。
+    每个 book 只解析一次，依次写入所有目标目录。
+    提供 delta 时，已翻译的表格不再整体跳过，而是只把新增或修改的行写成 <表格ID>.delta.json。
+    提供 snapshots 时，为交给翻译的表格记录行快照，供之后的行级比对使用。
+    返回 (新写出的文件数, 已翻译跳过数, 未变化跳过数, 角色ID集合)。
+    """
+    translated_dir = Path(TRANSLATED_DIR)
+    with metrics.phase("glob"):
+        book_files = list(input_dir.glob("**/*.book.json"))
     extracted_count = 0
     skipped_count = 0
+    unchanged_count = 0
     all_speaker_ids = set()
 
+    # 清单中记录未变化、且产物仍在的 book 无需重新解析
+    pending_books = []
     for book_file in book_files:
-        relative_path = book_file.relative_to(input_dir)
-        book_data = read_json(book_file)
+        entry = stage.get(book_file.relative_to(input_dir).as_posix(), book_file)
+        # 行级比对需要当前的对话内容，因此增量模式下每个 book 都要解析
+        if args.force or delta is not None or entry is None:
+            pending_books.append(book_file)
+            continue
 
-        for grid in book_data.get("importGridList", []):
-            grid_name = grid["name"]
-            rows = grid.get("rows", [])
-            if not rows:
-                continue
+        grid_paths = [Path(p) for p in entry["outputs"]]
+        translated_flags = [(translated_dir / p).exists() for p in grid_paths]
+        if not all(
+            is_translated or (output_dir / p).exists()
+            for p, is_translated in zip(grid_paths, translated_flags)
+            for output_dir, _ in targets
+        ):
+            pending_books.append(book_file)
+            continue
 
-            header = rows[0].get("strings", [])
-            try:
-                speaker_col_idx = header.index(DIALOGUE_SPEAKER_ID_COL_NAME)
-                text_col_idx = header.index(DIALOGUE_TEXT_COL_NAME)
-            except ValueError:
-                continue
+        all_speaker_ids.update(entry["speakers"])
+        skipped = sum(translated_flags)
+        skipped_count += skipped
+        unchanged_count += len(grid_paths) - skipped
 
-            dialogues = []
-            for row in rows[1:]:
-                strings = row.get("strings", [])
-                if len(strings) > max(speaker_col_idx, text_col_idx):
-                    speaker_id, dialogue_text = (
-                        strings[speaker_col_idx],
-                        strings[text_col_idx],
+    jobs = resolve_jobs(args.jobs)
+    if jobs > 1 and pending_books:
+        print(f"使用 {jobs} 个进程并行解析 {len(pending_books)} 个 book.json 文件。")
+
+    blob_paths = [corpus_cache.blob_path(book_file) for book_file in pending_books]
+    scanned_books = metrics.timed(
+        iter_scanned_books(pending_books, input_dir, jobs, blob_paths), "scan"
+    )
+    for book_file, (dialogue_files, speaker_ids) in zip(pending_books, scanned_books):
+        metrics.count("books_scanned")
+        stage.put(
+            book_file.relative_to(input_dir).as_posix(),
+            book_file,
+            outputs=[p.as_posix() for p, _ in dialogue_files],
+            speakers=sorted(speaker_ids),
+        )
+        all_speaker_ids.update(speaker_ids)
+        for relative_file_path, dialogues in dialogue_files:
+            translated_version_path = translated_dir / relative_file_path
+            if not args.force and translated_version_path.exists():
+                delta_dialogues = (
+                    delta.plan_grid(relative_file_path, dialogues) if delta else None
+                )
+                if delta_dialogues is None:
+                    skipped_count += 1
+                    continue
+                relative_file_path = delta_path(relative_file_path)
+                dialogues = delta_dialogues
+
+            for output_dir, character_map in targets:
+                if character_map is None:
+                    write_json(output_dir / relative_file_path, dialogues)
+                else:
+                    write_ready_dialogues(
+                        output_dir,
+                        relative_file_path,
+                        map_dialogues(dialogues, character_map),
+                        tm,
                     )
+            # 整表交给翻译时，译文将对应这一版原文。
+            # 已有译文的表格（--force）不记录：现有译文仍对应原来的快照
+            if snapshots is not None and not translated_version_path.exists():
+                snapshots.set(relative_file_path, dialogue_hashes(dialogues))
+            extracted_count += 1
+            metrics.count("rows_extracted", len(dialogues))
 
-                    if speaker_id:
-                        is_ascii_only = True
-                        try:
-                            speaker_id.encode("ascii")
-                        except UnicodeEncodeError:
-                            is_ascii_only = False
+    stage.prune()
+    return extracted_count, skipped_count, unchanged_count, all_speaker_ids
 
-                        if not is_ascii_only:
-                            all_speaker_ids.add(speaker_id)
 
-                    if dialogue_text:
-                        dialogues.append({"name": speaker_id, "message": dialogue_text})
+def open_delta_planner(args, snapshots: RowSnapshots) -> DeltaPlanner | None:
+    if not args.delta:
+        return None
+    return DeltaPlanner(
+        snapshots,
+        Path(DELTA_PLAN_FILE),
+        Path(TRANSLATED_DIR),
+        Path(FOR_TRANSLATION_DIR),
+    )
 
-            if dialogues:
-                grid_id = grid_name.split(":")[-1]
-                relative_file_path = relative_path.with_suffix("") / f"{grid_id}.json"
 
-                translated_version_path = translated_dir / relative_file_path
-                if not args.force and translated_version_path.exists():
-                    skipped_count += 1
-                    continue
+def print_delta_report(delta: DeltaPlanner | None):
+    if delta is None:
+        return
+    stats = delta.stats
+    print(
+        f"  - 行级比对：{stats['delta_grids']} 个已翻译的表格有新增或修改，"
+        f"共 {stats['delta_rows']} 行需要翻译，{stats['unchanged']} 个表格未变化。"
+    )
+    if stats["deleted_only"]:
+        print(
+            f"  - {stats['deleted_only']} 个表格只删除了行，"
+            "运行 'delta merge' 时会从译文中移除。"
+        )
+    if stats["baseline"]:
+        print(
+            f"  - {stats['baseline']} 个表格没有快照，"
+            f"以 '{FOR_TRANSLATION_DIR}' 中提取时的原文为基准进行了比对。"
+        )
+    if delta.unaligned:
+        print(
+            f"警告: {len(delta.unaligned)} 个已翻译的表格没有快照，"
+            f"'{FOR_TRANSLATION_DIR}' 中也没有行数一致的原文，无法确认译文对应的原文版本，"
+            "已跳过。请在更新游戏数据之前运行 'delta snapshot'（或删除译文后重新提取）："
+        )
+        for key in delta.unaligned:
+            print(f"    {key}")
+    if stats["delta_grids"] or stats["deleted_only"]:
+        print(
+            "提示: 增量文件以 '.delta.json' 结尾，翻译并放入 '3_Translated' 后，"
+            "运行 'delta merge' 合并回原表格。"
+        )
 
-                output_file = output_dir / relative_file_path
-                write_json(output_file, dialogues)
-                extracted_count += 1
 
+def update_names_map(all_speaker_ids: set[str], character_map: dict[str, str]):
+    """
+    步骤 4 & 5: 对 names.json 进行增量更新，保留已存在的条目，
+    并排除 'exclude_names.json' 中列出的角色名。
+    """
     excluded_names_set = set()
     exclude_file_path = Path(EXCLUDE_NAMES_FILE)
     if exclude_file_path.exists():
@@ -192,10 +593,73 @@ def handle_extraction(args):
         print(f"'{NAMES_MAP_FILE}' 无需更新，未发现新角色名。")
     print(f"文件中当前共有 {len(existing_names)} 个角色名。")
 
+
+def handle_extraction(args):
+    """
+    执行提取操作。
+    1. 提取 Master 文件中的角色 ID -> 角色名映射，用于阶段二。
+    2. 遍历所有 book.json，提取对话文本。
+    3. 会跳过在 '3_Translated' 目录中已存在的文件。
+    4. 对 names.json 进行增量更新，保留已存在的条目。
+    5. 会读取 'out/exclude_names.json' 文件，排除其中列出的角色名。
+    """
+    print("--- 阶段一：开始提取 ---")
+    input_dir = Path(args.input_dir)
+    output_dir = Path(FOR_TRANSLATION_DIR)
+
+    if args.force and args.delta:
+        print("错误: --force 会重新提取全部文本，不能与 --delta 同时使用。")
+        return
+    if args.force and output_dir.exists():
+        print(f"警告：使用 --force 标志，将清空并重新创建目录 '{output_dir}'。")
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    Path(TRANSLATED_DIR).mkdir(parents=True, exist_ok=True)
+
+    manifest = BuildManifest(Path(BUILD_MANIFEST_FILE))
+    corpus_cache = CorpusCache(Path(CORPUS_CACHE_DIR), enabled=not args.no_cache)
+    character_map = load_character_map(args, input_dir, manifest, corpus_cache)
+    if character_map is None:
+        return
+
+    print("正在扫描并提取所有 book.json 文件...")
+    stage = manifest.stage(
+        "extract",
+        {
+            "speaker_col": DIALOGUE_SPEAKER_ID_COL_NAME,
+            "text_col": DIALOGUE_TEXT_COL_NAME,
+        },
+    )
+    snapshots = RowSnapshots(Path(ROW_SNAPSHOT_DIR))
+    delta = open_delta_planner(args, snapshots)
+    extracted_count, skipped_count, unchanged_count, all_speaker_ids = (
+        extract_dialogue_files(
+            args,
+            input_dir,
+            stage,
+            [(output_dir, None)],
+            corpus_cache,
+            delta=delta,
+            snapshots=snapshots,
+        )
+    )
+
+    update_names_map(all_speaker_ids, character_map)
+    snapshots.save()
+    if delta is not None:
+        delta.save()
+    # 所有输出确实写入之后才记录到清单中
+    output_writer.flush()
+    manifest.save()
+    corpus_cache.save()
+
     print("--- 提取完成 ---")
     print(f"  - 新提取 {extracted_count} 个对话文件。")
+    if unchanged_count:
+        print(f"  - {unchanged_count} 个对话文件的原始数据未变化，已跳过解析。")
     if not args.force:
         print(f"  - 跳过 {skipped_count} 个已翻译的文件。")
+    print_delta_report(delta)
     print(f"文件已输出到 '{output_dir}' 目录。")
 
 
@@ -223,9 +687,23 @@ def handle_mapping(args):
     character_map = read_json(char_map_file)
     print(f"已加载 {len(character_map)} 个角色映射。")
 
-    dialogue_files = list(input_dir.glob("**/*.json"))
+    tm = open_translation_memory(args)
+    manifest = BuildManifest(Path(BUILD_MANIFEST_FILE))
+    stage = manifest.stage(
+        "map",
+        {
+            "master_characters": hash_optional_file(char_map_file),
+            "translation_memory": (
+                hash_optional_file(Path(TRANSLATION_MEMORY_FILE)) if tm else None
+            ),
+        },
+    )
+
+    with metrics.phase("glob"):
+        dialogue_files = list(input_dir.glob("**/*.json"))
     mapped_count = 0
     skipped_count = 0
+    unchanged_count = 0
     for dialogue_file in dialogue_files:
         relative_path = dialogue_file.relative_to(input_dir)
 
@@ -234,112 +712,1276 @@ def handle_mapping(args):
             skipped_count += 1
             continue
 
-        dialogues = read_json(dialogue_file)
-        mapped_dialogues = []
-        for item in dialogues:
-            speaker_id = item["name"]
-            speaker_name = character_map.get(speaker_id, speaker_id)
-            mapped_dialogues.append({"name": speaker_name, "message": item["message"]})
-
+        key = relative_path.as_posix()
         output_path = output_dir / relative_path
-        write_json(output_path, mapped_dialogues)
+        entry = stage.get(key, dialogue_file)
+        if not args.force and entry is not None and output_path.exists():
+            unchanged_count += 1
+            continue
+
+        dialogues = read_json(dialogue_file)
+        write_ready_dialogues(
+            output_dir, relative_path, map_dialogues(dialogues, character_map), tm
+        )
+        stage.put(key, dialogue_file)
         mapped_count += 1
+        metrics.count("rows_mapped", len(dialogues))
+
+    stage.prune()
+    output_writer.flush()
+    manifest.save()
 
     print("--- 映射完成 ---")
     print(f"  - 新映射 {mapped_count} 个对话文件。")
+    if unchanged_count:
+        print(f"  - {unchanged_count} 个对话文件未变化，已跳过。")
+    print_tm_report(tm)
+    if not args.force:
+        print(f"  - 跳过 {skipped_count} 个已翻译的文件。")
+    print(f"文件已输出到 '{output_dir}' 目录。")
+
+
+# --- 阶段一 + 二：一次完成提取与映射 ---
+def handle_build(args):
+    """
+    将提取与映射合并为一次遍历：每个 book 只解析一次，
+    在提取对话的同时完成角色名映射，直接写出 '2_Ready_For_Translation'。
+    默认仍会同时写出 '1_For_Translation'，使用 --skip-stage1 时不再生成中间目录。
+    输出与依次执行 extract、map 的结果完全一致。
+    """
+    print("--- 阶段一 + 二：开始提取并映射 ---")
+    input_dir = Path(args.input_dir)
+    stage1_dir = Path(FOR_TRANSLATION_DIR)
+    output_dir = Path(READY_FOR_TRANSLATION_DIR)
+
+    if args.force and args.delta:
+        print("错误: --force 会重新提取全部文本，不能与 --delta 同时使用。")
+        return
+    output_dirs = [output_dir] if args.skip_stage1 else [stage1_dir, output_dir]
+    for directory in output_dirs:
+        if args.force and directory.exists():
+            print(f"警告：使用 --force 标志，将清空并重新创建目录 '{directory}'。")
+            shutil.rmtree(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+    Path(TRANSLATED_DIR).mkdir(parents=True, exist_ok=True)
+
+    manifest = BuildManifest(Path(BUILD_MANIFEST_FILE))
+    corpus_cache = CorpusCache(Path(CORPUS_CACHE_DIR), enabled=not args.no_cache)
+    character_map = load_character_map(args, input_dir, manifest, corpus_cache)
+    if character_map is None:
+        return
+
+    targets = [(output_dir, character_map)]
+    if not args.skip_stage1:
+        targets.insert(0, (stage1_dir, None))
+
+    tm = open_translation_memory(args)
+    print("正在扫描 book.json 文件，提取对话并映射角色名...")
+    stage = manifest.stage(
+        "build",
+        {
+            "speaker_col": DIALOGUE_SPEAKER_ID_COL_NAME,
+            "text_col": DIALOGUE_TEXT_COL_NAME,
+            "character_map": hash_config(character_map),
+            "skip_stage1": args.skip_stage1,
+            "translation_memory": (
+                hash_optional_file(Path(TRANSLATION_MEMORY_FILE)) if tm else None
+            ),
+        },
+    )
+    snapshots = RowSnapshots(Path(ROW_SNAPSHOT_DIR))
+    delta = open_delta_planner(args, snapshots)
+    built_count, skipped_count, unchanged_count, all_speaker_ids = (
+        extract_dialogue_files(
+            args, input_dir, stage, targets, corpus_cache, tm, delta, snapshots
+        )
+    )
+
+    update_names_map(all_speaker_ids, character_map)
+    snapshots.save()
+    if delta is not None:
+        delta.save()
+    output_writer.flush()
+    manifest.save()
+    corpus_cache.save()
+
+    print("--- 提取并映射完成 ---")
+    print(f"  - 新生成 {built_count} 个待翻译对话文件。")
+    if unchanged_count:
+        print(f"  - {unchanged_count} 个对话文件的原始数据未变化，已跳过解析。")
+    print_tm_report(tm)
     if not args.force:
         print(f"  - 跳过 {skipped_count} 个已翻译的文件。")
+    print_delta_report(delta)
     print(f"文件已输出到 '{output_dir}' 目录。")
 
 
 # --- 阶段四：打包 ---
+def plugin_output_path(output_dir: Path, relative_path: Path) -> Path:
+    """原始 book 对应的插件数据输出路径（路径中的 CharaScenario 会被去掉）。"""
+    str_path = str(output_dir / relative_path)
+    str_path = str_path.replace("CharaScenario", "")
+    return Path(str_path.replace(".book.json", ".chapter.json"))
+
+
+def fill_translations(
+    book_data: dict, translated_book_dir: Path, relative_path: Path
+) -> bool:
+    """将翻译目录中的译文原地回填到 book 的 Text 单元格，返回是否回填了任何一行。"""
+    is_modified = False
+    with metrics.phase("transform"):
+        for grid, rows, text_col_idx, translated_file in iter_translated_grids(
+            book_data, translated_book_dir
+        ):
+            translated_dialogues = read_json(translated_file)
+            for strings, translated_item in iter_aligned_rows(
+                rows, text_col_idx, translated_dialogues
+            ):
+                if translated_item is None:
+                    print(
+                        f"警告: 在 {relative_path} 的 '{grid['name']}' 中，翻译条目少于原文，可能部分未翻译。"
+                    )
+                    break
+                strings[text_col_idx] = translated_item["message"]
+                metrics.count("rows_packaged")
+                is_modified = True
+    return is_modified
+
+
+def copy_book_grids(book_data: dict) -> dict:
+    """复制 book 中各表格的行，回填译文时不改动常驻内存的原始模板。"""
+    return {
+        "importGridList": [
+            {
+                **grid,
+                "rows": [
+                    {**row, "strings": list(row.get("strings", []))}
+                    for row in grid.get("rows", [])
+                ],
+            }
+            for grid in book_data.get("importGridList", [])
+        ]
+    }
+
+
+def watch_translations(
+    args,
+    original_dir: Path,
+    translated_dir: Path,
+    output_dir: Path,
+    manifest: BuildManifest,
+    stage,
+    corpus_cache: CorpusCache,
+):
+    """
+    常驻运行：每隔 --interval 秒比较 '3_Translated' 中各 book 目录的文件指纹，
+    只重新生成有改动的 book 对应的 .chapter.json。
+    原始模板在第一次用到时解析并常驻内存，之后每次回填前只复制表格的行。
+    """
+    books = []
+    for original_file_path in sorted(original_dir.glob("**/*.book.json")):
+        relative_path = original_file_path.relative_to(original_dir)
+        books.append(
+            (
+                relative_path,
+                original_file_path,
+                translated_dir / relative_path.with_suffix(""),
+                plugin_output_path(output_dir, relative_path),
+            )
+        )
+    # 上次处理时各 book 翻译目录的指纹；没有翻译目录时为 None
+    known = {
+        relative_path: (stage.entries.get(relative_path.as_posix()) or {}).get("deps")
+        for relative_path, *_ in books
+    }
+    templates: dict[Path, dict] = {}
+
+    print(
+        f"--- 正在监视 '{translated_dir}' 中的改动（每 {args.interval} 秒检查一次），按 Ctrl+C 退出 ---"
+    )
+    try:
+        while True:
+            time.sleep(args.interval)
+            for (
+                relative_path,
+                original_file_path,
+                translated_book_dir,
+                output_book_path,
+            ) in books:
+                deps = (
+                    dir_fingerprint(translated_book_dir)
+                    if translated_book_dir.is_dir()
+                    else None
+                )
+                if deps == known[relative_path]:
+                    continue
+                # 无论成功与否都记下本次指纹，文件再次改动时才会重试
+                known[relative_path] = deps
+                start_time = time.perf_counter()
+
+                is_modified = False
+                if deps is not None:
+                    template = templates.get(relative_path)
+                    if template is None:
+                        template = corpus_cache.load_book(original_file_path)
+                        templates[relative_path] = template
+                    book_data = copy_book_grids(template)
+                    try:
+                        is_modified = fill_translations(
+                            book_data, translated_book_dir, relative_path
+                        )
+                    except json.JSONDecodeError as e:
+                        # 编辑器可能还没有写完文件
+                        print(
+                            f"  - 跳过 {relative_path}: 翻译文件不是合法的 JSON（{e}）"
+                        )
+                        continue
+
+                key = relative_path.as_posix()
+                if is_modified:
+                    write_plugin_book(
+                        output_book_path, book_data["importGridList"], compact=args.compact
+                    )
+                    # 立即落盘，游戏重新读取时就能看到改动
+                    output_writer.flush()
+                    action = "已更新"
+                elif output_book_path.exists():
+                    output_writer.unlink(output_book_path)
+                    action = "已移除"
+                else:
+                    action = None
+
+                if deps is None:
+                    stage.discard(key)
+                else:
+                    stage.put(
+                        key,
+                        original_file_path,
+                        deps=deps,
+                        output=output_book_path.as_posix() if is_modified else None,
+                    )
+                if action is not None:
+                    elapsed = (time.perf_counter() - start_time) * 1000
+                    print(f"  - {action} '{output_book_path}'（{elapsed:.0f} ms）")
+    except KeyboardInterrupt:
+        print("--- 已停止监视 ---")
+    finally:
+        output_writer.flush()
+        manifest.save()
+        corpus_cache.save()
+
+
 def handle_packaging(args):
     """
     【已简化】执行打包操作。
     仅将 3_Translated 目录中的对话文本回填到原始游戏文件结构中。
     不再处理 Master 文件或角色名。
+    --format pack 时不写目录，而是把所有章节写入单个打包文件。
     """
     print("--- 阶段四：开始打包 ---")
     original_dir = Path(args.input_dir)
     translated_dir = Path(TRANSLATED_DIR)
     output_dir = Path(PLUGIN_DATA_DIR)
+    pack_path = Path(PLUGIN_PACK_FILE)
+    use_pack = args.format == "pack"
 
     if not original_dir.exists() or not translated_dir.exists():
         print(f"错误: 必需的输入目录 '{original_dir}' 或 '{translated_dir}' 不存在。")
         return
+    if args.watch and use_pack:
+        print("错误: --watch 只支持目录格式的输出。")
+        return
 
-    if output_dir.exists():
-        shutil.rmtree(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    print("正在打包对话...")
-    original_book_files = list(original_dir.glob("**/*.book.json"))
-    package_count = 0
-    for original_file_path in original_book_files:
-        relative_path = original_file_path.relative_to(original_dir)
-        translated_book_dir = translated_dir / relative_path.with_suffix("")
-        if not translated_book_dir.is_dir():
-            continue
+    manifest = BuildManifest(Path(BUILD_MANIFEST_FILE))
+    corpus_cache = CorpusCache(Path(CORPUS_CACHE_DIR), enabled=not args.no_cache)
+    stage = manifest.stage(
+        "package_pack" if use_pack else "package",
+        {"text_col": DIALOGUE_TEXT_COL_NAME, "compact": args.compact},
+    )
 
-        original_data = read_json(original_file_path)
-        modified_data = copy.deepcopy(original_data)
-        is_modified = False
+    # 没有上次打包的记录时（或使用 --force）整体重建，否则只重打包发生变化的 book
+    previous_pack = None
+    pack_writer = None
+    try:
+        if use_pack:
+            incremental = not args.force and bool(stage.entries) and pack_path.exists()
+            if incremental:
+                try:
+                    previous_pack = PackReader(pack_path)
+                except PackError:
+                    incremental = False
+            pack_writer = PackWriter(pack_path)
+        else:
+            incremental = not args.force and bool(stage.entries) and output_dir.exists()
+            output_dir.mkdir(parents=True, exist_ok=True)
+        # 整体重建时不先清空目录，而是覆盖写入（内容相同的文件保持不变），最后删除本次未生成的旧文件
+        stale_outputs = set()
+        if not incremental:
+            stage.entries.clear()
+            if not use_pack:
+                with metrics.phase("glob"):
+                    stale_outputs = {
+                        path for path in output_dir.rglob("*") if path.is_file()
+                    }
 
-        for grid in modified_data.get("importGridList", []):
-            grid_name = grid["name"]
-            rows = grid.get("rows", [])
-            if not rows:
+        print("正在打包对话...")
+        with metrics.phase("glob"):
+            original_book_files = list(original_dir.glob("**/*.book.json"))
+        package_count = 0
+        unchanged_count = 0
+        for original_file_path in original_book_files:
+            relative_path = original_file_path.relative_to(original_dir)
+            translated_book_dir = translated_dir / relative_path.with_suffix("")
+            if not translated_book_dir.is_dir():
                 continue
 
-            grid_id = grid_name.split(":")[-1]
-            translated_file = translated_book_dir / f"{grid_id}.json"
-            if not translated_file.exists():
-                continue
+            output_book_path = plugin_output_path(output_dir, relative_path)
+            # 打包文件中的章节路径与目录格式中相对 4_Plugin_Data 的路径相同
+            pack_name = output_book_path.relative_to(output_dir).as_posix()
 
-            try:
-                header = rows[0].get("strings", [])
-                text_col_idx = header.index(DIALOGUE_TEXT_COL_NAME)
-            except ValueError:
+            key = relative_path.as_posix()
+            deps = dir_fingerprint(translated_book_dir)
+            entry = stage.get(key, original_file_path)
+            if (
+                entry is not None
+                and entry.get("deps") == deps
+                and (
+                    entry.get("output") is None
+                    or (pack_name in previous_pack if use_pack else output_book_path.exists())
+                )
+            ):
+                if entry.get("output") is not None:
+                    if use_pack:
+                        with metrics.phase("write"):
+                            pack_writer.copy_from(previous_pack, pack_name)
+                    package_count += 1
+                    unchanged_count += 1
                 continue
 
-            translated_dialogues = read_json(translated_file)
-            dialogue_iterator = iter(translated_dialogues)
+            # 只保留一份解析结果，直接在其上原地替换 Text 单元格
+            book_data = corpus_cache.load_book(original_file_path)
+            is_modified = fill_translations(book_data, translated_book_dir, relative_path)
 
-            for row in rows[1:]:
-                strings = row.get("strings", [])
-                original_text = (
-                    strings[text_col_idx] if len(strings) > text_col_idx else ""
-                )
-                if original_text:
-                    try:
-                        translated_item = next(dialogue_iterator)
-                        strings[text_col_idx] = translated_item["message"]
-                        is_modified = True
-                    except StopIteration:
-                        print(
-                            f"警告: 在 {relative_path} 的 '{grid_name}' 中，翻译条目少于原文，可能部分未翻译。"
+            if is_modified:
+                grids = book_data.get("importGridList", [])
+                if use_pack:
+                    with metrics.phase("write"):
+                        pack_writer.add(
+                            pack_name,
+                            "".join(iter_plugin_book(grids, args.compact)).encode("utf-8"),
                         )
-                        break
+                else:
+                    write_plugin_book(output_book_path, grids, compact=args.compact)
+                    stale_outputs.discard(output_book_path)
+                package_count += 1
+            elif not use_pack and output_book_path.exists():
+                # 上次打包过但本次已无可回填的翻译，移除旧产物
+                output_writer.unlink(output_book_path)
 
-        if is_modified:
-            plugin_book_data = {
-                grid["name"]: [row["strings"] for row in grid["rows"]]
-                for grid in modified_data.get("importGridList", [])
-            }
-            str_path = str(output_dir / relative_path)
-            str_path = str_path.replace("CharaScenario", "")
-            output_book_path = Path(str_path.replace(".book.json", ".chapter.json"))
-            write_json(output_book_path, plugin_book_data)
-            package_count += 1
+            stage.put(
+                key,
+                original_file_path,
+                deps=deps,
+                output=(pack_name if use_pack else output_book_path.as_posix())
+                if is_modified
+                else None,
+            )
+
+        # 原始文件或翻译目录已被删除的 book，同步删除其旧产物（打包文件中未复制即视为删除）
+        for entry in stage.prune().values():
+            if not use_pack and entry.get("output") is not None:
+                output_writer.unlink(Path(entry["output"]))
+        for path in stale_outputs:
+            output_writer.unlink(path)
+        if use_pack:
+            # 替换目标文件之前先释放旧打包文件的 mmap（Windows 上被映射的文件无法替换）
+            if previous_pack is not None:
+                previous_pack.close()
+                previous_pack = None
+            with metrics.phase("write"):
+                pack_writer.close()
+    except BaseException:
+        # 打包中途出错时删除未完成的临时文件，旧的打包文件保持不变
+        if pack_writer is not None:
+            pack_writer.abort()
+        raise
+    finally:
+        if previous_pack is not None:
+            previous_pack.close()
+    output_writer.flush()
+    manifest.save()
+    corpus_cache.save()
 
     print(f"  - 共打包 {package_count} 个包含已翻译对话的文件。")
-    print(f"--- 打包完成，插件数据已输出到 '{output_dir}' 目录 ---")
+    if unchanged_count:
+        print(f"  - 其中 {unchanged_count} 个文件的输入未变化，沿用上次的打包结果。")
+    if use_pack:
+        print(f"--- 打包完成，插件数据已输出到 '{pack_path}' ---")
+    else:
+        print(f"--- 打包完成，插件数据已输出到 '{output_dir}' 目录 ---")
 
+    if args.watch:
+        watch_translations(
+            args, original_dir, translated_dir, output_dir, manifest, stage, corpus_cache
+        )
 
-def main():
-    os.makedirs("out", exist_ok=True)
-    parser = argparse.ArgumentParser(description="游戏汉化工作流工具")
-    subparsers = parser.add_subparsers(
+
+# --- 对齐校验 ---
+# 含有这些符号的台词视为引号台词，译文应保持一致
+QUOTE_OPENERS = ("「", "『")
+
+
+def is_quoted(text: str) -> bool:
+    return any(opener in text for opener in QUOTE_OPENERS)
+
+
+def verify_book(
+    book_file: Path,
+    input_dir: Path,
+    translated_dir: Path,
+    character_map: dict[str, str],
+    blob_path: Path | None = None,
+) -> list[dict]:
+    """
+    按打包时的对齐规则，逐个表格比较原文与译文，返回每个表格的第一个分歧点。
+    比较内容：条目数、说话人（角色 ID 或映射后的角色名）、引号台词。
+    不写任何文件，可在子进程中运行。
+    """
+    relative_path = book_file.relative_to(input_dir)
+    translated_book_dir = translated_dir / relative_path.with_suffix("")
+    if not translated_book_dir.is_dir():
+        return []
+
+    issues = []
+    book_data = load_book(book_file, blob_path)
+    for grid, rows, text_col_idx, translated_file in iter_translated_grids(
+        book_data, translated_book_dir
+    ):
+        header = rows[0].get("strings", [])
+        speaker_col_idx = (
+            header.index(DIALOGUE_SPEAKER_ID_COL_NAME)
+            if DIALOGUE_SPEAKER_ID_COL_NAME in header
+            else None
+        )
+        try:
+            translated_dialogues = read_json(translated_file)
+        except (OSError, json.JSONDecodeError) as e:
+            issues.append(
+                {"file": translated_file.as_posix(), "error": f"无法读取译文: {e}"}
+            )
+            continue
+
+        source_lines = []
+        for row in rows[1:]:
+            strings = row.get("strings", [])
+            text = strings[text_col_idx] if len(strings) > text_col_idx else ""
+            if text:
+                speaker_id = (
+                    strings[speaker_col_idx]
+                    if speaker_col_idx is not None and len(strings) > speaker_col_idx
+                    else ""
+                )
+                source_lines.append((speaker_id, text))
+
+        divergence = None
+        for index, ((speaker_id, text), item) in enumerate(
+            zip(source_lines, translated_dialogues)
+        ):
+            reasons = []
+            name = item.get("name", "")
+            if name not in (speaker_id, character_map.get(speaker_id, speaker_id)):
+                reasons.append("说话人不一致")
+            if is_quoted(text) != is_quoted(item.get("message", "")):
+                reasons.append("引号不一致")
+            if reasons:
+                divergence = {
+                    "index": index + 1,
+                    "reasons": reasons,
+                    "source": {"name": speaker_id, "message": text},
+                    "translated": item,
+                }
+                break
+
+        if divergence is None and len(source_lines) == len(translated_dialogues):
+            continue
+        issues.append(
+            {
+                "file": translated_file.as_posix(),
+                "source_count": len(source_lines),
+                "translated_count": len(translated_dialogues),
+                "divergence": divergence,
+            }
+        )
+    return issues
+
+
+def handle_verify(args):
+    """
+    不写任何文件，并行检查所有已翻译表格与原文的对齐情况：
+    条目数是否一致，以及说话人、引号台词等逐行特征从哪一行开始出现分歧。
+    发现问题时以非零状态码退出。
+    """
+    print("--- 开始校验译文对齐 ---")
+    input_dir = Path(args.input_dir)
+    translated_dir = Path(TRANSLATED_DIR)
+    if not input_dir.exists() or not translated_dir.exists():
+        print(f"错误: 必需的输入目录 '{input_dir}' 或 '{translated_dir}' 不存在。")
+        sys.exit(2)
+
+    corpus_cache = CorpusCache(Path(CORPUS_CACHE_DIR), enabled=not args.no_cache)
+    character_map = {}
+    master_file_path = input_dir / MASTER_CHAPTER_FILE
+    if Path(MASTER_CHARACTERS_FILE).exists():
+        character_map = read_json(Path(MASTER_CHARACTERS_FILE))
+    elif master_file_path.exists():
+        character_map = extract_character_map(master_file_path, corpus_cache)
+
+    # 只校验存在翻译目录的 book
+    with metrics.phase("glob"):
+        book_files = [
+            book_file
+            for book_file in sorted(input_dir.glob("**/*.book.json"))
+            if (
+                translated_dir / book_file.relative_to(input_dir).with_suffix("")
+            ).is_dir()
+        ]
+    blob_paths = [corpus_cache.blob_path(book_file) for book_file in book_files]
+    jobs = resolve_jobs(args.jobs)
+    if jobs > 1 and len(book_files) > 1:
+        chunksize = max(1, len(book_files) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(
+                metrics.timed(
+                    metrics.collect(
+                        executor.map(
+                            call_with_metrics,
+                            repeat(verify_book),
+                            book_files,
+                            repeat(input_dir),
+                            repeat(translated_dir),
+                            repeat(character_map),
+                            blob_paths,
+                            chunksize=chunksize,
+                        )
+                    ),
+                    "verify",
+                )
+            )
+    else:
+        with metrics.phase("verify"):
+            results = [
+                verify_book(
+                    book_file, input_dir, translated_dir, character_map, blob_path
+                )
+                for book_file, blob_path in zip(book_files, blob_paths)
+            ]
+    corpus_cache.save()
+
+    issues = [issue for book_issues in results for issue in book_issues]
+    for issue in issues:
+        if "error" in issue:
+            print(f"[Error] {issue['file']}: {issue['error']}")
+            continue
+        print(f"[对齐问题] 文件: {issue['file']}")
+        print(f"   条目数: 原文 {issue['source_count']}，译文 {issue['translated_count']}")
+        divergence = issue["divergence"]
+        if divergence is not None:
+            print(f"   从第 {divergence['index']} 项开始出现分歧: {'、'.join(divergence['reasons'])}")
+            print(f"   原文: {divergence['source']['name']} {divergence['source']['message']}")
+            print(
+                f"   译文: {divergence['translated'].get('name', '')} "
+                f"{divergence['translated'].get('message', '')}"
+            )
+        print("-" * 20)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(
+                {"books": len(book_files), "issues": issues},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        print(f"结构化报告已写入: {args.report}")
+
+    print(f"--- 校验完成：共检查 {len(book_files)} 个 book，发现 {len(issues)} 个问题表格 ---")
+    if issues:
+        sys.exit(1)
+
+
+# --- 翻译记忆 ---
+def iter_translation_pairs(input_dir: Path, corpus_cache: CorpusCache):
+    """按打包时的对齐规则，产出原始 Text 与 '3_Translated' 中译文的 (原文, 译文) 对。"""
+    translated_dir = Path(TRANSLATED_DIR)
+    for book_file in input_dir.glob("**/*.book.json"):
+        relative_path = book_file.relative_to(input_dir)
+        translated_book_dir = translated_dir / relative_path.with_suffix("")
+        if not translated_book_dir.is_dir():
+            continue
+
+        book_data = corpus_cache.load_book(book_file)
+        for _, rows, text_col_idx, translated_file in iter_translated_grids(
+            book_data, translated_book_dir
+        ):
+            for strings, translated_item in iter_aligned_rows(
+                rows, text_col_idx, read_json(translated_file)
+            ):
+                if translated_item is None:
+                    break
+                message = translated_item.get("message")
+                if isinstance(message, str) and message:
+                    yield strings[text_col_idx], message
+
+
+def handle_tm_build(args):
+    """从原始文件与已有翻译重新生成翻译记忆库。"""
+    print("--- 开始生成翻译记忆库 ---")
+    input_dir = Path(args.input_dir)
+    if not input_dir.exists() or not Path(TRANSLATED_DIR).exists():
+        print(f"错误: 必需的输入目录 '{input_dir}' 或 '{TRANSLATED_DIR}' 不存在。")
+        return
+
+    corpus_cache = CorpusCache(Path(CORPUS_CACHE_DIR), enabled=not args.no_cache)
+    tm = TranslationMemory(Path(TRANSLATION_MEMORY_FILE))
+    pair_count = tm.rebuild(iter_translation_pairs(input_dir, corpus_cache))
+    source_count = tm.source_count()
+    tm.close()
+    corpus_cache.save()
+
+    print(f"  - 共收录 {source_count} 条原文、{pair_count} 组原文/译文对照。")
+    print(f"--- 翻译记忆库已保存至 '{TRANSLATION_MEMORY_FILE}' ---")
+
+
+def handle_tm_merge(args):
+    """将部分预填的文件与模型翻译的结果合并，写回 '3_Translated'。"""
+    print("--- 开始合并翻译记忆预填结果 ---")
+    prefill_dir = Path(TM_PREFILL_DIR)
+    translated_dir = Path(TRANSLATED_DIR)
+    merged_count = 0
+    pending_count = 0
+    mismatched_count = 0
+    merged_files = []
+
+    for prefill_file in list(prefill_dir.glob("**/*.json")):
+        relative_path = prefill_file.relative_to(prefill_dir)
+        translated_file = translated_dir / relative_path
+        if not translated_file.exists():
+            pending_count += 1
+            continue
+
+        prefilled = read_json(prefill_file)
+        translated = read_json(translated_file)
+        missing_count = sum(item["translation"] is None for item in prefilled)
+        if len(translated) != missing_count:
+            print(
+                f"警告: {relative_path} 需要 {missing_count} 条模型译文，实际为 {len(translated)} 条，已跳过。"
+            )
+            mismatched_count += 1
+            continue
+
+        translated_iterator = iter(translated)
+        merged = [
+            {
+                "name": item["name"],
+                "message": (
+                    item["translation"]
+                    if item["translation"] is not None
+                    else next(translated_iterator)["message"]
+                ),
+            }
+            for item in prefilled
+        ]
+        write_json(translated_file, merged, indent=4)
+        merged_files.append(prefill_file)
+        merged_count += 1
+
+    # 合并结果全部写入之后才删除预填文件，写入失败时可以重新合并
+    output_writer.flush()
+    for prefill_file in merged_files:
+        output_writer.unlink(prefill_file)
+
+    print(f"  - 合并 {merged_count} 个文件。")
+    if pending_count:
+        print(f"  - {pending_count} 个文件尚未翻译，暂不合并。")
+    if mismatched_count:
+        print(f"  - {mismatched_count} 个文件的条目数不一致，请检查后重试。")
+    print("--- 合并完成 ---")
+
+
+# --- 去重导出 / 导入 ---
+def handle_dedup_export(args):
+    """
+    将 '2_Ready_For_Translation' 中的所有文件合并为一份不重复的 (name, message) 列表，
+    同时生成反向索引，记录每个文件的每一行对应列表中的哪一项。
+    """
+    print("--- 开始导出去重后的待翻译文本 ---")
+    input_dir = Path(READY_FOR_TRANSLATION_DIR)
+    if not input_dir.exists():
+        print(f"错误: 必需的输入目录 '{input_dir}' 不存在。请先执行映射操作。")
+        return
+
+    unique_index = {}
+    unique_lines = []
+    back_refs = {}
+    line_count = 0
+    for dialogue_file in sorted(input_dir.glob("**/*.json")):
+        refs = []
+        for item in read_json(dialogue_file):
+            key = (item["name"], item["message"])
+            index = unique_index.get(key)
+            if index is None:
+                index = unique_index[key] = len(unique_lines)
+                unique_lines.append({"name": item["name"], "message": item["message"]})
+            refs.append(index)
+        back_refs[dialogue_file.relative_to(input_dir).as_posix()] = refs
+        line_count += len(refs)
+
+    write_json(Path(DEDUP_UNIQUE_FILE), unique_lines)
+    with metrics.phase("write"):
+        output_writer.write_text(
+            Path(DEDUP_BACK_REFS_FILE),
+            json.dumps(
+                {"unique_count": len(unique_lines), "files": back_refs},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ),
+        )
+
+    print(f"  - 共 {len(back_refs)} 个文件、{line_count} 行，去重后剩余 {len(unique_lines)} 行。")
+    if line_count:
+        print(f"  - 需要模型翻译的行数减少了 {line_count - len(unique_lines)} 行。")
+    print(f"--- 导出完成，请翻译 '{DEDUP_UNIQUE_FILE}' ---")
+
+
+def handle_dedup_import(args):
+    """根据反向索引，将翻译后的去重列表还原为 '3_Translated' 下按表格划分的文件。"""
+    print("--- 开始导入去重翻译结果 ---")
+    translated_unique_path = Path(args.translated_file)
+    back_refs_path = Path(DEDUP_BACK_REFS_FILE)
+    if not translated_unique_path.exists() or not back_refs_path.exists():
+        print(
+            f"错误: 必需的输入 '{translated_unique_path}' 或 '{back_refs_path}' 不存在。请先执行 'dedup export'。"
+        )
+        return
+
+    back_refs = read_json(back_refs_path)
+    unique_lines = read_json(Path(DEDUP_UNIQUE_FILE))
+    translated_lines = read_json(translated_unique_path)
+    if len(translated_lines) != back_refs["unique_count"]:
+        print(
+            f"错误: 译文共 {len(translated_lines)} 行，与导出的 {back_refs['unique_count']} 行不一致，已取消导入。"
+        )
+        return
+
+    translated_dir = Path(TRANSLATED_DIR)
+    imported_count = 0
+    skipped_count = 0
+    for relative_path, refs in back_refs["files"].items():
+        output_path = translated_dir / relative_path
+        if not args.force and output_path.exists():
+            skipped_count += 1
+            continue
+
+        write_json(
+            output_path,
+            [
+                {
+                    "name": unique_lines[index]["name"],
+                    "message": translated_lines[index]["message"],
+                }
+                for index in refs
+            ],
+            indent=4,
+        )
+        imported_count += 1
+
+    print(f"  - 写入 {imported_count} 个翻译文件。")
+    if skipped_count:
+        print(f"  - 跳过 {skipped_count} 个已存在的翻译文件（可使用 --force 覆盖）。")
+    if Path(TM_PREFILL_DIR).exists():
+        print("提示: 存在翻译记忆预填的文件，请接着执行 'tm merge'。")
+    print(f"--- 导入完成，文件已输出到 '{translated_dir}' 目录 ---")
+
+
+# --- 行级增量 ---
+def handle_delta_snapshot(args):
+    """
+    以当前原文为已翻译的表格建立行快照。建议在更新游戏数据之前、译文与原文对应时执行。
+    行数与译文不一致的表格无法确认对应关系，不会建立快照。
+    """
+    print("--- 开始建立行快照 ---")
+    input_dir = Path(args.input_dir)
+    translated_dir = Path(TRANSLATED_DIR)
+    snapshots = RowSnapshots(Path(ROW_SNAPSHOT_DIR))
+    corpus_cache = CorpusCache(Path(CORPUS_CACHE_DIR), enabled=not args.no_cache)
+
+    book_files = sorted(input_dir.glob("**/*.book.json"))
+    blob_paths = [corpus_cache.blob_path(book_file) for book_file in book_files]
+    scanned_books = iter_scanned_books(
+        book_files, input_dir, resolve_jobs(args.jobs), blob_paths
+    )
+    recorded_count = 0
+    kept_count = 0
+    unaligned = []
+    for dialogue_files, _ in scanned_books:
+        for relative_file_path, dialogues in dialogue_files:
+            translated_path = translated_dir / relative_file_path
+            if not translated_path.exists():
+                continue
+            if not args.force and snapshots.get(relative_file_path) is not None:
+                kept_count += 1
+                continue
+            if len(read_json(translated_path)) != len(dialogues):
+                unaligned.append(relative_file_path.as_posix())
+                continue
+            snapshots.set(relative_file_path, dialogue_hashes(dialogues))
+            recorded_count += 1
+
+    snapshots.save()
+    output_writer.flush()
+    corpus_cache.save()
+    print(f"  - 为 {recorded_count} 个已翻译的表格建立了快照。")
+    if kept_count:
+        print(f"  - {kept_count} 个表格已有快照，保持不变（可使用 --force 覆盖）。")
+    if unaligned:
+        print(f"警告: {len(unaligned)} 个表格的行数与译文不一致，未建立快照：")
+        for key in unaligned:
+            print(f"    {key}")
+    print(f"--- 快照已保存到 '{ROW_SNAPSHOT_DIR}' ---")
+
+
+def handle_delta_merge(args):
+    """将翻译完成的 <表格ID>.delta.json 按 'extract --delta' 记录的方案合并回原表格。"""
+    print("--- 开始合并增量译文 ---")
+    if not Path(DELTA_PLAN_FILE).exists():
+        print(f"没有待合并的增量（'{DELTA_PLAN_FILE}' 不存在）。")
+        return
+
+    delta = DeltaPlanner(
+        RowSnapshots(Path(ROW_SNAPSHOT_DIR)),
+        Path(DELTA_PLAN_FILE),
+        Path(TRANSLATED_DIR),
+    )
+    stats = delta.merge(
+        [Path(FOR_TRANSLATION_DIR), Path(READY_FOR_TRANSLATION_DIR)]
+    )
+    delta.save()
+    output_writer.flush()
+
+    print(f"  - 合并了 {stats['merged']} 个表格。")
+    if stats["pending"]:
+        print(f"  - {stats['pending']} 个表格的增量尚未翻译。")
+    if stats["mismatched"]:
+        print(f"警告: {len(stats['mismatched'])} 个增量译文的行数与待翻译的行数不一致，未合并：")
+        for key in stats["mismatched"]:
+            print(f"    {key}")
+    if stats["stale"]:
+        print(
+            f"警告: {len(stats['stale'])} 个增量译文是按更早的原文翻译的，原文之后又有变化，未合并。"
+            "请删除后重新翻译对应的 .delta.json："
+        )
+        for key in stats["stale"]:
+            print(f"    {key}")
+    print(f"--- 合并完成，文件已输出到 '{TRANSLATED_DIR}' 目录 ---")
+
+
+# --- 全文索引 ---
+def iter_book_lines(
+    book_data: dict, translated_book_dir: Path, character_map: dict[str, str]
+):
+    """
+    按打包时的对齐规则产出 book 中每一行对话：
+    (表格名, 行号, 说话人ID, 说话人, 原文, 译文或 None)。
+    说话人优先取译文条目中的 name，没有译文时按角色表解析说话人 ID。
+    """
+    for grid in book_data.get("importGridList", []):
+        rows = grid.get("rows", [])
+        if not rows:
+            continue
+
+        header = rows[0].get("strings", [])
+        try:
+            speaker_col_idx = header.index(DIALOGUE_SPEAKER_ID_COL_NAME)
+            text_col_idx = header.index(DIALOGUE_TEXT_COL_NAME)
+        except ValueError:
+            continue
+
+        translated_dialogues = []
+        translated_file = translated_book_dir / f"{grid['name'].split(':')[-1]}.json"
+        if translated_file.exists():
+            try:
+                translated_dialogues = read_json(translated_file)
+            except json.JSONDecodeError as e:
+                print(f"警告: 无法解析 '{translated_file}'，按未翻译处理（{e}）")
+
+        dialogue_iterator = iter(translated_dialogues)
+        for row_index, row in enumerate(rows[1:], start=1):
+            strings = row.get("strings", [])
+            source = strings[text_col_idx] if len(strings) > text_col_idx else ""
+            if not source:
+                continue
+            speaker_id = (
+                strings[speaker_col_idx] if len(strings) > speaker_col_idx else ""
+            )
+
+            translated_item = next(dialogue_iterator, None) or {}
+            translation = translated_item.get("message")
+            speaker = translated_item.get("name") or character_map.get(
+                speaker_id, speaker_id
+            )
+            yield (
+                grid["name"],
+                row_index,
+                speaker_id,
+                speaker,
+                source,
+                translation if isinstance(translation, str) and translation else None,
+            )
+
+
+def update_corpus_index(
+    index: CorpusIndex,
+    input_dir: Path,
+    corpus_cache: CorpusCache,
+    force: bool = False,
+    jobs: int = 1,
+) -> dict[str, int]:
+    """
+    增量更新全文索引：原始文件的大小、修改时间与翻译目录的指纹均未变化的 book 直接跳过，
+    已删除的 book 从索引中移除。返回各类 book 的数量。
+    """
+    characters_path = Path(MASTER_CHARACTERS_FILE)
+    character_map = read_json(characters_path) if characters_path.exists() else {}
+    config = {
+        "speaker_col": DIALOGUE_SPEAKER_ID_COL_NAME,
+        "text_col": DIALOGUE_TEXT_COL_NAME,
+        "characters": hash_optional_file(characters_path),
+        "segments": SEGMENT_COUNT,
+    }
+    index.ensure_config(hash_config(config), force)
+    index.set_meta("input_dir", str(input_dir))
+
+    translated_dir = Path(TRANSLATED_DIR)
+    fingerprints = index.fingerprints()
+    counts = {"updated": 0, "unchanged": 0, "removed": 0}
+    with metrics.phase("glob"):
+        book_files = sorted(input_dir.glob("**/*.book.json"))
+    seen = set()
+    for book_file in book_files:
+        relative_path = book_file.relative_to(input_dir)
+        key = relative_path.as_posix()
+        seen.add(key)
+        translated_book_dir = translated_dir / relative_path.with_suffix("")
+        with metrics.phase("fingerprint"):
+            stat = book_file.stat()
+            fingerprint = json.dumps(
+                [
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    dir_fingerprint(translated_book_dir)
+                    if translated_book_dir.is_dir()
+                    else None,
+                ]
+            )
+        if fingerprints.get(key) == fingerprint:
+            counts["unchanged"] += 1
+            continue
+
+        book_data = corpus_cache.load_book(book_file)
+        with metrics.phase("transform"):
+            lines = list(iter_book_lines(book_data, translated_book_dir, character_map))
+        with metrics.phase("index"):
+            index.replace_book(key, fingerprint, lines)
+        metrics.count("rows_indexed", len(lines))
+        counts["updated"] += 1
+
+    with metrics.phase("index"):
+        for key in fingerprints.keys() - seen:
+            index.remove_book(key)
+            counts["removed"] += 1
+        index.commit(jobs)
+    return counts
+
+
+def handle_index(args):
+    """为原始文本与 '3_Translated' 中的译文建立（或增量更新）全文索引。"""
+    print("--- 开始更新全文索引 ---")
+    input_dir = Path(args.input_dir)
+    if not input_dir.exists():
+        print(f"错误: 输入目录 '{input_dir}' 不存在。")
+        return
+
+    corpus_cache = CorpusCache(Path(CORPUS_CACHE_DIR), enabled=not args.no_cache)
+    index = CorpusIndex(Path(CORPUS_INDEX_FILE))
+    counts = update_corpus_index(
+        index, input_dir, corpus_cache, args.force, resolve_jobs(args.jobs)
+    )
+    totals = index.counts()
+    index.close()
+    corpus_cache.save()
+
+    print(f"  - 重新索引 {counts['updated']} 个 book。")
+    if counts["unchanged"]:
+        print(f"  - {counts['unchanged']} 个 book 未变化，已跳过。")
+    if counts["removed"]:
+        print(f"  - 移除 {counts['removed']} 个已删除的 book。")
+    print(
+        f"--- 索引共包含 {totals['books']} 个 book、{totals['lines']} 行对话，"
+        f"已保存至 '{CORPUS_INDEX_FILE}' ---"
+    )
+
+
+def handle_query(args):
+    """在全文索引中查询对话，可按子串、说话人与残留假名筛选。"""
+    if not (args.text or args.speaker or args.kana):
+        print("错误: 请至少指定查询文本、--speaker 或 --kana 之一。")
+        sys.exit(2)
+    index_path = Path(CORPUS_INDEX_FILE)
+    if not index_path.exists():
+        print(f"错误: 未找到索引 '{index_path}'，请先运行 'index <原始目录>'。")
+        sys.exit(2)
+
+    index = CorpusIndex(index_path)
+    if args.update:
+        input_dir = index.get_meta("input_dir")
+        if input_dir is None or not Path(input_dir).exists():
+            print("错误: 无法确定上次索引的原始目录，请重新运行 'index <原始目录>'。")
+            sys.exit(2)
+        counts = update_corpus_index(
+            index, Path(input_dir), CorpusCache(Path(CORPUS_CACHE_DIR))
+        )
+        if counts["updated"] or counts["removed"]:
+            print(
+                f"已更新索引：重新索引 {counts['updated']} 个 book，"
+                f"移除 {counts['removed']} 个 book。"
+            )
+
+    # 也可以用 names.json 中的中文译名查询，对应到原文中的角色名
+    speakers = None
+    if args.speaker:
+        speakers = {args.speaker}
+        names_map_path = Path(NAMES_MAP_FILE)
+        if names_map_path.exists():
+            speakers.update(
+                name
+                for name, translated_name in read_json(names_map_path).items()
+                if translated_name == args.speaker
+            )
+
+    start_time = time.perf_counter()
+    with metrics.phase("query"):
+        results = index.search(
+            args.text, speakers, args.kana, field=args.field, limit=args.limit
+        )
+    elapsed = (time.perf_counter() - start_time) * 1000
+    index.close()
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    for result in results:
+        print(
+            f"{result['book']} {result['grid']} 第 {result['row']} 行 [{result['speaker'] or '-'}]"
+        )
+        print(f"    原文: {result['source']}")
+        print(f"    译文: {result['translation'] or '（未翻译）'}")
+    summary = f"共 {len(results)} 条结果（{elapsed:.1f} ms）"
+    if len(results) == args.limit:
+        summary += f"，已达到显示上限 {args.limit} 条，可用 --limit 调整"
+    print(summary + "。")
+
+
+# --- 翻译 ---
+def collect_untranslated(force: bool) -> tuple[dict[Path, list[dict]], int]:
+    """
+    读取 '2_Ready_For_Translation' 中尚未翻译的文件，返回 ({相对路径: 台词列表}, 跳过的文件数)。
+    force=True 时不跳过已翻译的文件。
+    """
+    input_dir = Path(READY_FOR_TRANSLATION_DIR)
+    translated_dir = Path(TRANSLATED_DIR)
+    files = {}
+    skipped_count = 0
+    for dialogue_file in sorted(input_dir.glob("**/*.json")):
+        relative_path = dialogue_file.relative_to(input_dir)
+        if not force and (translated_dir / relative_path).exists():
+            skipped_count += 1
+            continue
+        files[relative_path] = read_json(dialogue_file)
+    return files, skipped_count
+
+
+def handle_schedule(args):
+    """
+    估算每个待翻译文件的工作量，按最长处理时间优先的规则分配到 N 个均衡的队列，
+    超大的文件在行边界处拆开。生成的批次清单供 'translate --schedule' 使用。
+    """
+    print("--- 开始生成翻译批次清单 ---")
+    if not Path(READY_FOR_TRANSLATION_DIR).exists():
+        print(
+            f"错误: 必需的输入目录 '{READY_FOR_TRANSLATION_DIR}' 不存在。请先执行映射操作。"
+        )
+        return
+
+    files, skipped_count = collect_untranslated(args.force)
+    if skipped_count:
+        print(f"  - 跳过 {skipped_count} 个已翻译的文件（可使用 --force 包含这些文件）。")
+    if not files:
+        print("--- 没有需要翻译的文件 ---")
+        return
+
+    schedule = build_schedule(
+        {path.as_posix(): dialogues for path, dialogues in files.items()}, args.slots
+    )
+    write_json(Path(TRANSLATE_SCHEDULE_FILE), schedule)
+
+    ideal = schedule["total_cost"] / schedule["slots"]
+    makespan = max(queue["cost"] for queue in schedule["queues"])
+    unit_count = sum(len(queue["units"]) for queue in schedule["queues"])
+    print(
+        f"  - 共 {len(files)} 个文件，估算工作量 {schedule['total_cost']} token，"
+        f"拆分为 {unit_count} 个工作单元、{schedule['slots']} 个队列。"
+    )
+    for slot, queue in enumerate(schedule["queues"]):
+        print(f"    队列 {slot}: {len(queue['units'])} 个单元，工作量 {queue['cost']}")
+    print(
+        f"  - 最长队列 {makespan}，理想值 {ideal:.0f}（{makespan / ideal:.1%}）；"
+        f"按文件顺序分配时为 {schedule['in_order_makespan']}。"
+    )
+    print(f"--- 清单已写入 '{TRANSLATE_SCHEDULE_FILE}'，使用 'translate --schedule' 开始翻译 ---")
+
+
+def load_translate_schedule(jobs: list[FileJob]):
+    """
+    读取批次清单并转换为每个槽位的 (文件, 起始行, 结束行) 列表。
+    清单生成后行数发生变化的文件、或清单中没有的文件，按同样的规则重新分配。
+    """
+    schedule = read_json(Path(TRANSLATE_SCHEDULE_FILE))
+    jobs_by_path = {job.relative_path.as_posix(): job for job in jobs}
+    slots = [[] for _ in schedule["queues"]]
+    covered = set()
+    for slot, queue in enumerate(schedule["queues"]):
+        for unit in queue["units"]:
+            job = jobs_by_path.get(unit["file"])
+            if job is None or schedule["line_counts"].get(unit["file"]) != len(
+                job.dialogues
+            ):
+                continue
+            slots[slot].append((job, unit["start"], unit["end"]))
+            covered.add(unit["file"])
+
+    leftover = [
+        unit
+        for path, job in jobs_by_path.items()
+        if path not in covered
+        for unit in split_units(path, job.dialogues, schedule["max_unit_cost"])
+    ]
+    if leftover:
+        print(f"  - {len({unit['file'] for unit in leftover})} 个文件不在清单中或已变化，已重新分配。")
+        for slot, queue in enumerate(balance(leftover, len(slots))):
+            slots[slot].extend(
+                (jobs_by_path[unit["file"]], unit["start"], unit["end"])
+                for unit in queue["units"]
+            )
+    return slots
+
+
+def handle_translate(args):
+    """
+    阶段三：将 '2_Ready_For_Translation' 中的文件分批发送给 OpenAI 兼容的接口翻译，
+    每个文件翻译完成后立即写入 '3_Translated'。中断后重新运行会从检查点继续。
+    """
+    print("--- 开始翻译 ---")
+    input_dir = Path(READY_FOR_TRANSLATION_DIR)
+    if not input_dir.exists():
+        print(f"错误: 必需的输入目录 '{input_dir}' 不存在。请先执行映射操作。")
+        return
+
+    translated_dir = Path(TRANSLATED_DIR)
+    checkpoint_dir = Path(TRANSLATE_CHECKPOINT_DIR)
+    files, skipped_count = collect_untranslated(args.force)
+    jobs = [
+        FileJob(relative_path, dialogues, checkpoint_dir)
+        for relative_path, dialogues in files.items()
+    ]
+
+    if skipped_count:
+        print(f"  - 跳过 {skipped_count} 个已翻译的文件（可使用 --force 重新翻译）。")
+    if not jobs:
+        print("--- 没有需要翻译的文件 ---")
+        return
+
+    glossary = None
+    if Path(GLOSSARY_FILE).exists():
+        glossary = GlossaryChecker(
+            load_glossary(Path(GLOSSARY_FILE), Path(NAMES_MAP_FILE))
+        )
+
+    schedule = None
+    concurrency = args.concurrency
+    if args.schedule:
+        if not Path(TRANSLATE_SCHEDULE_FILE).exists():
+            print(f"错误: 批次清单 '{TRANSLATE_SCHEDULE_FILE}' 不存在。请先执行 'schedule'。")
+            return
+        schedule = load_translate_schedule(jobs)
+        concurrency = len(schedule)
+        print(f"  - 按批次清单分配到 {concurrency} 个槽位。")
+
+    line_count = sum(job.remaining() for job in jobs)
+    resumed_count = sum(len(job.dialogues) for job in jobs) - line_count
+    print(
+        f"  - 共 {len(jobs)} 个文件、{line_count} 行待翻译，"
+        f"并发数 {concurrency}，每批 {args.batch_size} 行。"
+    )
+    if resumed_count:
+        print(f"  - 从检查点恢复了 {resumed_count} 行已完成的译文。")
+
+    client = ChatClient(
+        args.endpoint,
+        args.model,
+        api_key=args.api_key or os.environ.get("OPENAI_API_KEY"),
+        timeout=args.timeout,
+        max_retries=args.max_retries,
+    )
+    runner = TranslationRunner(
+        client, glossary, translated_dir, concurrency, args.batch_size
+    )
+    try:
+        stats = asyncio.run(runner.run(jobs, schedule))
+    except KeyboardInterrupt:
+        print("已中断。已完成的批次保存在检查点中，重新运行即可继续。")
+        return
+
+    if not any(checkpoint_dir.glob("**/*.json")):
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    elapsed = stats["elapsed"]
+    print(f"  - 完成 {stats['files_done']} 个文件、{stats['lines_done']} 行，用时 {elapsed:.1f} 秒。")
+    if elapsed > 0 and stats["lines_done"]:
+        print(f"  - 平均 {stats['lines_done'] / elapsed:.1f} 行/秒。")
+    print(
+        f"  - 共发送 {client.stats['requests']} 次请求，其中重试 {client.stats['retries']} 次，"
+        f"行数不符 {client.stats['mismatches']} 次。"
+    )
+    if stats["files_failed"]:
+        print(f"  - {stats['files_failed']} 个文件翻译失败，重新运行即可从检查点继续。")
+    if Path(TM_PREFILL_DIR).exists():
+        print("提示: 存在翻译记忆预填的文件，请接着执行 'tm merge'。")
+    print(f"--- 翻译完成，文件已输出到 '{translated_dir}' 目录 ---")
+
+
+def run_command(args):
+    """运行子命令，退出前等待后台写入全部完成（写入失败时以异常退出）。"""
+    try:
+        return args.func(args)
+    finally:
+        output_writer.close()
+
+
+def main():
+    os.makedirs("out", exist_ok=True)
+    parser = argparse.ArgumentParser(description="游戏汉化工作流工具")
+    add_instrumentation_arguments(parser)
+    subparsers = parser.add_subparsers(
         dest="command", required=True, help="可执行的命令"
     )
 
@@ -352,6 +1994,22 @@ def main():
     parser_extract.add_argument(
         "--force", action="store_true", help="强制重新提取所有文本，忽略已翻译的文件。"
     )
+    parser_extract.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="并行解析 book.json 的进程数，默认 1（串行），0 表示使用全部 CPU 核心。",
+    )
+    parser_extract.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 'out/.corpus_cache' 中的原始数据解析缓存。",
+    )
+    parser_extract.add_argument(
+        "--delta",
+        action="store_true",
+        help="对已翻译的文件做行级比对，只提取新增或修改的行（写为 .delta.json）。",
+    )
     parser_extract.set_defaults(func=handle_extraction)
 
     parser_map = subparsers.add_parser(
@@ -360,18 +2018,330 @@ def main():
     parser_map.add_argument(
         "--force", action="store_true", help="强制重新映射所有文本，忽略已翻译的文件。"
     )
+    parser_map.add_argument(
+        "--tm",
+        action="store_true",
+        help="使用翻译记忆库预填已翻译过的相同原文。",
+    )
     parser_map.set_defaults(func=handle_mapping)
 
+    parser_build = subparsers.add_parser(
+        "build",
+        help="阶段一 + 二：一次完成提取与映射，直接生成待翻译文件。会跳过已翻译的文件。",
+    )
+    parser_build.add_argument(
+        "input_dir", type=str, help="包含解包后游戏JSON文件的根目录。"
+    )
+    parser_build.add_argument(
+        "--force", action="store_true", help="强制重新提取所有文本，忽略已翻译的文件。"
+    )
+    parser_build.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="并行解析 book.json 的进程数，默认 1（串行），0 表示使用全部 CPU 核心。",
+    )
+    parser_build.add_argument(
+        "--skip-stage1",
+        action="store_true",
+        help="不再写出中间目录 '1_For_Translation'，只生成 '2_Ready_For_Translation'。",
+    )
+    parser_build.add_argument(
+        "--tm",
+        action="store_true",
+        help="使用翻译记忆库预填已翻译过的相同原文。",
+    )
+    parser_build.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 'out/.corpus_cache' 中的原始数据解析缓存。",
+    )
+    parser_build.add_argument(
+        "--delta",
+        action="store_true",
+        help="对已翻译的文件做行级比对，只提取新增或修改的行（写为 .delta.json）。",
+    )
+    parser_build.set_defaults(func=handle_build)
+
     parser_package = subparsers.add_parser(
         "package", help="阶段四：将翻译后的对话文本打包成插件格式。"
     )
     parser_package.add_argument(
         "input_dir", type=str, help="包含原始游戏JSON文件的根目录（用作模板）。"
     )
+    parser_package.add_argument(
+        "--force",
+        action="store_true",
+        help="忽略构建清单，清空输出目录后重新打包所有文件。",
+    )
+    parser_package.add_argument(
+        "--format",
+        choices=["dir", "pack"],
+        default="dir",
+        help=(
+            "输出格式：dir 为每个 book 一个 .chapter.json（默认）；"
+            f"pack 为单个打包文件 '{PLUGIN_PACK_FILE}'，可用 chapter_pack.py 查看或还原。"
+        ),
+    )
+    parser_package.add_argument(
+        "--compact",
+        action="store_true",
+        help="输出不带缩进的紧凑 JSON，体积更小、写入更快。",
+    )
+    parser_package.add_argument(
+        "--watch",
+        action="store_true",
+        help="打包完成后继续运行，监视 '3_Translated' 中的改动并只重新打包受影响的 book（仅支持目录格式）。",
+    )
+    parser_package.add_argument(
+        "--interval",
+        type=float,
+        default=0.5,
+        help="--watch 模式下检查改动的间隔秒数（默认 0.5）。",
+    )
+    parser_package.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 'out/.corpus_cache' 中的原始数据解析缓存。",
+    )
     parser_package.set_defaults(func=handle_packaging)
 
+    parser_verify = subparsers.add_parser(
+        "verify",
+        help="打包前校验：检查译文与原文是否逐行对齐，不写任何文件。",
+    )
+    parser_verify.add_argument(
+        "input_dir", type=str, help="包含原始游戏JSON文件的根目录。"
+    )
+    parser_verify.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="并行校验的进程数，默认 1（串行），0 表示使用全部 CPU 核心。",
+    )
+    parser_verify.add_argument(
+        "--report",
+        type=str,
+        help="将问题报告以 JSON 格式写入指定文件。",
+    )
+    parser_verify.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 'out/.corpus_cache' 中的原始数据解析缓存。",
+    )
+    parser_verify.set_defaults(func=handle_verify)
+
+    parser_translate = subparsers.add_parser(
+        "translate",
+        help="阶段三：调用 OpenAI 兼容接口（如 llama-server）翻译待翻译文件。会跳过已翻译的文件。",
+    )
+    parser_translate.add_argument(
+        "--endpoint",
+        type=str,
+        default="http://127.0.0.1:6006",
+        help="接口地址，默认为 'http://127.0.0.1:6006'。",
+    )
+    parser_translate.add_argument(
+        "--model",
+        type=str,
+        default="Sakura-Galtransl-14B-v3.8",
+        help="模型名称，默认为 'Sakura-Galtransl-14B-v3.8'。",
+    )
+    parser_translate.add_argument(
+        "--api-key",
+        type=str,
+        help="接口密钥，默认读取环境变量 OPENAI_API_KEY；本地模型通常不需要。",
+    )
+    parser_translate.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="同时进行的请求数，建议与 llama-server 的 -np 保持一致，默认 4。",
+    )
+    parser_translate.add_argument(
+        "--batch-size",
+        type=int,
+        default=10,
+        help="每次请求翻译的行数，默认 10。",
+    )
+    parser_translate.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="连接失败或服务器繁忙时的最大重试次数，默认 5。",
+    )
+    parser_translate.add_argument(
+        "--timeout",
+        type=float,
+        default=300,
+        help="单次请求的超时时间（秒），默认 300。",
+    )
+    parser_translate.add_argument(
+        "--schedule",
+        action="store_true",
+        help=f"按 '{TRANSLATE_SCHEDULE_FILE}' 中的均衡队列分配批次，并发数等于清单中的槽位数。",
+    )
+    parser_translate.add_argument(
+        "--force", action="store_true", help="重新翻译所有文件，覆盖已翻译的文件。"
+    )
+    parser_translate.set_defaults(func=handle_translate)
+
+    parser_schedule = subparsers.add_parser(
+        "schedule",
+        help="按工作量将待翻译文件均衡分配到多个并行槽位，生成批次清单。",
+    )
+    parser_schedule.add_argument(
+        "--slots",
+        type=int,
+        default=4,
+        help="并行槽位数，建议与 llama-server 的 -np 保持一致，默认 4。",
+    )
+    parser_schedule.add_argument(
+        "--force", action="store_true", help="包含已翻译的文件。"
+    )
+    parser_schedule.set_defaults(func=handle_schedule)
+
+    parser_delta = subparsers.add_parser(
+        "delta", help="行级增量：游戏更新后只翻译新增或修改的行。"
+    )
+    delta_subparsers = parser_delta.add_subparsers(
+        dest="delta_command", required=True
+    )
+    parser_delta_snapshot = delta_subparsers.add_parser(
+        "snapshot", help="以当前原文为已翻译的表格建立行快照。"
+    )
+    parser_delta_snapshot.add_argument(
+        "input_dir", type=str, help="包含原始游戏JSON文件的根目录。"
+    )
+    parser_delta_snapshot.add_argument(
+        "--force", action="store_true", help="覆盖已存在的快照。"
+    )
+    parser_delta_snapshot.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="并行解析 book.json 的进程数，默认 1（串行），0 表示使用全部 CPU 核心。",
+    )
+    parser_delta_snapshot.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 'out/.corpus_cache' 中的原始数据解析缓存。",
+    )
+    parser_delta_snapshot.set_defaults(func=handle_delta_snapshot)
+    parser_delta_merge = delta_subparsers.add_parser(
+        "merge", help="将翻译完成的 .delta.json 合并回 3_Translated 中的原表格。"
+    )
+    parser_delta_merge.set_defaults(func=handle_delta_merge)
+
+    parser_tm = subparsers.add_parser(
+        "tm", help="翻译记忆：复用已有译文，减少需要模型翻译的行数。"
+    )
+    tm_subparsers = parser_tm.add_subparsers(dest="tm_command", required=True)
+    parser_tm_build = tm_subparsers.add_parser(
+        "build", help="根据原始文件与 3_Translated 生成翻译记忆库。"
+    )
+    parser_tm_build.add_argument(
+        "input_dir", type=str, help="包含原始游戏JSON文件的根目录。"
+    )
+    parser_tm_build.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 'out/.corpus_cache' 中的原始数据解析缓存。",
+    )
+    parser_tm_build.set_defaults(func=handle_tm_build)
+    parser_tm_merge = tm_subparsers.add_parser(
+        "merge", help="将部分预填的文件与模型译文合并，写回 3_Translated。"
+    )
+    parser_tm_merge.set_defaults(func=handle_tm_merge)
+
+    parser_index = subparsers.add_parser(
+        "index", help="为原文与 3_Translated 中的译文建立全文索引，已索引且未变化的 book 会跳过。"
+    )
+    parser_index.add_argument(
+        "input_dir", type=str, help="包含原始游戏JSON文件的根目录。"
+    )
+    parser_index.add_argument(
+        "--force", action="store_true", help="清空索引后重新建立。"
+    )
+    parser_index.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="并行重建倒排表的进程数，默认 1（串行），0 表示使用全部 CPU 核心。",
+    )
+    parser_index.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用 'out/.corpus_cache' 中的原始数据解析缓存。",
+    )
+    parser_index.set_defaults(func=handle_index)
+
+    parser_query = subparsers.add_parser(
+        "query", help="在全文索引中查询对话（需先运行 index）。"
+    )
+    parser_query.add_argument(
+        "text", type=str, nargs="?", help="要查找的文本，原文或译文中包含该文本的行都会列出。"
+    )
+    parser_query.add_argument(
+        "--speaker",
+        type=str,
+        help="只列出该说话人的行，可使用角色 ID、原文中的角色名或 names.json 中的译名。",
+    )
+    parser_query.add_argument(
+        "--kana", action="store_true", help="只列出译文中仍含有日文假名的行。"
+    )
+    parser_query.add_argument(
+        "--field",
+        choices=QUERY_FIELDS,
+        default="all",
+        help="查询文本匹配的字段：all（原文或译文，默认）、source（原文）或 translation（译文）。",
+    )
+    parser_query.add_argument(
+        "--limit", type=int, default=50, help="最多显示的结果数，默认 50。"
+    )
+    parser_query.add_argument(
+        "--json", action="store_true", help="以 JSON 格式输出结果。"
+    )
+    parser_query.add_argument(
+        "--update",
+        action="store_true",
+        help="查询前先增量更新索引（使用上次 index 时的原始目录）。",
+    )
+    parser_query.set_defaults(func=handle_query)
+
+    parser_dedup = subparsers.add_parser(
+        "dedup", help="去重：合并重复的待翻译行，翻译后再还原为按表格划分的文件。"
+    )
+    dedup_subparsers = parser_dedup.add_subparsers(
+        dest="dedup_command", required=True
+    )
+    parser_dedup_export = dedup_subparsers.add_parser(
+        "export", help="将 2_Ready_For_Translation 导出为不重复的行列表与反向索引。"
+    )
+    parser_dedup_export.set_defaults(func=handle_dedup_export)
+    parser_dedup_import = dedup_subparsers.add_parser(
+        "import", help="将翻译后的去重列表还原到 3_Translated。"
+    )
+    parser_dedup_import.add_argument(
+        "translated_file", type=str, help="翻译完成后的 unique_lines.json。"
+    )
+    parser_dedup_import.add_argument(
+        "--force", action="store_true", help="覆盖 3_Translated 中已存在的文件。"
+    )
+    parser_dedup_import.set_defaults(func=handle_dedup_import)
+
     args = parser.parse_args()
-    args.func(args)
+    command = " ".join(
+        name
+        for name in (
+            args.command,
+            getattr(args, "delta_command", None),
+            getattr(args, "tm_command", None),
+            getattr(args, "dedup_command", None),
+        )
+        if name
+    )
+    run_instrumented(command, run_command, args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,259 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+DEFAULT_PROFILE_FILE = "out/profile.pstats"
+# --profile 时在控制台输出的函数条数（按累计耗时排序）
+PROFILE_PRINT_LIMIT = 25
+
+
+class Metrics:
+    """
+    记录本进程中各阶段（glob、parse、transform、write 等）的耗时与计数。
+    阶段可以嵌套，耗时按“独占”统计：内层阶段的时间不会重复计入外层，
+    因此各阶段之和不超过总耗时，剩余部分即为未归类的开销。
+    """
+
+    def __init__(self):
+        self.phases: dict[str, dict] = {}
+        self.counters: Counter = Counter()
+        # 子进程（--jobs）中各阶段耗时之和，与主进程的耗时分开记录
+        self.worker_phases: dict[str, dict] = {}
+        self._stack: list[list] = []
+
+    def _add_phase(self, phases: dict, name: str, seconds: float, calls: int = 1):
+        entry = phases.setdefault(name, {"seconds": 0.0, "calls": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += calls
+
+    @contextmanager
+    def phase(self, name: str):
+        frame = [time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            self._add_phase(self.phases, name, elapsed - frame[1])
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def record_phase(self, name: str, seconds: float, calls: int = 1):
+        """记录在 phase 之外自行累计的耗时（例如逐条目计时的检查规则），同样不计入外层阶段。"""
+        self._add_phase(self.phases, name, seconds, calls)
+        if self._stack:
+            self._stack[-1][1] += seconds
+
+    def timed(self, iterable, name: str):
+        """逐项产出 iterable 的元素，每次取下一项的耗时计入 name 阶段（例如等待进程池的结果）。"""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def record_read(self, size: int):
+        self.counters["files_read"] += 1
+        self.counters["bytes_read"] += size
+
+    def record_write(self, size: int):
+        self.counters["files_written"] += 1
+        self.counters["bytes_written"] += size
+
+    def take(self) -> dict:
+        """取出并清空当前记录，供子进程随结果一起返回给主进程。"""
+        snapshot = {"phases": self.phases, "counters": dict(self.counters)}
+        self.phases = {}
+        self.counters = Counter()
+        return snapshot
+
+    def merge_worker(self, snapshot: dict):
+        """合并子进程返回的记录：计数直接累加，耗时计入 worker_phases。"""
+        self.counters.update(snapshot["counters"])
+        for name, entry in snapshot["phases"].items():
+            self._add_phase(self.worker_phases, name, entry["seconds"], entry["calls"])
+
+    def collect(self, results):
+        """逐个产出 call_with_metrics 返回的结果，同时合并子进程的记录。"""
+        for result, snapshot in results:
+            self.merge_worker(snapshot)
+            yield result
+
+    def report(self, command: str, wall_time: float, exit_code: int) -> dict:
+        times = os.times()
+        accounted = sum(entry["seconds"] for entry in self.phases.values())
+        return {
+            "command": command,
+            "argv": sys.argv[1:],
+            "exit_code": exit_code,
+            "wall_time": wall_time,
+            "cpu_time": {
+                "user": times.user,
+                "system": times.system,
+                "children_user": times.children_user,
+                "children_system": times.children_system,
+            },
+            "peak_memory": peak_memory(),
+            "phases": {
+                **{
+                    name: self.phases[name]
+                    for name in sorted(
+                        self.phases, key=lambda name: -self.phases[name]["seconds"]
+                    )
+                },
+                "other": {"seconds": max(0.0, wall_time - accounted), "calls": 1},
+            },
+            "worker_phases": self.worker_phases,
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+
+# 进程内唯一的记录对象；各模块直接导入使用
+metrics = Metrics()
+
+
+def call_with_metrics(func, *args):
+    """在子进程中调用 func，连同本次调用产生的记录一起返回，由主进程用 metrics.collect 合并。"""
+    # 以 fork 方式创建的子进程会继承主进程已有的记录，先丢弃，避免重复计数
+    metrics.take()
+    result = func(*args)
+    return result, metrics.take()
+
+
+def peak_memory() -> dict:
+    """
+    返回本进程与已结束子进程的峰值常驻内存（字节）。
+    POSIX 上来自 getrusage，Windows 上读取本进程的 PeakWorkingSetSize（无子进程数据）。
+    """
+    if resource is not None:
+        # Linux 的 ru_maxrss 以 KB 为单位，macOS 以字节为单位
+        scale = 1 if sys.platform == "darwin" else 1024
+        return {
+            "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+        }
+    try:
+        import ctypes
+
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+    except (AttributeError, OSError):
+        return {"self": None, "children": None}
+    return {"self": process_peak_memory(handle), "children": None}
+
+
+def process_peak_memory(handle) -> int | None:
+    """Windows 上读取进程句柄 handle 的 PeakWorkingSetSize（字节），无法获取时返回 None。"""
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+            handle, ctypes.byref(counters), counters.cb
+        ):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+def add_instrumentation_arguments(parser):
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        metavar="PATH",
+        help="运行结束后将各阶段耗时、读写文件数与字节数、峰值内存等写入 JSON 文件。",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const=DEFAULT_PROFILE_FILE,
+        metavar="PATH",
+        help=(
+            f"使用 cProfile 分析本次运行，结果写入 PATH（默认 '{DEFAULT_PROFILE_FILE}'），"
+            "可用 python -m pstats 查看。只包含主进程，需要完整数据时请配合 --jobs 1。"
+        ),
+    )
+
+
+def run_instrumented(command: str, func, args):
+    """
+    运行 func(args)，按 --profile 与 --metrics 参数进行性能分析并写出记录。
+    func 通过 sys.exit 退出时同样会写出记录。相关提示输出到 stderr，
+    不会混入命令本身的输出（例如 query --json）。
+    """
+    profiler = cProfile.Profile() if args.profile else None
+    exit_code = 0
+    start_time = time.perf_counter()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            return func(args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+        raise
+    except BaseException:
+        exit_code = 1
+        raise
+    finally:
+        wall_time = time.perf_counter() - start_time
+        if profiler is not None:
+            profile_path = Path(args.profile)
+            profile_path.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profile_path)
+            print(
+                f"\n性能分析结果已写入 '{profile_path}'，累计耗时最多的函数：",
+                file=sys.stderr,
+            )
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats(
+                "cumulative"
+            ).print_stats(PROFILE_PRINT_LIMIT)
+        if args.metrics:
+            metrics_path = Path(args.metrics)
+            metrics_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(metrics_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    metrics.report(command, wall_time, exit_code),
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            print(f"运行指标已写入 '{metrics_path}'。", file=sys.stderr)
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from metrics import metrics
+
+# 后台写入线程数。写小文件的耗时主要在系统调用（以及 Windows 上杀毒软件的扫描）上，
+# 多个线程可以让这些等待互相重叠
+DEFAULT_WORKERS = 8
+# 尚未完成的写入数上限，超过时等待最早的写入完成，避免序列化后的数据堆积在内存中
+MAX_PENDING = 512
+
+
+class OutputWriter:
+    """
+    各阶段共用的输出写入器：
+    - 在调用方线程中完成序列化，并缓存已创建的目录，每个目录只 mkdir 一次；
+    - 实际写入交给后台线程池，先写临时文件再原子替换；
+    - 新内容与磁盘上已有的内容逐字节相同时不写入，修改时间保持不变，git 也不会出现无意义的变化。
+    同一路径的写入与删除按调用顺序执行。后台写入的错误会在 flush（或之后的写入）时抛出。
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_pending: int = MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: ThreadPoolExecutor | None = None
+        # 路径 -> 尚未确认完成的写入，按提交顺序排列
+        self._pending: dict[Path, Future] = {}
+        self._created_dirs: set[Path] = set()
+        self._lock = threading.Lock()
+        self.stats = {"written": 0, "unchanged": 0}
+
+    def _ensure_dir(self, directory: Path):
+        if directory not in self._created_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(directory)
+
+    def _wait(self, path: Path):
+        future = self._pending.pop(path, None)
+        if future is not None:
+            future.result()
+
+    def _write(self, path: Path, data: bytes):
+        try:
+            if os.path.getsize(path) == len(data):
+                with open(path, "rb") as f:
+                    if f.read() == data:
+                        with self._lock:
+                            self.stats["unchanged"] += 1
+                        return
+        except FileNotFoundError:
+            pass
+
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        try:
+            f = open(tmp_path, "wb")
+        except FileNotFoundError:
+            # 目录在缓存之后被删除（例如 --watch 运行期间手动清理了输出目录）
+            path.parent.mkdir(parents=True, exist_ok=True)
+            f = open(tmp_path, "wb")
+        with f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats["written"] += 1
+
+    def write_bytes(self, path: Path, data: bytes):
+        self._ensure_dir(path.parent)
+        metrics.record_write(len(data))
+        # 同一路径上一次的写入完成之后才能提交新的写入，保证最终内容是最后一次写入的
+        self._wait(path)
+        if len(self._pending) >= self.max_pending:
+            self._wait(next(iter(self._pending)))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="output-writer"
+            )
+        self._pending[path] = self._executor.submit(self._write, path, data)
+
+    def write_text(self, path: Path, text: str):
+        self.write_bytes(path, text.encode("utf-8"))
+
+    def write_json(self, path: Path, data, indent: int | None = 2):
+        """输出与 json.dump(data, f, ensure_ascii=False, indent=indent) 逐字节一致。"""
+        self.write_text(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+    def unlink(self, path: Path, missing_ok: bool = True):
+        """等待该路径尚未完成的写入后再删除，避免删除之后又被后台写入恢复。"""
+        self._wait(path)
+        path.unlink(missing_ok=missing_ok)
+
+    def flush(self):
+        """等待所有写入完成；有写入失败时抛出其中第一个错误。"""
+        pending, self._pending = self._pending, {}
+        errors = []
+        with metrics.phase("write"):
+            for future in pending.values():
+                try:
+                    future.result()
+                except OSError as e:
+                    errors.append(e)
+        with self._lock:
+            metrics.count("files_unchanged", self.stats["unchanged"])
+            self.stats["unchanged"] = 0
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+# 进程内共用的写入器；各阶段结束前调用 flush，进程退出前调用 close。
+# 流水线的输出（各阶段的数据文件、翻译结果与检查点、差量计划与快照、check.py 的自动修复）都经由它写出。
+# 以下文件有意不经过它：build_manifest、corpus_cache 与 clean_cache 的索引自行原子写入，
+# 它们在进程结束时保存，且必须在所记录的输出全部写完之后才能写入；
+# --report 与 --metrics 等诊断文件在输出“已写入”的提示之前需要落盘，也便于在写入器出错时仍能得到报告。
+output_writer = OutputWriter()
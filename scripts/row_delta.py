@@ -0,0 +1,262 @@
+import hashlib
+import json
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from output_writer import output_writer
+
+# 增量文件的后缀：<表格ID>.delta.json 与原表格的翻译文件放在同一目录
+DELTA_SUFFIX = ".delta.json"
+
+
+def row_hash(speaker_id: str, text: str) -> str:
+    return hashlib.sha1(f"{speaker_id}\0{text}".encode("utf-8")).hexdigest()[:16]
+
+
+def dialogue_hashes(dialogues: list[dict]) -> list[str]:
+    """对话列表中每一行 (Arg1, Text) 的哈希，顺序与翻译条目一一对应。"""
+    return [row_hash(item["name"], item["message"]) for item in dialogues]
+
+
+def delta_path(relative_file_path: Path) -> Path:
+    return relative_file_path.with_name(f"{relative_file_path.stem}{DELTA_SUFFIX}")
+
+
+def diff_rows(old_hashes: list[str], new_hashes: list[str]) -> list[list]:
+    """
+    对齐快照与当前原文，返回 [操作, 旧起点, 旧终点, 新起点, 新终点] 列表。
+    操作为 equal / replace / insert / delete，含义与 difflib 相同。
+    """
+    matcher = SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+    return [list(opcode) for opcode in matcher.get_opcodes()]
+
+
+def changed_rows(opcodes: list[list]) -> list[int]:
+    """需要重新翻译的行（当前原文中的下标）：新增或被修改的行。"""
+    return [
+        index
+        for tag, _, _, new_start, new_end in opcodes
+        if tag in ("replace", "insert")
+        for index in range(new_start, new_end)
+    ]
+
+
+def merge_rows(opcodes: list[list], old_items: list, delta_items: list) -> list:
+    """未变化的行沿用原有译文，新增或修改的行依次取增量译文，删除的行丢弃。"""
+    delta_iterator = iter(delta_items)
+    merged = []
+    for tag, old_start, old_end, new_start, new_end in opcodes:
+        if tag == "equal":
+            merged.extend(old_items[old_start:old_end])
+        elif tag in ("replace", "insert"):
+            merged.extend(next(delta_iterator) for _ in range(new_end - new_start))
+    return merged
+
+
+def file_identity(path: Path) -> list[int] | None:
+    """文件的 [大小, 修改时间]，用于判断文件在记录之后是否被替换；文件不存在时返回 None。"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class RowSnapshots:
+    """
+    行快照：记录产生译文时每个表格各行 (Arg1, Text) 的哈希。
+    每个 book 存为一个文件 <快照目录>/<book 相对路径>.json，内容为 {表格ID: [哈希, ...]}。
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._books: dict[Path, dict] = {}
+        self._dirty: set[Path] = set()
+
+    def _book(self, relative_file_path: Path) -> tuple[Path, dict]:
+        book_path = self.root / relative_file_path.parent.with_name(
+            f"{relative_file_path.parent.name}.json"
+        )
+        if book_path not in self._books:
+            try:
+                with open(book_path, "r", encoding="utf-8") as f:
+                    self._books[book_path] = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._books[book_path] = {}
+        return book_path, self._books[book_path]
+
+    def get(self, relative_file_path: Path) -> list[str] | None:
+        return self._book(relative_file_path)[1].get(relative_file_path.stem)
+
+    def set(self, relative_file_path: Path, hashes: list[str]):
+        book_path, grids = self._book(relative_file_path)
+        if grids.get(relative_file_path.stem) != hashes:
+            grids[relative_file_path.stem] = hashes
+            self._dirty.add(book_path)
+
+    def save(self):
+        for book_path in sorted(self._dirty):
+            output_writer.write_json(
+                book_path, dict(sorted(self._books[book_path].items())), indent=None
+            )
+        self._dirty.clear()
+
+
+class DeltaPlanner:
+    """
+    对已翻译的表格做行级比对：只把新增或修改的行交给翻译，并记录合并方案，
+    翻译完成后由 merge 把增量译文放回原表格的正确位置。
+    比对只读取 '3_Translated'，译文的任何修改（包括只删除了行的表格）都留到 merge 时进行。
+    baseline_dir 为提取时交给翻译的目录（'1_For_Translation'）：没有快照的表格以其中的文件为比对基准。
+    """
+
+    def __init__(
+        self,
+        snapshots: RowSnapshots,
+        plan_path: Path,
+        translated_dir: Path,
+        baseline_dir: Path | None = None,
+    ):
+        self.snapshots = snapshots
+        self.plan_path = plan_path
+        self.translated_dir = translated_dir
+        self.baseline_dir = baseline_dir
+        try:
+            with open(plan_path, "r", encoding="utf-8") as f:
+                self.plan = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.plan = {}
+        self.stats = {
+            "unchanged": 0,
+            "delta_grids": 0,
+            "delta_rows": 0,
+            "deleted_only": 0,
+            "baseline": 0,
+        }
+        # 既没有快照、也没有可用基准的表格：无法确认译文对应的是哪一版原文，不能自动比对
+        self.unaligned: list[str] = []
+
+    def _baseline_hashes(self, relative_file_path: Path) -> list[str] | None:
+        """
+        提取时写出的待翻译文件就是译者拿到的原文（已翻译的表格之后不会再被覆盖），
+        行数与译文一致时可以作为比对基准；否则返回 None。
+        """
+        if self.baseline_dir is None:
+            return None
+        try:
+            with open(self.baseline_dir / relative_file_path, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            with open(self.translated_dir / relative_file_path, "r", encoding="utf-8") as f:
+                translated = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if len(baseline) != len(translated):
+            return None
+        return dialogue_hashes(baseline)
+
+    def plan_grid(
+        self, relative_file_path: Path, dialogues: list[dict]
+    ) -> list[dict] | None:
+        """
+        比对一个已翻译的表格，返回需要翻译的增量对话；无需翻译时返回 None。
+        只删除了行的表格同样记录在合并方案中，由 merge 更新译文。
+        """
+        key = relative_file_path.as_posix()
+        new_hashes = dialogue_hashes(dialogues)
+        old_hashes = self.snapshots.get(relative_file_path)
+
+        if old_hashes is None:
+            # 此时原文可能已经更新，不能以当前原文建立快照，否则原地修改的行永远不会被发现
+            old_hashes = self._baseline_hashes(relative_file_path)
+            if old_hashes is None:
+                self.unaligned.append(key)
+                return None
+            self.snapshots.set(relative_file_path, old_hashes)
+            self.stats["baseline"] += 1
+
+        if old_hashes == new_hashes:
+            self.plan.pop(key, None)
+            self.stats["unchanged"] += 1
+            return None
+
+        opcodes = diff_rows(old_hashes, new_hashes)
+        rows = changed_rows(opcodes)
+        entry = {
+            "opcodes": opcodes,
+            "snapshot": new_hashes,
+            "delta_count": len(rows),
+        }
+        previous = self.plan.get(key)
+        if previous is not None:
+            stale_delta = previous.get("stale_delta")
+            if previous["snapshot"] != new_hashes:
+                # 原文在上次比对后再次变化，已放入的增量译文不再对应。
+                # 译文目录由译者维护，这里不删除，只记下该文件，merge 时不会合并它
+                stale_delta = file_identity(
+                    self.translated_dir / delta_path(relative_file_path)
+                )
+            if stale_delta is not None:
+                entry["stale_delta"] = stale_delta
+        self.plan[key] = entry
+
+        if not rows:
+            self.stats["deleted_only"] += 1
+            return None
+        self.stats["delta_grids"] += 1
+        self.stats["delta_rows"] += len(rows)
+        return [dialogues[index] for index in rows]
+
+    def merge(self, cleanup_dirs: list[Path]) -> dict:
+        """
+        将 '3_Translated' 中已翻译完成的增量文件合并回原表格，并更新快照；
+        只删除了行的表格不需要增量文件，直接从原译文中移除对应的行。
+        cleanup_dirs 中对应的待翻译增量文件会一并删除。
+        """
+        stats = {"merged": 0, "pending": 0, "mismatched": [], "stale": []}
+        merged_keys = []
+        for key in sorted(self.plan):
+            entry = self.plan[key]
+            relative_file_path = Path(key)
+            delta_items = []
+            if entry["delta_count"]:
+                delta_file = self.translated_dir / delta_path(relative_file_path)
+                identity = file_identity(delta_file)
+                if identity is None:
+                    stats["pending"] += 1
+                    continue
+                if identity == entry.get("stale_delta"):
+                    stats["stale"].append(key)
+                    continue
+                with open(delta_file, "r", encoding="utf-8") as f:
+                    delta_items = json.load(f)
+                if len(delta_items) != entry["delta_count"]:
+                    stats["mismatched"].append(key)
+                    continue
+
+            translated_path = self.translated_dir / relative_file_path
+            with open(translated_path, "r", encoding="utf-8") as f:
+                old_items = json.load(f)
+            output_writer.write_json(
+                translated_path,
+                merge_rows(entry["opcodes"], old_items, delta_items),
+                indent=4,
+            )
+            merged_keys.append(key)
+
+        # 合并后的译文全部落盘之后，才能删除增量文件并推进快照
+        output_writer.flush()
+        for key in merged_keys:
+            relative_file_path = Path(key)
+            self.snapshots.set(relative_file_path, self.plan.pop(key)["snapshot"])
+            output_writer.unlink(self.translated_dir / delta_path(relative_file_path))
+            for directory in cleanup_dirs:
+                output_writer.unlink(directory / delta_path(relative_file_path))
+        stats["merged"] = len(merged_keys)
+        return stats
+
+    def save(self):
+        self.snapshots.save()
+        if self.plan:
+            output_writer.write_json(self.plan_path, self.plan, indent=None)
+        else:
+            output_writer.unlink(self.plan_path)
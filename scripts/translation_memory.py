@@ -0,0 +1,74 @@
+import sqlite3
+from pathlib import Path
+
+# SQLite 单条语句的参数个数有上限，批量查询时分块进行
+_LOOKUP_CHUNK_SIZE = 500
+
+
+class TranslationMemory:
+    """
+    翻译记忆库：保存 原文 -> 译文 的对照，存放在本地 SQLite 数据库中。
+    同一原文出现多种译文时，取出现次数最多的一种（次数相同取字典序最小者，保证结果稳定）。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pairs (
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (source, target)
+            ) WITHOUT ROWID
+            """
+        )
+        # 命中统计，用于报告免去的模型调用次数
+        self.stats = {
+            "lines_total": 0,
+            "lines_hit": 0,
+            "files_full": 0,
+            "files_partial": 0,
+        }
+
+    def rebuild(self, pairs) -> int:
+        """清空记忆库，并用 (原文, 译文) 迭代器重新填充，返回写入的对照条数。"""
+        with self.conn:
+            self.conn.execute("DELETE FROM pairs")
+            self.conn.executemany(
+                """
+                INSERT INTO pairs (source, target, count) VALUES (?, ?, 1)
+                ON CONFLICT (source, target) DO UPDATE SET count = count + 1
+                """,
+                pairs,
+            )
+        return self.conn.execute("SELECT COUNT(*) FROM pairs").fetchone()[0]
+
+    def source_count(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(DISTINCT source) FROM pairs"
+        ).fetchone()[0]
+
+    def lookup(self, sources: list[str]) -> list[str | None]:
+        """按顺序返回每条原文的译文，记忆库中没有的返回 None。"""
+        unique_sources = list(dict.fromkeys(sources))
+        best = {}
+        for start in range(0, len(unique_sources), _LOOKUP_CHUNK_SIZE):
+            chunk = unique_sources[start : start + _LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"""
+                SELECT source, target FROM pairs
+                WHERE source IN ({placeholders})
+                ORDER BY source, count DESC, target
+                """,
+                chunk,
+            )
+            for source, target in rows:
+                best.setdefault(source, target)
+        return [best.get(source) for source in sources]
+
+    def close(self):
+        self.conn.close()
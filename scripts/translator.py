@@ -0,0 +1,373 @@
+import asyncio
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from build_manifest import hash_config
+from glossary import GlossaryChecker
+from output_writer import output_writer
+
+# SakuraLLM / GalTransl 模型使用的提示词
+SYSTEM_PROMPT = (
+    "你是一个视觉小说翻译模型，可以通顺地使用给定的术语表以指定的风格将日文翻译成简体中文，"
+    "并联系上下文正确使用人称代词，注意不要混淆使役态和被动态的主语和宾语，"
+    "不要擅自添加原文中没有的特殊符号，也不要擅自增加或减少换行。"
+)
+USER_PROMPT = (
+    "参考以下术语表（可为空，格式为src->dst #备注）：\n{glossary}\n\n"
+    "根据以上术语表的对应关系和备注，结合历史剧情和上下文，将下面的文本从日文翻译成简体中文：\n{text}"
+)
+# 台词内部的换行在提示词中转义，保证一行原文对应一行译文
+LINE_BREAK_ESCAPE = "\\n"
+# 单次重试等待的上限（秒）
+MAX_BACKOFF = 60.0
+# 回复行数与原文不一致时，同一批次最多请求的次数，之后拆成两半分别翻译
+LINE_COUNT_ATTEMPTS = 2
+
+
+class TranslationError(Exception):
+    """请求失败且无法通过重试恢复。"""
+
+
+class RetryableError(Exception):
+    """可以重试的错误：连接失败、超时或服务器繁忙。"""
+
+
+class ChatClient:
+    """
+    OpenAI 兼容的 /v1/chat/completions 客户端。
+    HTTP 请求在线程中以阻塞方式发送，由调用方用 asyncio 控制并发数。
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        model: str,
+        api_key: str | None = None,
+        timeout: float = 300.0,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+    ):
+        base_url = endpoint.rstrip("/")
+        if base_url.endswith("/v1"):
+            base_url = base_url[: -len("/v1")]
+        self.url = f"{base_url}/v1/chat/completions"
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stats = {"requests": 0, "retries": 0, "mismatches": 0}
+
+    def _post(self, messages: list[dict]) -> str:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.1,
+            "top_p": 0.3,
+            "frequency_penalty": 0.1,
+        }
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers=headers,
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.load(response)
+        except urllib.error.HTTPError as e:
+            # 429 与 5xx 通常是服务器繁忙，其余的 4xx 重试也不会成功
+            if e.code == 429 or e.code >= 500:
+                raise RetryableError(f"HTTP {e.code}") from e
+            raise TranslationError(f"HTTP {e.code}: {e.read()[:200]!r}") from e
+        except (urllib.error.URLError, OSError) as e:
+            raise RetryableError(str(e)) from e
+        except json.JSONDecodeError as e:
+            raise RetryableError("响应不是合法的 JSON") from e
+
+        try:
+            return body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise RetryableError("响应中缺少 choices[0].message.content") from e
+
+    async def complete(self, messages: list[dict]) -> str:
+        """
+        发送请求并返回回复内容。
+        遇到可重试的错误时按指数退避等待后重试，超过次数上限则抛出 TranslationError。
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.stats["requests"] += 1
+                return await asyncio.to_thread(self._post, messages)
+            except RetryableError as e:
+                if attempt == self.max_retries:
+                    raise TranslationError(f"重试 {self.max_retries} 次后仍然失败: {e}") from e
+                self.stats["retries"] += 1
+                delay = min(MAX_BACKOFF, self.backoff * 2**attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+
+def build_messages(lines: list[str], glossary: GlossaryChecker | None) -> list[dict]:
+    """生成一个批次的提示词；只注入该批次原文中实际出现的术语。"""
+    text = "\n".join(line.replace("\n", LINE_BREAK_ESCAPE) for line in lines)
+    terms = glossary.find_terms(text) if glossary is not None else []
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": USER_PROMPT.format(
+                glossary="\n".join(f"{src}->{dst}" for src, dst in terms),
+                text=text,
+            ),
+        },
+    ]
+
+
+def is_blank(line: str) -> bool:
+    """空行或只有空白字符的行不发送给模型，译文与原文相同。"""
+    return not line.strip()
+
+
+def parse_lines(content: str, count: int) -> list[str] | None:
+    """
+    将回复按行拆分并还原台词内部的换行；行数与原文不一致时返回 None。
+    只去掉回复首尾的换行，中间的空行同样计数，不会与其他行错位。
+    """
+    lines = [line.rstrip("\r") for line in content.strip("\r\n").split("\n")]
+    if count == 1:
+        # 单行原文被模型拆成多行时，按台词内部的换行处理
+        lines = ["\n".join(lines)]
+        if is_blank(lines[0]):
+            return None
+    if len(lines) != count:
+        return None
+    return [line.replace(LINE_BREAK_ESCAPE, "\n") for line in lines]
+
+
+class FileJob:
+    """
+    一个待翻译文件的进度。每完成一个批次就把已有译文写入检查点，
+    中断后重新运行时只翻译检查点中尚未完成的行。
+    """
+
+    def __init__(self, relative_path: Path, dialogues: list[dict], checkpoint_dir: Path):
+        self.relative_path = relative_path
+        self.dialogues = dialogues
+        self.checkpoint_path = checkpoint_dir / relative_path
+        self.source_hash = hash_config([item["message"] for item in dialogues])
+        self.translations: list[str | None] = [None] * len(dialogues)
+        self.failed = False
+
+        if self.checkpoint_path.exists():
+            try:
+                with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                    checkpoint = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                checkpoint = None
+            # 原文发生变化时检查点作废
+            if checkpoint and checkpoint.get("source") == self.source_hash:
+                self.translations = checkpoint["translations"]
+
+    def pending_batches(
+        self, batch_size: int, start: int = 0, end: int | None = None
+    ) -> list[list[int]]:
+        """把 [start, end) 中尚未翻译的行按顺序分成若干批，每批是一组相邻行的下标。"""
+        batches = []
+        current = []
+        end = len(self.translations) if end is None else min(end, len(self.translations))
+        for index in range(start, end):
+            if self.translations[index] is not None:
+                if current:
+                    batches.append(current)
+                    current = []
+                continue
+            current.append(index)
+            if len(current) == batch_size:
+                batches.append(current)
+                current = []
+        if current:
+            batches.append(current)
+        return batches
+
+    def remaining(self) -> int:
+        return sum(translation is None for translation in self.translations)
+
+    def save_checkpoint(self):
+        output_writer.write_json(
+            self.checkpoint_path,
+            {"source": self.source_hash, "translations": self.translations},
+            indent=None,
+        )
+
+    def write_result(self, translated_dir: Path):
+        """
+        所有行都已翻译：写入 '3_Translated'。检查点由调用方在写入确实完成之后删除，
+        中途中断时重新运行会直接从完整的检查点写出结果。
+        """
+        output_writer.write_json(
+            translated_dir / self.relative_path,
+            [
+                {**item, "message": translation}
+                for item, translation in zip(self.dialogues, self.translations)
+            ],
+            indent=4,
+        )
+
+    def remove_checkpoint(self):
+        output_writer.unlink(self.checkpoint_path)
+
+
+class TranslationRunner:
+    """
+    用固定数量的协程（与服务器的并行槽位数一致）领取批次，
+    任何一个槽位空闲时立即开始下一批，而不是等整个文件翻译完。
+    """
+
+    def __init__(
+        self,
+        client: ChatClient,
+        glossary: GlossaryChecker | None,
+        translated_dir: Path,
+        concurrency: int,
+        batch_size: int,
+    ):
+        self.client = client
+        self.glossary = glossary
+        self.translated_dir = translated_dir
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.stats = {"files_done": 0, "files_failed": 0, "lines_done": 0}
+        self._finished_jobs: list[FileJob] = []
+
+    async def _translate_lines(self, lines: list[str]) -> list[str]:
+        """
+        翻译一组行；回复的行数始终对不上时拆成两半分别翻译。
+        空白行原样保留，只把其余的行发送给模型。
+        """
+        if any(is_blank(line) for line in lines):
+            translations = list(lines)
+            indices = [index for index, line in enumerate(lines) if not is_blank(line)]
+            if indices:
+                sent = await self._translate_lines([lines[index] for index in indices])
+                for index, translation in zip(indices, sent):
+                    translations[index] = translation
+            return translations
+
+        messages = build_messages(lines, self.glossary)
+        for _ in range(LINE_COUNT_ATTEMPTS):
+            translations = parse_lines(await self.client.complete(messages), len(lines))
+            if translations is not None:
+                return translations
+            self.client.stats["mismatches"] += 1
+
+        if len(lines) == 1:
+            raise TranslationError("模型返回了空的译文")
+        middle = len(lines) // 2
+        return await self._translate_lines(
+            lines[:middle]
+        ) + await self._translate_lines(lines[middle:])
+
+    async def _translate_batch(self, job: FileJob, indices: list[int]):
+        if job.failed:
+            return
+        try:
+            translations = await self._translate_lines(
+                [job.dialogues[index]["message"] for index in indices]
+            )
+        except TranslationError as e:
+            job.failed = True
+            self.stats["files_failed"] += 1
+            print(f"  - 翻译失败: {job.relative_path} ({e})，已完成的行保存在检查点中。")
+            return
+
+        for index, translation in zip(indices, translations):
+            job.translations[index] = translation
+        self.stats["lines_done"] += len(indices)
+        if job.remaining():
+            job.save_checkpoint()
+        else:
+            job.write_result(self.translated_dir)
+            self._finished_jobs.append(job)
+            self.stats["files_done"] += 1
+            print(f"  - 已完成: {job.relative_path}")
+
+    async def _worker(self, queues: list[deque], slot: int):
+        """
+        依次处理自己队列中的批次；自己的队列空了之后，从剩余批次最多的队列末尾取走一批，
+        避免预估的工作量与实际耗时不符时槽位空闲。
+        """
+        own_queue = queues[slot % len(queues)]
+        while True:
+            if own_queue:
+                job, indices = own_queue.popleft()
+            else:
+                busiest = max(queues, key=len)
+                if not busiest:
+                    return
+                job, indices = busiest.pop()
+            await self._translate_batch(job, indices)
+
+    async def run(
+        self,
+        jobs: list[FileJob],
+        schedule: list[list[tuple[FileJob, int, int]]] | None = None,
+    ) -> dict:
+        """
+        schedule 为 None 时所有批次放在同一个队列中，按文件顺序领取；
+        否则 schedule 中的每个列表是一个槽位的工作单元 (文件, 起始行, 结束行)，
+        并发数等于槽位数。
+        """
+        finished = set()
+        for job in jobs:
+            if not job.remaining():
+                # 检查点中已经全部完成（例如上次在写出结果前中断）
+                job.write_result(self.translated_dir)
+                self._finished_jobs.append(job)
+                self.stats["files_done"] += 1
+                finished.add(job)
+
+        if schedule is None:
+            queues = [
+                deque(
+                    (job, indices)
+                    for job in jobs
+                    if job not in finished
+                    for indices in job.pending_batches(self.batch_size)
+                )
+            ]
+        else:
+            self.concurrency = len(schedule)
+            queues = [
+                deque(
+                    (job, indices)
+                    for job, start, end in units
+                    if job not in finished
+                    for indices in job.pending_batches(self.batch_size, start, end)
+                )
+                for units in schedule
+            ]
+
+        # 默认线程池的大小与 CPU 核数有关，可能小于并发数，因此为请求单独准备线程池
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=self.concurrency)
+        )
+        start_time = time.perf_counter()
+        await asyncio.gather(
+            *(self._worker(queues, slot) for slot in range(self.concurrency))
+        )
+        # 译文全部落盘之后才删除对应的检查点
+        output_writer.flush()
+        for job in self._finished_jobs:
+            job.remove_checkpoint()
+        self._finished_jobs.clear()
+        self.stats["elapsed"] = time.perf_counter() - start_time
+        return self.stats
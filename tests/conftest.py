@@ -0,0 +1,19 @@
+"""测试共用的 JSON 读写与模拟翻译辅助函数。"""
+
+import json
+from pathlib import Path
+
+
+def write_json(path, data):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def read_json(path):
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def translate(items):
+    """模拟翻译：保留 name，在每条 message 前加上「译」。"""
+    return [{"name": item["name"], "message": f"译{item['message']}"} for item in items]
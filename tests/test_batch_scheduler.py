@@ -0,0 +1,113 @@
+import random
+from itertools import product
+
+from batch_scheduler import (
+    balance,
+    build_schedule,
+    estimate_cost,
+    in_order_makespan,
+    split_units,
+)
+
+
+def make_dialogues(lengths):
+    return [{"name": "c001", "message": "あ" * length} for length in lengths]
+
+
+def optimal_makespan(costs, slots):
+    """穷举所有分配方式，得到最优的最终耗时。"""
+    best = None
+    for assignment in product(range(slots), repeat=len(costs)):
+        loads = [0] * slots
+        for cost, slot in zip(costs, assignment):
+            loads[slot] += cost
+        if best is None or max(loads) < best:
+            best = max(loads)
+    return best
+
+
+def test_split_units_cover_file_at_line_boundaries():
+    rng = random.Random(1)
+    for _ in range(200):
+        lengths = [rng.randint(0, 40) for _ in range(rng.randint(1, 30))]
+        dialogues = make_dialogues(lengths)
+        max_cost = rng.randint(1, 120)
+        units = split_units("a.json", dialogues, max_cost)
+
+        assert units[0]["start"] == 0
+        assert units[-1]["end"] == len(dialogues)
+        for previous, unit in zip(units, units[1:]):
+            assert previous["end"] == unit["start"]
+        for unit in units:
+            cost = sum(
+                estimate_cost(item["message"])
+                for item in dialogues[unit["start"] : unit["end"]]
+            )
+            assert unit["cost"] == cost
+            # 只有单行本身就超过上限时，单元才会超过上限
+            assert cost <= max_cost or unit["end"] - unit["start"] == 1
+
+
+def test_balance_assigns_every_unit_once_within_lpt_bound():
+    rng = random.Random(2)
+    for _ in range(150):
+        slots = rng.randint(2, 3)
+        costs = [rng.randint(1, 50) for _ in range(rng.randint(1, 7))]
+        units = [
+            {"file": f"{index}.json", "start": 0, "end": 1, "cost": cost}
+            for index, cost in enumerate(costs)
+        ]
+        queues = balance(units, slots)
+
+        assigned = sorted(unit["file"] for queue in queues for unit in queue["units"])
+        assert assigned == sorted(unit["file"] for unit in units)
+        for queue in queues:
+            assert queue["cost"] == sum(unit["cost"] for unit in queue["units"])
+        # LPT 的最终耗时不超过最优解的 4/3 - 1/(3m) 倍
+        makespan = max(queue["cost"] for queue in queues)
+        optimum = optimal_makespan(costs, slots)
+        assert makespan * 3 * slots <= optimum * (4 * slots - 1)
+
+
+def test_build_schedule_balances_one_huge_file():
+    files = {
+        "big.json": make_dialogues([30] * 200),
+        "a.json": make_dialogues([10] * 5),
+        "b.json": make_dialogues([10] * 5),
+    }
+    schedule = build_schedule(files, 4)
+
+    total_cost = sum(
+        estimate_cost(item["message"])
+        for dialogues in files.values()
+        for item in dialogues
+    )
+    assert schedule["total_cost"] == total_cost
+    assert schedule["line_counts"] == {"big.json": 200, "a.json": 5, "b.json": 5}
+    makespan = max(queue["cost"] for queue in schedule["queues"])
+    assert makespan <= total_cost / 4 + schedule["max_unit_cost"]
+    # 按文件顺序领取时，最大的文件独占一个槽位直到结束
+    assert makespan < schedule["in_order_makespan"]
+    assert schedule["in_order_makespan"] == in_order_makespan(
+        [200 * estimate_cost("あ" * 30), 5 * 12, 5 * 12], 4
+    )
+
+    # 每个文件的各个单元恰好覆盖全部行
+    for path, dialogues in files.items():
+        ranges = sorted(
+            (unit["start"], unit["end"])
+            for queue in schedule["queues"]
+            for unit in queue["units"]
+            if unit["file"] == path
+        )
+        assert ranges[0][0] == 0 and ranges[-1][1] == len(dialogues)
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+def test_queues_do_not_depend_on_file_order():
+    files = {
+        f"{index:02}.json": make_dialogues([index % 7 + 1] * 10) for index in range(20)
+    }
+    reversed_files = dict(reversed(list(files.items())))
+    queues = build_schedule(files, 3)["queues"]
+    assert build_schedule(reversed_files, 3)["queues"] == queues
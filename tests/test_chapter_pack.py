@@ -0,0 +1,139 @@
+import os
+import random
+
+import pytest
+
+from chapter_pack import CODEC_RAW, PackError, PackReader, PackWriter, unpack
+
+
+def random_chapters(seed, count=60):
+    rng = random.Random(seed)
+    chapters = {}
+    for index in range(count):
+        # 路径含非 ASCII 字符，索引按 UTF-8 字节排序
+        directory = rng.choice(["Adventure", "Event", "イベント", "a"])
+        name = f"{directory}/{index}/G{rng.randint(0, 999)}.chapter.json"
+        if rng.random() < 0.5:
+            # 重复内容可以压缩，随机字节不能压缩，两种编码都会出现
+            data = ("「おはよう」" * rng.randint(0, 200)).encode("utf-8")
+        else:
+            data = rng.randbytes(rng.randint(0, 300))
+        chapters[name] = data
+    return chapters
+
+
+def write_pack(path, chapters):
+    writer = PackWriter(path)
+    for name, data in chapters.items():
+        writer.add(name, data)
+    writer.close()
+
+
+def test_round_trip(tmp_path):
+    chapters = random_chapters(1)
+    pack_path = tmp_path / "data.pack"
+    write_pack(pack_path, chapters)
+
+    with PackReader(pack_path) as reader:
+        assert len(reader) == len(chapters)
+        assert list(reader.names()) == sorted(
+            chapters, key=lambda name: name.encode("utf-8")
+        )
+        for name, data in chapters.items():
+            assert name in reader
+            assert reader.read(name) == data
+        # 二分查找在各个位置都能正确判断不存在的路径
+        for name in ["", "0", "zzz", "Adventure/", *(name + "x" for name in chapters)]:
+            assert name not in reader
+        with pytest.raises(KeyError):
+            reader.read("missing.chapter.json")
+
+
+def test_copy_from_keeps_stored_blocks(tmp_path):
+    chapters = random_chapters(2)
+    old_path = tmp_path / "old.pack"
+    write_pack(old_path, chapters)
+
+    new_path = tmp_path / "new.pack"
+    names = sorted(chapters)
+    changed = names[0]
+    with PackReader(old_path) as previous:
+        writer = PackWriter(new_path)
+        writer.add(changed, b"{}")
+        for name in names[1:]:
+            writer.copy_from(previous, name)
+        writer.close()
+
+    with PackReader(new_path) as reader, PackReader(old_path) as previous:
+        assert reader.read(changed) == b"{}"
+        for name in names[1:]:
+            assert reader.read_stored(name) == previous.read_stored(name)
+            assert reader.read(name) == chapters[name]
+
+
+def test_unpack_restores_identical_files(tmp_path):
+    chapters = random_chapters(3)
+    pack_path = tmp_path / "data.pack"
+    write_pack(pack_path, chapters)
+
+    output_dir = tmp_path / "out"
+    assert unpack(pack_path, output_dir) == len(chapters)
+    for name, data in chapters.items():
+        assert (output_dir / name).read_bytes() == data
+    restored = {
+        path.relative_to(output_dir).as_posix()
+        for path in output_dir.rglob("*")
+        if path.is_file()
+    }
+    assert restored == set(chapters)
+
+
+def test_corrupted_chapter_fails_crc(tmp_path):
+    pack_path = tmp_path / "data.pack"
+    data = random.Random(4).randbytes(64)
+    write_pack(pack_path, {"a.chapter.json": data})
+    with PackReader(pack_path) as reader:
+        assert reader.read_stored("a.chapter.json")[3] == CODEC_RAW
+
+    # 随机字节以原样存储，直接改动其中一个字节
+    content = bytearray(pack_path.read_bytes())
+    content[content.index(data) + 10] ^= 0xFF
+    pack_path.write_bytes(bytes(content))
+    with PackReader(pack_path) as reader, pytest.raises(PackError):
+        reader.read("a.chapter.json")
+
+
+def test_invalid_files_are_rejected(tmp_path):
+    empty_path = tmp_path / "empty.pack"
+    empty_path.write_bytes(b"")
+    with pytest.raises(PackError):
+        PackReader(empty_path)
+
+    other_path = tmp_path / "other.pack"
+    other_path.write_bytes(b"PK\3\4" + b"\0" * 100)
+    with pytest.raises(PackError):
+        PackReader(other_path)
+
+
+def test_abort_keeps_previous_pack(tmp_path):
+    pack_path = tmp_path / "data.pack"
+    write_pack(pack_path, {"a.chapter.json": b"old"})
+
+    writer = PackWriter(pack_path)
+    writer.add("a.chapter.json", b"new")
+    writer.abort()
+    assert os.listdir(tmp_path) == ["data.pack"]
+    with PackReader(pack_path) as reader:
+        assert reader.read("a.chapter.json") == b"old"
+
+
+def test_truncated_files_are_rejected(tmp_path):
+    pack_path = tmp_path / "data.pack"
+    write_pack(pack_path, random_chapters(5, count=5))
+    content = pack_path.read_bytes()
+    truncated_path = tmp_path / "truncated.pack"
+    # 只有部分文件头，以及索引被截断
+    for size in (5, len(content) - 1):
+        truncated_path.write_bytes(content[:size])
+        with pytest.raises(PackError):
+            PackReader(truncated_path)
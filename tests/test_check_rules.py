@@ -0,0 +1,163 @@
+import copy
+import random
+
+from check_rules import (
+    BracketRule,
+    EmptyRule,
+    GlossaryRule,
+    KanaRule,
+    RuleSet,
+    SpeakerRule,
+    SymbolRule,
+    TitleRule,
+    bracket_balance,
+)
+
+NAMES = {"さつき": "五月", "ミル": "米尔", "ユイ": "ユイ"}
+TERMS = {"魔法": "魔法", "さつき": "五月"}
+
+
+def make_rules():
+    return [
+        SymbolRule(),
+        TitleRule(),
+        EmptyRule(),
+        KanaRule(),
+        BracketRule(),
+        SpeakerRule(NAMES),
+        GlossaryRule(TERMS),
+    ]
+
+
+def naive_run(rules, data, sources):
+    """逐条规则、逐个条目地检查，不做任何预编译，作为 RuleSet 的对照。"""
+    for rule in rules:
+        rule.prepare()
+    fixes = []
+    issues = []
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        applicable = [
+            rule
+            for rule in rules
+            if all(isinstance(item.get(field), str) for field in rule.fields)
+        ]
+        for rule in applicable:
+            if rule.fix_field is not None:
+                old_value = item[rule.fix_field]
+                new_value = rule.fix(old_value)
+                if new_value != old_value:
+                    fixes.append(
+                        {
+                            "rule": rule.name,
+                            "index": index + 1,
+                            "name": item.get("name", "Unknown"),
+                            "old": old_value,
+                            "new": new_value,
+                        }
+                    )
+                    item[rule.fix_field] = new_value
+        source = sources[index] if sources else None
+        for rule in applicable:
+            for detail in rule.check(item, source) or []:
+                issues.append(
+                    {
+                        "rule": rule.name,
+                        "severity": rule.severity,
+                        "index": index + 1,
+                        "name": item.get("name"),
+                        "message": item.get("message"),
+                        **detail,
+                    }
+                )
+    return fixes, issues
+
+
+def random_items(rng, count):
+    names = ["Title", "さつき", "五月", "米尔", "ユイ", "c001", None, 3]
+    messages = [
+        "第1话,标题,B",
+        "第一话,标题,B",
+        "「你好　啊」",
+        "「还没说完",
+        "说完了」",
+        "",
+        "　",
+        "残留的かな",
+        "<ruby=まほう>魔法</ruby>",
+        "五月的魔法",
+        None,
+        ["不是字符串"],
+    ]
+    items = []
+    for _ in range(count):
+        if rng.random() < 0.05:
+            items.append("不是字典")
+            continue
+        item = {}
+        if rng.random() < 0.9:
+            item["name"] = rng.choice(names)
+        if rng.random() < 0.9:
+            item["message"] = rng.choice(messages)
+        items.append(item)
+    return items
+
+
+def test_rule_set_matches_naive_checks():
+    rng = random.Random(1)
+    sources_pool = [None, "", "「おはよう」", "「まだ", "さつきの魔法", "魔法"]
+    for timed in (False, True):
+        rule_set = RuleSet(make_rules(), timed=timed)
+        rule_set.prepare()
+        for _ in range(200):
+            data = random_items(rng, rng.randint(0, 15))
+            sources = (
+                [rng.choice(sources_pool) for _ in data] if rng.random() < 0.5 else None
+            )
+            expected_data = copy.deepcopy(data)
+            expected = naive_run(make_rules(), expected_data, sources)
+            assert rule_set.run(data, sources) == expected
+            # 修复就地应用到条目上
+            assert data == expected_data
+
+
+def test_rule_subsets_only_run_selected_rules():
+    data = [{"name": "Title", "message": "坏　标题かな"}]
+    rule_set = RuleSet([TitleRule(), KanaRule()])
+    rule_set.prepare()
+    fixes, issues = rule_set.run(copy.deepcopy(data))
+    assert fixes == []
+    assert [issue["rule"] for issue in issues] == ["title", "kana"]
+
+
+def test_call_counts_and_optional_timings():
+    data = [
+        {"name": "c001", "message": "你好"},
+        {"name": 1, "message": "你好"},
+        {"message": "你好"},
+        {"name": "c001"},
+        "不是字典",
+    ]
+    for timed in (False, True):
+        rule_set = RuleSet([SymbolRule(), TitleRule(), SpeakerRule({})], timed=timed)
+        rule_set.prepare()
+        rule_set.run(copy.deepcopy(data))
+        rule_set.run(copy.deepcopy(data))
+        timings = rule_set.take_timings()
+        assert {name: timing["calls"] for name, timing in timings.items()} == {
+            "symbols": 6,
+            "title": 2,
+            "speaker": 4,
+        }
+        assert all(("seconds" in timing) == timed for timing in timings.values())
+        # 取出后清零
+        assert rule_set.take_timings() == {}
+
+
+def test_bracket_balance():
+    assert bracket_balance("没有引号") is None
+    assert bracket_balance("「一」「二」") is None
+    assert bracket_balance("「「嵌套」」") is None
+    assert bracket_balance("「未闭合") == "「未闭合"
+    assert bracket_balance("多余」「") == "多余的」"
@@ -0,0 +1,82 @@
+import random
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from conftest import read_json, translate, write_json
+from corpus_layout import (
+    DEDUP_BACK_REFS_FILE,
+    DEDUP_UNIQUE_FILE,
+    READY_FOR_TRANSLATION_DIR,
+    TRANSLATED_DIR,
+)
+from localization_tool import handle_dedup_export, handle_dedup_import
+from output_writer import output_writer
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """在临时目录中生成大量重复台词的待翻译文件，返回 {相对路径: 台词列表}。"""
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(1)
+    messages = ["「はい」", "「いいえ」", "……"]
+    files = {}
+    for book in range(3):
+        for grid in range(5):
+            files[f"book{book}.book/G{grid:05}.json"] = [
+                {
+                    "name": rng.choice(["c001", "c002", "Title"]),
+                    "message": rng.choice(messages + [f"「{grid}」"]),
+                }
+                for _ in range(rng.randint(0, 12))
+            ]
+    for relative_path, dialogues in files.items():
+        write_json(Path(READY_FOR_TRANSLATION_DIR) / relative_path, dialogues)
+    return files
+
+
+def export_and_translate():
+    handle_dedup_export(Namespace())
+    output_writer.flush()
+    translated_path = Path("translated_unique.json")
+    unique_lines = read_json(DEDUP_UNIQUE_FILE)
+    write_json(translated_path, translate(unique_lines))
+    return translated_path
+
+
+def test_round_trip_matches_line_by_line_translation(corpus):
+    translated_path = export_and_translate()
+    unique_lines = read_json(DEDUP_UNIQUE_FILE)
+    assert len(unique_lines) == len(
+        {(item["name"], item["message"]) for items in corpus.values() for item in items}
+    )
+    assert read_json(DEDUP_BACK_REFS_FILE)["unique_count"] == len(unique_lines)
+
+    handle_dedup_import(Namespace(translated_file=str(translated_path), force=False))
+    output_writer.flush()
+    for relative_path, dialogues in corpus.items():
+        assert read_json(Path(TRANSLATED_DIR) / relative_path) == translate(dialogues)
+
+
+def test_import_keeps_existing_files_unless_forced(corpus):
+    translated_path = export_and_translate()
+    relative_path, dialogues = next(iter(corpus.items()))
+    existing_path = Path(TRANSLATED_DIR) / relative_path
+    write_json(existing_path, [{"name": "c001", "message": "人工校对"}])
+
+    handle_dedup_import(Namespace(translated_file=str(translated_path), force=False))
+    output_writer.flush()
+    assert read_json(existing_path) == [{"name": "c001", "message": "人工校对"}]
+
+    handle_dedup_import(Namespace(translated_file=str(translated_path), force=True))
+    output_writer.flush()
+    assert read_json(existing_path) == translate(dialogues)
+
+
+def test_import_rejects_wrong_line_count(corpus):
+    translated_path = export_and_translate()
+    write_json(translated_path, read_json(translated_path)[:-1])
+    handle_dedup_import(Namespace(translated_file=str(translated_path), force=False))
+    output_writer.flush()
+    assert not Path(TRANSLATED_DIR).exists()
@@ -0,0 +1,78 @@
+import random
+
+from glossary import AhoCorasick, GlossaryChecker
+
+
+def naive_find(patterns, text):
+    return sorted(
+        (start, start + len(pattern), pattern_id)
+        for pattern_id, pattern in enumerate(patterns)
+        for start in range(len(text) - len(pattern) + 1)
+        if text.startswith(pattern, start)
+    )
+
+
+def naive_find_longest(patterns, text):
+    """从左到右，每个位置取最长的术语，匹配之后从术语末尾继续。"""
+    matches = []
+    position = 0
+    while position < len(text):
+        candidates = [
+            (len(pattern), pattern_id)
+            for pattern_id, pattern in enumerate(patterns)
+            if text.startswith(pattern, position)
+        ]
+        if candidates:
+            length, pattern_id = max(candidates)
+            matches.append((position, position + length, pattern_id))
+            position += length
+        else:
+            position += 1
+    return matches
+
+
+def random_cases(seed, count=300):
+    # 字母表很小，术语之间大量共享前缀与后缀，能覆盖失败链与输出合并
+    rng = random.Random(seed)
+    alphabet = "さつきちゃん"
+    for _ in range(count):
+        patterns = list(
+            dict.fromkeys(
+                "".join(rng.choices(alphabet, k=rng.randint(1, 4)))
+                for _ in range(rng.randint(1, 8))
+            )
+        )
+        text = "".join(rng.choices(alphabet, k=rng.randint(0, 30)))
+        yield patterns, text
+
+
+def test_find_matches_naive_search():
+    for patterns, text in random_cases(1):
+        assert sorted(AhoCorasick(patterns).find(text)) == naive_find(patterns, text)
+
+
+def test_find_longest_matches_leftmost_longest_scan():
+    for patterns, text in random_cases(2):
+        assert AhoCorasick(patterns).find_longest(text) == naive_find_longest(
+            patterns, text
+        )
+
+
+def test_longer_term_wins():
+    automaton = AhoCorasick(["さつき", "さつきちゃん", "ちゃん"])
+    assert automaton.find_longest("さつきちゃんとさつき") == [(0, 6, 1), (7, 10, 0)]
+
+
+def test_missing_terms():
+    checker = GlossaryChecker(
+        {"さつき": "五月", "さつきちゃん": "小五月", "ミル": "米尔"}
+    )
+    # 按出现顺序去重；较长的术语覆盖其中较短的术语
+    assert checker.find_terms("ミル、さつきちゃん、ミル") == [
+        ("ミル", "米尔"),
+        ("さつきちゃん", "小五月"),
+    ]
+    assert checker.missing_terms("さつきちゃんとミル", "小五月和米露") == [
+        ("ミル", "米尔")
+    ]
+    assert checker.missing_terms("おはよう", "早上好") == []
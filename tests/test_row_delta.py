@@ -0,0 +1,166 @@
+import json
+import random
+from pathlib import Path
+
+from conftest import read_json, translate, write_json
+from output_writer import output_writer
+from row_delta import (
+    DeltaPlanner,
+    RowSnapshots,
+    changed_rows,
+    delta_path,
+    dialogue_hashes,
+    diff_rows,
+    merge_rows,
+)
+
+GRID = Path("book/G00100.json")
+
+
+def dialogues(texts):
+    return [{"name": "c001", "message": text} for text in texts]
+
+
+def edit_script(rng, texts):
+    """随机插入、删除、修改若干行，模拟游戏更新后的原文。"""
+    texts = list(texts)
+    for _ in range(rng.randint(0, 6)):
+        operation = rng.choice(("insert", "delete", "replace"))
+        position = rng.randint(0, len(texts))
+        new_text = f"新{rng.randint(0, 10**6)}"
+        if operation == "insert":
+            texts.insert(position, new_text)
+        elif texts and position < len(texts):
+            if operation == "delete":
+                del texts[position]
+            else:
+                texts[position] = new_text
+    return texts
+
+
+def test_merge_rows_matches_full_retranslation():
+    # 未变化的行与原文逐行相同，因此沿用旧译文的合并结果应与整表重新翻译一致
+    rng = random.Random(1)
+    for _ in range(300):
+        old = dialogues(
+            rng.choice(["「はい」", "「いいえ」"]) if rng.random() < 0.3 else f"行{i}"
+            for i in range(rng.randint(0, 20))
+        )
+        new = dialogues(edit_script(rng, [item["message"] for item in old]))
+        opcodes = diff_rows(dialogue_hashes(old), dialogue_hashes(new))
+        delta = translate([new[index] for index in changed_rows(opcodes)])
+        assert merge_rows(opcodes, translate(old), delta) == translate(new)
+
+
+def make_planner(tmp_path):
+    snapshots = RowSnapshots(tmp_path / "snapshots")
+    return DeltaPlanner(
+        snapshots,
+        tmp_path / "plan.json",
+        tmp_path / "translated",
+        tmp_path / "extracted",
+    )
+
+
+def save(planner):
+    planner.save()
+    output_writer.flush()
+
+
+def test_plan_and_merge(tmp_path):
+    old = dialogues(["「一」", "「二」", "「三」"])
+    new = dialogues(["「一」", "「二改」", "「三」", "「四」"])
+    translated_file = tmp_path / "translated" / GRID
+    write_json(translated_file, translate(old))
+
+    planner = make_planner(tmp_path)
+    planner.snapshots.set(GRID, dialogue_hashes(old))
+    delta = planner.plan_grid(GRID, new)
+    assert delta == dialogues(["「二改」", "「四」"])
+    save(planner)
+    # 比对不修改译文
+    assert read_json(translated_file) == translate(old)
+
+    planner = make_planner(tmp_path)
+    assert planner.merge([])["pending"] == 1
+    delta_file = tmp_path / "translated" / delta_path(GRID)
+    write_json(delta_file, translate(delta))
+    stats = planner.merge([])
+    save(planner)
+
+    assert stats["merged"] == 1
+    assert read_json(translated_file) == translate(new)
+    assert not delta_file.exists()
+    assert not (tmp_path / "plan.json").exists()
+    assert make_planner(tmp_path).snapshots.get(GRID) == dialogue_hashes(new)
+
+
+def test_deleted_rows_are_applied_at_merge(tmp_path):
+    old = dialogues(["「一」", "「二」", "「三」"])
+    new = dialogues(["「一」", "「三」"])
+    translated_file = tmp_path / "translated" / GRID
+    write_json(translated_file, translate(old))
+
+    planner = make_planner(tmp_path)
+    planner.snapshots.set(GRID, dialogue_hashes(old))
+    assert planner.plan_grid(GRID, new) is None
+    assert planner.stats["deleted_only"] == 1
+    assert read_json(translated_file) == translate(old)
+
+    assert planner.merge([])["merged"] == 1
+    save(planner)
+    assert read_json(translated_file) == translate(new)
+
+
+def test_grid_without_snapshot_is_unaligned(tmp_path):
+    write_json(tmp_path / "translated" / GRID, translate(dialogues(["「一」"])))
+    planner = make_planner(tmp_path)
+    assert planner.plan_grid(GRID, dialogues(["「一改」"])) is None
+    # 提取时的原文与译文行数不一致，同样不能作为基准
+    write_json(tmp_path / "extracted" / GRID, dialogues(["「一」", "「二」"]))
+    assert planner.plan_grid(GRID, dialogues(["「一改」"])) is None
+    assert planner.unaligned == [GRID.as_posix()] * 2
+    assert planner.snapshots.get(GRID) is None
+    assert planner.plan == {}
+
+
+def test_extracted_source_is_the_baseline_without_snapshot(tmp_path):
+    old = dialogues(["「一」", "「二」"])
+    new = dialogues(["「一」", "「二改」"])
+    write_json(tmp_path / "extracted" / GRID, old)
+    write_json(tmp_path / "translated" / GRID, translate(old))
+
+    planner = make_planner(tmp_path)
+    assert planner.plan_grid(GRID, new) == dialogues(["「二改」"])
+    assert planner.stats["baseline"] == 1
+    assert planner.snapshots.get(GRID) == dialogue_hashes(old)
+
+
+def test_delta_for_outdated_source_is_not_merged(tmp_path):
+    old = dialogues(["「一」", "「二」"])
+    first = dialogues(["「一」", "「二改」"])
+    second = dialogues(["「一」", "「二再改」"])
+    translated_file = tmp_path / "translated" / GRID
+    delta_file = tmp_path / "translated" / delta_path(GRID)
+    write_json(translated_file, translate(old))
+
+    planner = make_planner(tmp_path)
+    planner.snapshots.set(GRID, dialogue_hashes(old))
+    write_json(delta_file, translate(planner.plan_grid(GRID, first)))
+    save(planner)
+
+    # 增量译文放入之后原文再次变化：旧的增量文件不能合并
+    planner = make_planner(tmp_path)
+    delta = planner.plan_grid(GRID, second)
+    save(planner)
+    planner = make_planner(tmp_path)
+    assert planner.merge([])["stale"] == [GRID.as_posix()]
+    assert read_json(translated_file) == translate(old)
+
+    # 重新翻译之后的增量文件正常合并（缩进不同，文件大小必然变化）
+    delta_file.write_text(
+        json.dumps(translate(delta), ensure_ascii=False, indent=4), encoding="utf-8"
+    )
+    assert planner.merge([])["merged"] == 1
+    save(planner)
+    assert read_json(translated_file) == translate(second)
@@ -0,0 +1,47 @@
+import random
+from collections import Counter
+
+from translation_memory import TranslationMemory
+
+
+def expected_best(pairs):
+    """每条原文出现次数最多的译文，次数相同时取字典序最小者。"""
+    counts = Counter(pairs)
+    best = {}
+    for (source, target), count in counts.items():
+        current = best.get(source)
+        if current is None or (-count, target) < (-counts[source, current], current):
+            best[source] = target
+    return best
+
+
+def test_lookup_picks_most_frequent_translation(tmp_path):
+    rng = random.Random(1)
+    # 原文数超过单次查询的分块大小
+    sources = [f"「{index}」" for index in range(1200)]
+    pairs = [
+        (rng.choice(sources), rng.choice(["你好", "您好", "早上好"]))
+        for _ in range(5000)
+    ]
+    tm = TranslationMemory(tmp_path / "tm.sqlite")
+    assert tm.rebuild(iter(pairs)) == len(set(pairs))
+
+    best = expected_best(pairs)
+    queries = sources + ["没有的原文"] + sources[:10]
+    assert tm.lookup(queries) == [best.get(source) for source in queries]
+    assert tm.source_count() == len(best)
+    tm.close()
+
+
+def test_rebuild_replaces_previous_pairs(tmp_path):
+    tm = TranslationMemory(tmp_path / "tm.sqlite")
+    tm.rebuild([("「はい」", "是"), ("「はい」", "好"), ("「はい」", "好")])
+    assert tm.lookup(["「はい」"]) == ["好"]
+    tm.rebuild([("「いいえ」", "不")])
+    assert tm.lookup(["「はい」", "「いいえ」"]) == [None, "不"]
+    tm.close()
+
+    # 重新打开时沿用已保存的内容
+    tm = TranslationMemory(tmp_path / "tm.sqlite")
+    assert tm.lookup(["「いいえ」"]) == ["不"]
+    tm.close()
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from output_writer import output_writer
+from translator import (
+    ChatClient,
+    FileJob,
+    TranslationError,
+    TranslationRunner,
+    parse_lines,
+)
+
+# USER_PROMPT 中待翻译文本之前的固定内容
+TEXT_MARKER = "将下面的文本从日文翻译成简体中文：\n"
+
+
+class StubEndpoint:
+    """
+    本地的 /v1/chat/completions 替身。默认把每行原文译为 "译" + 原文；
+    script 中预先放入的动作依次生效：整数表示返回该 HTTP 状态码，字符串表示原样作为回复内容。
+    """
+
+    def __init__(self):
+        self.script = deque()
+        self.requests: list[list[str]] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                content = body["messages"][-1]["content"]
+                lines = content.split(TEXT_MARKER, 1)[1].split("\n")
+                stub.requests.append(lines)
+
+                action = stub.script.popleft() if stub.script else None
+                if isinstance(action, int):
+                    self.send_error(action)
+                    return
+                if action is None:
+                    action = "\n".join(f"译{line}" for line in lines)
+                data = json.dumps(
+                    {"choices": [{"message": {"content": action}}]},
+                    ensure_ascii=False,
+                ).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def sent_lines(self) -> list[str]:
+        return [line for lines in self.requests for line in lines]
+
+
+@pytest.fixture
+def endpoint():
+    stub = StubEndpoint()
+    thread = threading.Thread(target=stub.server.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+def make_client(endpoint, max_retries=3):
+    # backoff 为 0：重试时不等待
+    return ChatClient(endpoint.url, "stub", max_retries=max_retries, backoff=0)
+
+
+def run_job(client, tmp_path, messages, batch_size=10, checkpoint=None):
+    dialogues = [{"name": "c001", "message": message} for message in messages]
+    checkpoint_dir = tmp_path / "checkpoint"
+    relative_path = tmp_path.joinpath("book", "G00000.json").relative_to(tmp_path)
+    if checkpoint is not None:
+        probe = FileJob(relative_path, dialogues, checkpoint_dir)
+        probe.translations = checkpoint
+        probe.save_checkpoint()
+        # 检查点由后台线程写出，读取之前等待写入完成
+        output_writer.flush()
+
+    job = FileJob(relative_path, dialogues, checkpoint_dir)
+    runner = TranslationRunner(client, None, tmp_path / "translated", 1, batch_size)
+    stats = asyncio.run(runner.run([job]))
+    output_path = tmp_path / "translated" / relative_path
+    result = None
+    if output_path.exists():
+        with open(output_path, "r", encoding="utf-8") as f:
+            result = [item["message"] for item in json.load(f)]
+    return stats, result, checkpoint_dir / relative_path
+
+
+def test_retries_on_busy_server(endpoint):
+    endpoint.script.extend([429, 503])
+    client = make_client(endpoint)
+    messages = [{"role": "user", "content": TEXT_MARKER + "「おはよう」"}]
+    assert asyncio.run(client.complete(messages)) == "译「おはよう」"
+    assert client.stats == {"requests": 3, "retries": 2, "mismatches": 0}
+
+
+def test_gives_up_after_max_retries(endpoint):
+    endpoint.script.extend([503, 503])
+    client = make_client(endpoint, max_retries=1)
+    messages = [{"role": "user", "content": TEXT_MARKER + "「おはよう」"}]
+    with pytest.raises(TranslationError):
+        asyncio.run(client.complete(messages))
+    assert client.stats["requests"] == 2
+
+
+def test_client_error_is_not_retried(endpoint):
+    endpoint.script.append(400)
+    client = make_client(endpoint)
+    messages = [{"role": "user", "content": TEXT_MARKER + "「おはよう」"}]
+    with pytest.raises(TranslationError):
+        asyncio.run(client.complete(messages))
+    assert client.stats["requests"] == 1
+
+
+def test_resumes_from_checkpoint(endpoint, tmp_path):
+    client = make_client(endpoint)
+    stats, result, checkpoint_path = run_job(
+        client,
+        tmp_path,
+        ["「一」", "「二」", "「三」", "「四」"],
+        checkpoint=["旧一", None, "旧三", None],
+    )
+    # 检查点中已完成的行不再发送
+    assert endpoint.sent_lines() == ["「二」", "「四」"]
+    assert result == ["旧一", "译「二」", "旧三", "译「四」"]
+    assert stats["lines_done"] == 2
+    assert not checkpoint_path.exists()
+
+
+def test_failed_file_keeps_checkpoint(endpoint, tmp_path):
+    # 第一批成功，第二批一直返回 503
+    endpoint.script.extend([None, 503, 503])
+    client = make_client(endpoint, max_retries=1)
+    stats, result, checkpoint_path = run_job(
+        client, tmp_path, ["「一」", "「二」", "「三」"], batch_size=2
+    )
+    assert result is None
+    assert stats["files_failed"] == 1
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        assert json.load(f)["translations"] == ["译「一」", "译「二」", None]
+
+
+def test_line_count_mismatch_splits_batch(endpoint, tmp_path):
+    # 两行原文只回复一行：重试一次后拆成两个单行批次
+    endpoint.script.extend(["只有一行", "只有一行"])
+    client = make_client(endpoint)
+    _, result, _ = run_job(client, tmp_path, ["「一」", "「二」"])
+    assert result == ["译「一」", "译「二」"]
+    assert client.stats["mismatches"] == 2
+    assert endpoint.requests[-2:] == [["「一」"], ["「二」"]]
+
+
+def test_blank_lines_are_passed_through(endpoint, tmp_path):
+    client = make_client(endpoint)
+    _, result, _ = run_job(client, tmp_path, ["「一」", "", "　", "「二」"])
+    assert result == ["译「一」", "", "　", "译「二」"]
+    assert endpoint.sent_lines() == ["「一」", "「二」"]
+
+
+def test_parse_lines_keeps_blank_lines_in_position():
+    assert parse_lines("一\n\n三\n", 3) == ["一", "", "三"]
+    assert parse_lines("一\n三", 3) is None
+    # 单行原文被拆成多行时合并，内部换行还原
+    assert parse_lines("上半\n下半", 1) == ["上半\n下半"]
+    assert parse_lines("带\\n换行", 1) == ["带\n换行"]
+    assert parse_lines("\n", 1) is None